@@ -3,6 +3,9 @@ from frontend.styles import load_css
 from frontend.pages import main_page
 from services.database import initialize_firebase
 from models.toxicity import load_model
+from services.metrics import start_metrics_server
+from services.profiling import maybe_profile
+from config.settings import METRICS_PORT
 
 # Initialize Firebase
 initialize_firebase()
@@ -15,6 +18,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Expose per-stage timings for Prometheus scraping; started before the
+# model loads, so /ready answers "not ready" instead of refusing connections
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
 # Load the model and tokenizer
 model, tokenizer = load_model()
 
@@ -23,4 +31,5 @@ load_css()
 
 # Run main page
 if __name__ == "__main__":
-    main_page(model, tokenizer)
\ No newline at end of file
+    with maybe_profile("script_run", force=st.query_params.get("profile") == "1"):
+        main_page(model, tokenizer)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config.settings import (
+    ADMISSION_MAX_QUEUE_DEPTH, ADMISSION_LATENCY_BUDGET, ADMISSION_REQUEUE, ADMISSION_RESCORE_WORKERS
+)
+from models.scheduler import BULK, INTERACTIVE, InferenceScheduler, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Writes re-scored analyses back; kept off the scheduler's worker thread,
+# which runs the pending futures' callbacks between model batches
+_rescore_executor = ThreadPoolExecutor(max_workers=ADMISSION_RESCORE_WORKERS, thread_name_prefix="rescore")
+
+# results: score dict; degraded: whether it came from the keyword fallback;
+# pending: Future resolving to the full model scores, or None
+Admission = namedtuple("Admission", ["results", "degraded", "pending"])
+
+class AdmissionController:
+    """
+    Bound the time a request may spend waiting for the model
+
+    A request is shed straight away when its class's queue is at
+    max_queue_depth, and shed after latency_budget seconds if the model has
+    not answered by then. Shed requests get keyword-filter scores marked as
+    degraded; with requeue, the full scores still arrive later through the
+    returned pending future. Either way the request leaves its class's
+    queue, so shedding really lowers interactive load: with requeue it is
+    submitted again at bulk priority.
+
+    Args:
+        scheduler (InferenceScheduler): Scheduler in front of the model
+        fallback: Callable text -> score dict used when shedding
+        max_queue_depth (int): Queue depth at which requests are rejected
+        latency_budget (float): Seconds to wait for the model
+        requeue (bool): Whether shed requests are still fully scored later
+    """
+
+    def __init__(self, scheduler, fallback, max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+                 latency_budget=ADMISSION_LATENCY_BUDGET, requeue=ADMISSION_REQUEUE):
+        self.scheduler = scheduler
+        self.fallback = fallback
+        self.max_queue_depth = max_queue_depth
+        self.latency_budget = latency_budget
+        self.requeue = requeue
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def score(self, text, priority=INTERACTIVE):
+        """
+        Score a text within the latency budget
+
+        Args:
+            text (str): Text to score
+            priority (str): Scheduler priority class
+
+        Returns:
+            Admission: Scores, degraded flag and pending full-score future
+        """
+        if self.scheduler.queue_depth(priority) >= self.max_queue_depth:
+            self.rejected += 1
+            pending = self.scheduler.submit(text, BULK) if self.requeue else None
+            return Admission(self.fallback(text), True, pending)
+
+        future = self.scheduler.submit(text, priority)
+        try:
+            results = future.result(timeout=self.latency_budget)
+        except FutureTimeoutError:
+            self.timed_out += 1
+            if self.scheduler.cancel(future):
+                pending = self.scheduler.submit(text, BULK) if self.requeue else None
+            else:
+                # Already in a model batch; its result is on the way anyway
+                pending = future if self.requeue else None
+            return Admission(self.fallback(text), True, pending)
+        self.admitted += 1
+        return Admission(results, False, None)
+
+def rescore_later(pending, analysis_id, threshold):
+    """
+    Replace a degraded stored analysis with the model's scores once they arrive
+
+    The Firestore write runs on a small executor, never on the scheduler's
+    worker thread, so re-scoring doesn't stall inference.
+
+    Args:
+        pending (Future): Admission.pending of the degraded request
+        analysis_id (str): Id of the stored analysis
+        threshold (float): Threshold passed to determine_action
+    """
+    from services.database import update_analysis_results
+    from services.moderation import determine_action
+
+    def write(results):
+        action, _ = determine_action(results, threshold)
+        try:
+            update_analysis_results(analysis_id, results, action)
+        except Exception:
+            logger.exception("Updating degraded analysis %s failed", analysis_id)
+
+    def update(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        _rescore_executor.submit(write, future.result())
+
+    pending.add_done_callback(update)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def get_admission_controller(model, tokenizer):
+    """
+    Get the process-wide admission controller for a model
+
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+
+    Returns:
+        AdmissionController: Controller over the shared scheduler
+    """
+    from models.toxicity import keyword_fallback_scores
+
+    with _shared_lock:
+        if id(model) not in _shared:
+            _shared[id(model)] = AdmissionController(
+                get_scheduler(model, tokenizer), keyword_fallback_scores
+            )
+        return _shared[id(model)]
+
+def overload_simulation(requests=200, arrival_interval=0.005, model_seconds=0.01,
+                        latency_budget=0.2, max_queue_depth=16, requeue=ADMISSION_REQUEUE):
+    """
+    Drive the controller past capacity and check latency stays bounded
+
+    Requests arrive every arrival_interval seconds from concurrent users while
+    a stand-in model needs model_seconds per request, i.e. about twice its
+    capacity with the defaults.
+
+    Returns:
+        dict: Latency percentiles and how requests were served
+    """
+    def slow_predict(texts):
+        time.sleep(model_seconds * len(texts))
+        return [{'toxic': 0.1} for _ in texts]
+
+    scheduler = InferenceScheduler(slow_predict, {INTERACTIVE: 1, BULK: 1}, {INTERACTIVE: 1, BULK: 1})
+    controller = AdmissionController(
+        scheduler, lambda text: {'toxic': 0.0}, max_queue_depth, latency_budget, requeue
+    )
+    latencies = []
+    degraded = []
+    lock = threading.Lock()
+
+    def user(i):
+        start = time.perf_counter()
+        admission = controller.score(f"request {i}")
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            degraded.append(admission.degraded)
+
+    threads = []
+    for i in range(requests):
+        thread = threading.Thread(target=user, args=(i,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(arrival_interval)
+    for thread in threads:
+        thread.join()
+    scheduler.stop()
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'full_scores': controller.admitted,
+        'shed_queue_full': controller.rejected,
+        'shed_timeout': controller.timed_out,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'bounded': latencies[-1] <= latency_budget + 0.05,
+        'degraded_share': sum(degraded) / len(degraded)
+    }
+
+if __name__ == "__main__":
+    import json
+    report = overload_simulation()
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,203 @@
+from config.settings import TOXICITY_CATEGORIES, ANALYTICS_CATEGORY_THRESHOLD
+from services.database import get_db
+
+# Actions counted as flagged in the dashboard
+FLAGGED_ACTIONS = ["FLAG", "REVIEW"]
+
+# Fields needed when analytics has to be computed client-side
+ANALYTICS_FIELDS = ['results', 'action']
+
+def _summarize(total_analyzed, total_flagged, total_score, category_counts):
+    """Build the dashboard metrics dict from raw totals"""
+    avg_score = total_score / total_analyzed if total_analyzed > 0 else 0
+    pass_rate = ((total_analyzed - total_flagged) / total_analyzed) * 100 if total_analyzed > 0 else 0
+    most_common_category = max(category_counts, key=category_counts.get)
+    if category_counts[most_common_category] == 0:
+        most_common_category = None
+
+    return {
+        'total_analyzed': total_analyzed,
+        'total_flagged': total_flagged,
+        'pass_rate': pass_rate,
+        'avg_score': avg_score,
+        'most_common_category': most_common_category,
+        'category_counts': category_counts
+    }
+
+def _aggregate_values(results):
+    """Map alias -> value from an aggregation query result"""
+    return {result.alias: result.value for result in results[0]}
+
+def analytics_aggregations(query):
+    """
+    Build the aggregation queries behind the dashboard metrics
+
+    Only aggregated numbers cross the wire: one count, the per-category score
+    sums, the flagged count and one filtered count per category.
+
+    Args:
+        query: Firestore collection or query over analyses (sync or async)
+
+    Returns:
+        list: Unexecuted aggregation queries, in the order expected by
+            combine_aggregations
+    """
+    totals = query.count(alias='total')
+    for category in TOXICITY_CATEGORIES[:4]:
+        totals = totals.sum(f'results.{category}', alias=category)
+
+    # Firestore allows at most five aggregations per query
+    remaining = None
+    for category in TOXICITY_CATEGORIES[4:]:
+        remaining = (remaining or query).sum(f'results.{category}', alias=category)
+
+    flagged = query.where('action', 'in', FLAGGED_ACTIONS).count(alias='flagged')
+    category_queries = [
+        query.where(f'results.{category}', '>=', ANALYTICS_CATEGORY_THRESHOLD).count(alias=category)
+        for category in TOXICITY_CATEGORIES
+    ]
+    return [totals, remaining, flagged] + category_queries
+
+def empty_totals():
+    """Raw totals behind the dashboard metrics, for no analyses"""
+    return {
+        'total_analyzed': 0,
+        'total_flagged': 0,
+        'total_score': 0.0,
+        'category_counts': {category: 0 for category in TOXICITY_CATEGORIES}
+    }
+
+def add_analysis(totals, data, sign=1):
+    """
+    Add one analysis document to raw totals, in place
+
+    Args:
+        totals (dict): Raw totals, see empty_totals
+        data (dict): Analysis document
+        sign (int): 1 to add the analysis, -1 to remove it again
+    """
+    results = data.get('results', {})
+    totals['total_analyzed'] += sign
+    if data.get('action') in FLAGGED_ACTIONS:
+        totals['total_flagged'] += sign
+    totals['total_score'] += sign * sum(results.values())
+    category_counts = totals['category_counts']
+    for category, score in results.items():
+        if category in category_counts and score >= ANALYTICS_CATEGORY_THRESHOLD:
+            category_counts[category] += sign
+
+def merge_totals(*parts):
+    """Sum raw totals"""
+    merged = empty_totals()
+    for part in parts:
+        merged['total_analyzed'] += part['total_analyzed']
+        merged['total_flagged'] += part['total_flagged']
+        merged['total_score'] += part['total_score']
+        for category, count in part['category_counts'].items():
+            merged['category_counts'][category] += count
+    return merged
+
+def summarize_totals(totals):
+    """Build the dashboard metrics dict from raw totals"""
+    return _summarize(
+        totals['total_analyzed'], totals['total_flagged'], totals['total_score'],
+        dict(totals['category_counts'])
+    )
+
+def combine_totals(results):
+    """
+    Build raw totals from executed analytics_aggregations results
+
+    Args:
+        results (list): Result of each aggregation query's get()
+
+    Returns:
+        dict: Raw totals, see empty_totals
+    """
+    totals = {}
+    for result in results[:2]:
+        totals.update(_aggregate_values(result))
+
+    category_counts = {}
+    for result in results[3:]:
+        category_counts.update(_aggregate_values(result))
+
+    return {
+        'total_analyzed': totals['total'] or 0,
+        'total_flagged': _aggregate_values(results[2])['flagged'],
+        'total_score': sum(totals[category] or 0 for category in TOXICITY_CATEGORIES),
+        'category_counts': category_counts
+    }
+
+def combine_aggregations(results):
+    """
+    Build the dashboard metrics from executed analytics_aggregations results
+
+    Args:
+        results (list): Result of each aggregation query's get()
+
+    Returns:
+        dict: Analytics metrics
+    """
+    return summarize_totals(combine_totals(results))
+
+def aggregate_totals(query):
+    """
+    Compute raw totals with server-side aggregation queries
+
+    Args:
+        query: Firestore collection or query over analyses
+
+    Returns:
+        dict: Raw totals, see empty_totals
+    """
+    return combine_totals([aggregation.get() for aggregation in analytics_aggregations(query)])
+
+def aggregate_analytics(query):
+    """
+    Compute dashboard metrics with server-side aggregation queries
+
+    Args:
+        query: Firestore collection or query over analyses
+
+    Returns:
+        dict: Analytics metrics
+    """
+    return summarize_totals(aggregate_totals(query))
+
+def scan_analytics(query, projected=True):
+    """
+    Compute dashboard metrics client-side by streaming documents
+
+    Used where aggregation queries are unavailable. With projection only the
+    `results` and `action` fields are transferred, never the content text.
+
+    Args:
+        query: Firestore collection or query over analyses
+        projected (bool): Whether to request only the analytics fields
+
+    Returns:
+        dict: Analytics metrics
+    """
+    if projected:
+        query = query.select(ANALYTICS_FIELDS)
+
+    totals = empty_totals()
+    for analysis in query.stream():
+        add_analysis(totals, analysis.to_dict())
+    return summarize_totals(totals)
+
+def get_analytics_data():
+    """
+    Get dashboard metrics for all stored analyses
+
+    Returns:
+        dict: total_analyzed, total_flagged, pass_rate, avg_score,
+            most_common_category and category_counts
+    """
+    collection = get_db().collection('analyses')
+    try:
+        return aggregate_analytics(collection)
+    except (AttributeError, NotImplementedError):
+        # Client or emulator without aggregation support
+        return scan_analytics(collection)
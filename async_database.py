@@ -0,0 +1,226 @@
+import asyncio
+import itertools
+import random
+from firebase_admin import firestore, firestore_async
+from google.api_core import exceptions as api_exceptions
+from config.settings import (
+    STORAGE_MAX_CONCURRENCY, STORAGE_MAX_RETRIES, STORAGE_RETRY_BASE_DELAY,
+    STORAGE_RETRY_MAX_DELAY, BATCH_WRITE_SIZE, OFFENDER_INDEX_ENABLED
+)
+from services.analytics import analytics_aggregations, combine_aggregations
+from services.database import (
+    CONTENTS_COLLECTION, add_offender_writes, build_analysis, build_content, initialize_firebase,
+    is_content_known, notify_write_listeners, offender_write_chunks, remember_content
+)
+
+# Errors worth retrying: the request may succeed on a later attempt
+RETRYABLE_ERRORS = (
+    api_exceptions.Aborted,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable
+)
+
+# Async client used instead of Firestore when set (e.g. an AsyncFakeClient)
+_client_override = None
+
+# Shared async Firestore client, created once per process
+_client = None
+
+def set_async_client(client):
+    """
+    Route all async storage calls to the given client instead of Firestore
+
+    Args:
+        client: A Firestore-compatible async client, or None to restore Firestore
+    """
+    global _client_override
+    _client_override = client
+
+def get_async_db():
+    """Get the shared async Firestore client"""
+    global _client
+    if _client_override is not None:
+        return _client_override
+    if _client is None:
+        initialize_firebase()
+        _client = firestore_async.client()
+    return _client
+
+async def with_retry(operation, max_retries=STORAGE_MAX_RETRIES,
+                     base_delay=STORAGE_RETRY_BASE_DELAY, max_delay=STORAGE_RETRY_MAX_DELAY):
+    """
+    Await an operation, retrying transient errors with jittered exponential backoff
+
+    Args:
+        operation: Zero-argument callable returning an awaitable; called again
+            on every attempt
+        max_retries (int): Retries after the first attempt
+        base_delay (float): Backoff cap of the first retry, in seconds
+        max_delay (float): Upper bound of any single backoff, in seconds
+
+    Returns:
+        The operation's result
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await operation()
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            # Full jitter keeps concurrent retries from synchronizing
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+async def save_analysis(username, content, results, action, degraded=False, threshold=None):
+    """
+    Save one analysis
+
+    The document id is chosen client-side so a retried write is idempotent.
+    The content document is only written the first time the text is seen.
+    The author's offender totals are updated in the same batch; a retry
+    first checks whether the analysis exists, since a commit that timed out
+    may have been applied and its increments must not count twice.
+
+    Args:
+        username (str): Username of content author
+        content (str): Analyzed content
+        results (dict): Toxicity analysis results
+        action (str): Recommended action (FLAG, REVIEW, ALLOW)
+        degraded (bool): Whether results came from the overload fallback
+        threshold (float): Threshold passed to determine_action
+
+    Returns:
+        str: Id of the stored document
+    """
+    db = get_async_db()
+    ref = db.collection('analyses').document()
+    data = build_analysis(username, content, results, action, degraded, threshold)
+    digest = data['content_hash']
+    write_content = not is_content_known(digest)
+    attempts = itertools.count()
+
+    async def commit():
+        if next(attempts) and OFFENDER_INDEX_ENABLED and (await ref.get()).exists:
+            return
+        batch = db.batch()
+        if write_content:
+            batch.set(db.collection(CONTENTS_COLLECTION).document(digest), build_content(content))
+        batch.set(ref, data)
+        if OFFENDER_INDEX_ENABLED:
+            add_offender_writes(batch, [data], db)
+        await batch.commit()
+
+    await with_retry(commit)
+    remember_content(digest)
+    notify_write_listeners()
+    return ref.id
+
+async def _commit_chunks(db, chunks, max_concurrency, offenders=False):
+    """
+    Commit chunks of (reference, data) writes as concurrent, retried batches
+
+    With offenders, each batch also carries the offender index updates of
+    its analyses. Batches are atomic, so a retry skips a chunk whose first
+    analysis exists: the timed-out commit was applied after all.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def commit(chunk, retry):
+        if retry and offenders and (await chunk[0][0].get()).exists:
+            return
+        # A fresh batch per attempt; committed batches cannot be reused
+        batch = db.batch()
+        for ref, data in chunk:
+            batch.set(ref, data)
+        if offenders:
+            add_offender_writes(batch, [data for _, data in chunk], db)
+        await batch.commit()
+
+    async def commit_bounded(chunk):
+        attempts = itertools.count()
+        async with semaphore:
+            await with_retry(lambda: commit(chunk, next(attempts) > 0))
+
+    await asyncio.gather(*(commit_bounded(chunk) for chunk in chunks))
+
+async def save_many(analyses, max_concurrency=STORAGE_MAX_CONCURRENCY, batch_size=BATCH_WRITE_SIZE):
+    """
+    Save many analyses as concurrent batched writes
+
+    Each distinct text not already stored is written once, and all content
+    documents are committed before the analyses that reference them. Each
+    batch of analyses carries the offender index updates for its authors.
+
+    Args:
+        analyses (iterable): Dicts with username, content, results, action
+            and optionally degraded and threshold
+        max_concurrency (int): Batches committed at the same time
+        batch_size (int): Documents per batch (Firestore allows 500)
+
+    Returns:
+        list: Ids of the stored documents, in input order
+    """
+    db = get_async_db()
+    analyses = list(analyses)
+    collection = db.collection('analyses')
+    writes = [(collection.document(), build_analysis(**analysis)) for analysis in analyses]
+
+    new_contents = {}
+    for analysis, (_, data) in zip(analyses, writes):
+        digest = data['content_hash']
+        if digest not in new_contents and not is_content_known(digest):
+            new_contents[digest] = analysis['content']
+    content_writes = [
+        (db.collection(CONTENTS_COLLECTION).document(digest), build_content(content))
+        for digest, content in new_contents.items()
+    ]
+
+    content_chunks = [content_writes[i:i + batch_size] for i in range(0, len(content_writes), batch_size)]
+    await _commit_chunks(db, content_chunks, max_concurrency)
+    for digest in new_contents:
+        remember_content(digest)
+    await _commit_chunks(db, list(offender_write_chunks(writes, batch_size)), max_concurrency,
+                         offenders=OFFENDER_INDEX_ENABLED)
+    notify_write_listeners()
+    return [ref.id for ref, _ in writes]
+
+async def recent(limit=5):
+    """
+    Get the most recent analyses
+
+    Args:
+        limit (int): Number of analyses to return
+
+    Returns:
+        list: Analysis dicts, newest first, each with its document 'id'
+    """
+    query = (
+        get_async_db().collection('analyses')
+        .order_by('timestamp', direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+
+    async def fetch():
+        return [dict(snapshot.to_dict(), id=snapshot.id) async for snapshot in query.stream()]
+
+    return await with_retry(fetch)
+
+async def aggregate(max_concurrency=STORAGE_MAX_CONCURRENCY):
+    """
+    Compute dashboard metrics, running the aggregation queries concurrently
+
+    Args:
+        max_concurrency (int): Aggregation queries in flight at the same time
+
+    Returns:
+        dict: Same metrics as services.analytics.get_analytics_data
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(aggregation):
+        async with semaphore:
+            return await with_retry(aggregation.get)
+
+    aggregations = analytics_aggregations(get_async_db().collection('analyses'))
+    return combine_aggregations(await asyncio.gather(*(run(a) for a in aggregations)))
@@ -0,0 +1,530 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+from config.settings import TOXICITY_CATEGORIES, DEFAULT_THRESHOLD
+from models.toxicity import (
+    keyword_filter_check, model_predict_batch, predict_toxicity, predict_toxicity_batch, warm_up
+)
+from services import async_database
+from services.analytics import aggregate_analytics, scan_analytics
+from services.database import get_analyses, save_analysis_to_firestore, set_client
+from services.fake_firestore import AsyncFakeClient, FakeClient, populate
+from services.moderation import determine_action
+
+RESULTS_DIR = "benchmark_results"
+
+SAMPLE_TEXTS = [
+    "This movie is absolutely terrible! The director should be fired.",
+    "Thanks for sharing, this was a really helpful explanation.",
+    "You are an idiot and everyone here knows it.",
+    "The so-called experts are all just paid shills, don't listen to their lies."
+]
+
+def build_tiny_model(seed=0):
+    """
+    Build a tiny randomly-initialized BERT classifier and tokenizer
+
+    Has the same interface and output shape as the production model, so the
+    pipeline can be benchmarked offline without downloading weights.
+
+    Args:
+        seed (int): Seed for the random initialization
+
+    Returns:
+        tuple: (model, tokenizer)
+    """
+    import torch
+
+    words = sorted({word.strip('.,!\'').lower() for text in SAMPLE_TEXTS for word in text.split()})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list("abcdefghijklmnopqrstuvwxyz") + words
+
+    vocab_dir = tempfile.mkdtemp(prefix="tiny-bert-")
+    vocab_file = os.path.join(vocab_dir, "vocab.txt")
+    with open(vocab_file, 'w') as f:
+        f.write("\n".join(vocab))
+    tokenizer = BertTokenizer(vocab_file)
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        num_labels=len(TOXICITY_CATEGORIES),
+        problem_type="multi_label_classification"
+    )
+    model = BertForSequenceClassification(config)
+    model.eval()
+    return model, tokenizer
+
+def load_benchmark_model(source):
+    """
+    Load the model used by a benchmark
+
+    Args:
+        source (str): "tiny" for the offline random model, "registry" for the
+            pinned production artifact
+
+    Returns:
+        tuple: (model, tokenizer)
+    """
+    if source == "registry":
+        from models.toxicity import load_model_artifacts
+        return load_model_artifacts()
+    return build_tiny_model()
+
+def first_request_arm(warmup, source):
+    """
+    Measure first and second request latency in the current process
+
+    Args:
+        warmup (bool): Whether to warm up the model before the first request
+        source (str): Model source, see load_benchmark_model
+
+    Returns:
+        dict: Latencies in milliseconds
+    """
+    model, tokenizer = load_benchmark_model(source)
+    if warmup:
+        warm_up(model, tokenizer)
+
+    latencies = []
+    for text in SAMPLE_TEXTS[:2]:
+        start = time.perf_counter()
+        predict_toxicity(model, tokenizer, text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'warmup': warmup,
+        'first_request_ms': latencies[0],
+        'second_request_ms': latencies[1]
+    }
+
+def bench_first_request(source="tiny", repeats=3):
+    """
+    Compare first-request latency with and without warm-up
+
+    Each measurement runs in a fresh interpreter so lazy initialization is
+    not shared between arms.
+
+    Args:
+        source (str): Model source, see load_benchmark_model
+        repeats (int): Fresh processes per arm
+
+    Returns:
+        list: One result dict per run
+    """
+    runs = []
+    for warmup in (False, True):
+        for _ in range(repeats):
+            args = [sys.executable, "-m", "benchmarks", "--first-request-arm", "--source", source]
+            if warmup:
+                args.append("--warmup")
+            output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    return runs
+
+def _memory_usage_kb():
+    """Resident and proportional set size of this process in kB (Linux only)"""
+    usage = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                usage[f"{key.lower()}_kb"] = int(value.split()[0])
+    return usage
+
+def model_memory_arm(mmap):
+    """
+    Load the registry model and report startup time, then memory once the
+    parent signals on stdin that every worker has loaded
+
+    Args:
+        mmap (bool): Back the weights with the mapped file
+    """
+    from models.toxicity import load_model_artifacts
+
+    start = time.perf_counter()
+    load_model_artifacts(mmap=mmap)
+    print(json.dumps({'load_seconds': time.perf_counter() - start}), flush=True)
+    sys.stdin.readline()
+    print(json.dumps(_memory_usage_kb()), flush=True)
+
+def bench_model_memory(workers=4):
+    """
+    Startup time and memory of worker processes serving the registry model
+
+    Compares mmap-backed weights with the private copies from_pretrained
+    allocates. The workers run side by side, and PSS divides shared pages
+    among the processes mapping them, so its sum is what the workers
+    together really occupy; RSS counts shared pages once per process.
+
+    Args:
+        workers (int): Processes loading the model at the same time
+
+    Returns:
+        dict: Per mode, the slowest load and total RSS and PSS in MB
+    """
+    report = {}
+    for mmap in (False, True):
+        args = [sys.executable, "-m", "benchmarks", "--memory-arm"] + ([] if mmap else ["--no-mmap"])
+        processes = [
+            subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            for _ in range(workers)
+        ]
+        loads = [json.loads(process.stdout.readline()) for process in processes]
+        for process in processes:
+            process.stdin.write("\n")
+            process.stdin.flush()
+        usage = [json.loads(process.stdout.readline()) for process in processes]
+        for process in processes:
+            process.wait()
+        report['mmap' if mmap else 'private'] = {
+            'workers': workers,
+            'load_seconds_max': max(load['load_seconds'] for load in loads),
+            'rss_mb_total': sum(item['rss_kb'] for item in usage) / 1024,
+            'pss_mb_total': sum(item['pss_kb'] for item in usage) / 1024
+        }
+    return report
+
+def _latencies_ms(func, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(0.95 * (len(latencies) - 1))],
+        'mean_ms': statistics.fmean(latencies)
+    }
+
+def _throughput(func, items, min_seconds=0.5):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return calls * items / elapsed
+
+def make_text(num_words):
+    """Build a synthetic comment of roughly num_words words from the samples"""
+    words = " ".join(SAMPLE_TEXTS).split()
+    return " ".join(words[i % len(words)] for i in range(num_words))
+
+def bench_single_latency(model, tokenizer, iterations=50):
+    """Latency of predict_toxicity on one short comment"""
+    predict_toxicity(model, tokenizer, SAMPLE_TEXTS[0])
+    return _latencies_ms(lambda: predict_toxicity(model, tokenizer, SAMPLE_TEXTS[0]), iterations)
+
+def bench_batch_throughput(model, tokenizer, batch_sizes=(1, 8, 32), lengths=(16, 64, 256)):
+    """Items per second of predict_toxicity_batch per (batch size, text length)"""
+    results = []
+    for length in lengths:
+        text = make_text(length)
+        for batch_size in batch_sizes:
+            batch = [text] * batch_size
+            predict_toxicity_batch(model, tokenizer, batch)
+            results.append({
+                'batch_size': batch_size,
+                'words': length,
+                'items_per_s': _throughput(lambda: predict_toxicity_batch(model, tokenizer, batch), batch_size)
+            })
+    return results
+
+def bench_padding_free(batch_size=64, long_fraction=0.1, tolerance=1e-4):
+    """
+    Eager padded batches vs fused attention with length bucketing, on a length-skewed batch
+
+    Also checks numerical parity of the fast path against the eager path.
+
+    Args:
+        batch_size (int): Texts per batch
+        long_fraction (float): Share of long (256-word) texts; the rest are 8 words
+        tolerance (float): Maximum allowed absolute score difference
+    """
+    model, tokenizer = build_tiny_model()
+    model_dir = tempfile.mkdtemp(prefix="tiny-bert-sdpa-")
+    model.save_pretrained(model_dir)
+    # Both loaded explicitly, so the baseline doesn't follow transformers' default
+    model = BertForSequenceClassification.from_pretrained(model_dir, attn_implementation="eager")
+    model.eval()
+    fused = BertForSequenceClassification.from_pretrained(model_dir, attn_implementation="sdpa")
+    fused.eval()
+
+    long_count = max(1, int(batch_size * long_fraction))
+    batch = [make_text(256)] * long_count + [make_text(8)] * (batch_size - long_count)
+
+    eager_scores = model_predict_batch(model, tokenizer, batch, bucketing=False)
+    fast_scores = model_predict_batch(fused, tokenizer, batch, bucketing=True)
+    max_diff = max(
+        abs(eager[c] - fast[c]) for eager, fast in zip(eager_scores, fast_scores) for c in TOXICITY_CATEGORIES
+    )
+    return {
+        'eager_padded_items_per_s': _throughput(
+            lambda: model_predict_batch(model, tokenizer, batch, bucketing=False), batch_size
+        ),
+        'fused_bucketed_items_per_s': _throughput(
+            lambda: model_predict_batch(fused, tokenizer, batch, bucketing=True), batch_size
+        ),
+        'max_abs_diff': max_diff,
+        'parity': max_diff <= tolerance
+    }
+
+def bench_keyword_filter():
+    """Texts per second through keyword_filter_check"""
+    texts = [make_text(n) for n in (8, 32, 128)]
+    return {
+        'texts_per_s': _throughput(lambda: [keyword_filter_check(text) for text in texts], len(texts))
+    }
+
+def bench_determine_action():
+    """Decisions per second from determine_action"""
+    results = [
+        {category: (i * 0.07 + j * 0.13) % 1.0 for j, category in enumerate(TOXICITY_CATEGORIES)}
+        for i in range(100)
+    ]
+    return {
+        'decisions_per_s': _throughput(
+            lambda: [determine_action(r, DEFAULT_THRESHOLD) for r in results], len(results)
+        )
+    }
+
+def bench_feed_render(posts=100):
+    """
+    Size and build time of the HTML for a feed of posts
+
+    The feed is sent to the browser as one element; the stylesheet is only
+    part of the first run of a session.
+    """
+    from frontend.components import render_post_html
+    from frontend.styles import CSS
+
+    feed = [
+        (f"User {i}", f"{i} min ago", make_text(40), "U",
+         {category: (i * 0.07 + j * 0.13) % 1.0 for j, category in enumerate(TOXICITY_CATEGORIES)})
+        for i in range(posts)
+    ]
+
+    def render():
+        return "".join(
+            render_post_html(author, time_ago, content, avatar, results, DEFAULT_THRESHOLD)
+            for author, time_ago, content, avatar, results in feed
+        )
+
+    return {
+        'render': _latencies_ms(render, 20),
+        'feed_bytes': len(render().encode()),
+        'css_bytes_first_run': len(CSS.encode())
+    }
+
+def bench_storage(count=2000):
+    """Write and read throughput of services.database against the in-process fake"""
+    set_client(FakeClient())
+    try:
+        scores = {category: 0.1 for category in TOXICITY_CATEGORIES}
+        start = time.perf_counter()
+        for i in range(count):
+            save_analysis_to_firestore(f"user{i % 50}", make_text(20), scores, "ALLOW")
+        write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        read = sum(1 for _ in get_analyses())
+        read_seconds = time.perf_counter() - start
+    finally:
+        set_client(None)
+    return {
+        'writes_per_s': count / write_seconds,
+        'reads_per_s': read / read_seconds
+    }
+
+def bench_analytics(count=100000):
+    """
+    Latency and bytes transferred of the analytics strategies on a fake collection
+
+    Compares the original full-document scan, the field-projected scan and
+    server-side aggregation queries.
+    """
+    client = populate(FakeClient(), count)
+    collection = client.collection('analyses')
+    strategies = {
+        'full_scan': lambda: scan_analytics(collection, projected=False),
+        'projected_scan': lambda: scan_analytics(collection),
+        'aggregation': lambda: aggregate_analytics(collection)
+    }
+    results = {}
+    for name, func in strategies.items():
+        client.bytes_transferred = 0
+        start = time.perf_counter()
+        func()
+        results[name] = {
+            'latency_ms': (time.perf_counter() - start) * 1000,
+            'bytes': client.bytes_transferred
+        }
+    return results
+
+def bench_async_storage(count=500, latency=0.01):
+    """
+    Sequential sync writes vs the async storage layer, with injected latency
+
+    Args:
+        count (int): Analyses written per strategy
+        latency (float): Simulated round-trip time in seconds
+    """
+    scores = {category: 0.1 for category in TOXICITY_CATEGORIES}
+    analyses = [
+        {'username': f"user{i % 50}", 'content': make_text(20), 'results': scores, 'action': "ALLOW"}
+        for i in range(count)
+    ]
+    results = {}
+
+    set_client(FakeClient(latency=latency))
+    try:
+        start = time.perf_counter()
+        for analysis in analyses:
+            save_analysis_to_firestore(**analysis)
+        results['sync_sequential_writes_per_s'] = count / (time.perf_counter() - start)
+    finally:
+        set_client(None)
+
+    async def concurrent_singles():
+        semaphore = asyncio.Semaphore(async_database.STORAGE_MAX_CONCURRENCY)
+
+        async def save(analysis):
+            async with semaphore:
+                await async_database.save_analysis(**analysis)
+
+        await asyncio.gather(*(save(analysis) for analysis in analyses))
+
+    async_database.set_async_client(AsyncFakeClient(latency=latency))
+    try:
+        start = time.perf_counter()
+        asyncio.run(concurrent_singles())
+        results['async_concurrent_writes_per_s'] = count / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(async_database.save_many(analyses, batch_size=50))
+        results['async_batched_writes_per_s'] = count / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(async_database.aggregate())
+        results['async_aggregate_ms'] = (time.perf_counter() - start) * 1000
+    finally:
+        async_database.set_async_client(None)
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_suite(source="tiny"):
+    """
+    Run the full benchmark suite
+
+    Args:
+        source (str): Model source, see load_benchmark_model
+
+    Returns:
+        dict: Results with environment metadata
+    """
+    import torch
+
+    model, tokenizer = load_benchmark_model(source)
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'threads': torch.get_num_threads(),
+        'source': source,
+        'benchmarks': {
+            'single_latency': bench_single_latency(model, tokenizer),
+            'batch_throughput': bench_batch_throughput(model, tokenizer),
+            'padding_free': bench_padding_free(),
+            'keyword_filter': bench_keyword_filter(),
+            'determine_action': bench_determine_action(),
+            'feed_render': bench_feed_render(),
+            'storage': bench_storage(),
+            'analytics': bench_analytics(),
+            'async_storage': bench_async_storage()
+        }
+    }
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(_flatten(child, f"{prefix}{key}."))
+        return items
+    if isinstance(value, list):
+        items = {}
+        for child in value:
+            key = ",".join(f"{k}={v}" for k, v in child.items() if not isinstance(v, float))
+            items.update(_flatten({k: v for k, v in child.items() if isinstance(v, float)}, f"{prefix}{key}."))
+        return items
+    return {prefix.rstrip("."): value}
+
+def compare_results(baseline_path, candidate_path):
+    """
+    Print the ratio candidate/baseline for every metric of two result files
+
+    Args:
+        baseline_path (str): Results JSON of the reference commit
+        candidate_path (str): Results JSON of the commit under test
+    """
+    with open(baseline_path) as f:
+        baseline = _flatten(json.load(f)['benchmarks'])
+    with open(candidate_path) as f:
+        candidate = _flatten(json.load(f)['benchmarks'])
+    for key in sorted(baseline.keys() & candidate.keys()):
+        if baseline[key]:
+            print(f"{key:60s} {baseline[key]:14.2f} {candidate[key]:14.2f} {candidate[key] / baseline[key]:7.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring pipeline benchmarks")
+    parser.add_argument("--source", choices=["tiny", "registry"], default="tiny")
+    parser.add_argument("--output", help="Results file (default: benchmark_results/<commit>.json)")
+    parser.add_argument("--first-request", action="store_true", help="Only compare warm/cold first request")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files")
+    parser.add_argument("--memory", type=int, metavar="WORKERS",
+                        help="Only compare startup time and memory of WORKERS processes (registry model)")
+    parser.add_argument("--first-request-arm", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--memory-arm", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--no-mmap", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.first_request_arm:
+        print(json.dumps(first_request_arm(args.warmup, args.source)))
+    elif args.memory_arm:
+        model_memory_arm(not args.no_mmap)
+    elif args.memory:
+        print(json.dumps(bench_model_memory(args.memory), indent=2))
+    elif args.first_request:
+        print(json.dumps(bench_first_request(args.source), indent=2))
+    elif args.compare:
+        compare_results(*args.compare)
+    else:
+        results = run_suite(args.source)
+        output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {output}")
@@ -0,0 +1,216 @@
+import argparse
+import json
+import time
+import numpy as np
+from config.settings import (
+    TOXICITY_CATEGORIES, DEFAULT_THRESHOLD, FLAG_MARGIN, CALIBRATION_FLAG_PRECISION, EXPORT_PAGE_SIZE
+)
+from services.database import get_db
+
+# Fields read for calibration; labeled_at also restricts the query to labeled analyses
+CALIBRATION_FIELDS = ['results', 'labels', 'labeled_at']
+
+def load_labeled_scores(page_size=EXPORT_PAGE_SIZE):
+    """
+    Load the stored scores and moderator labels of all labeled analyses
+
+    Ordering by labeled_at skips unlabeled analyses on the server, since
+    Firestore leaves documents without the field out of the result.
+
+    Args:
+        page_size (int): Analyses per request
+
+    Returns:
+        tuple: (scores, labels) arrays of shape (analyses, categories), in
+            TOXICITY_CATEGORIES order
+    """
+    query = get_db().collection('analyses').order_by('labeled_at').select(CALIBRATION_FIELDS)
+    scores = []
+    labels = []
+    last = None
+    while True:
+        page_query = query if last is None else query.start_after(last)
+        page = list(page_query.limit(page_size).stream())
+        for snapshot in page:
+            results = snapshot.get('results') or {}
+            verdict = snapshot.get('labels') or {}
+            scores.append([results.get(category, 0.0) for category in TOXICITY_CATEGORIES])
+            labels.append([bool(verdict.get(category)) for category in TOXICITY_CATEGORIES])
+        if len(page) < page_size:
+            break
+        last = page[-1]
+    shape = (len(scores), len(TOXICITY_CATEGORIES))
+    return (np.array(scores, dtype=np.float64).reshape(shape), np.array(labels, dtype=bool).reshape(shape))
+
+def sweep(scores, labels):
+    """
+    Precision, recall and false positive rate at every distinct threshold
+
+    One sort and one cumulative sum: with scores sorted in descending order,
+    the items predicted positive at a threshold are a prefix, so the true
+    and false positive counts at all thresholds are prefix sums.
+
+    Args:
+        scores (np.ndarray): Scores, shape (n,)
+        labels (np.ndarray): Whether each item is truly positive, shape (n,)
+
+    Returns:
+        dict: Arrays over thresholds in descending order: thresholds, tp,
+            fp, precision, recall, fpr; and the positives and negatives
+    """
+    # Order within tied scores doesn't matter, so the faster unstable sort will do
+    order = np.argsort(-scores)
+    sorted_scores = scores[order]
+    sorted_labels = labels[order]
+    tp = np.cumsum(sorted_labels)
+    fp = np.cumsum(~sorted_labels)
+
+    # A threshold predicts everything scored at or above it, so only the
+    # last position of each run of tied scores is a distinct cut
+    last_of_run = np.ones(len(scores), dtype=bool)
+    last_of_run[:-1] = sorted_scores[1:] != sorted_scores[:-1]
+    tp = tp[last_of_run]
+    fp = fp[last_of_run]
+    positives = int(labels.sum())
+    negatives = len(labels) - positives
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+        recall = tp / positives if positives else np.zeros(len(tp))
+        fpr = fp / negatives if negatives else np.zeros(len(fp))
+    return {
+        'thresholds': sorted_scores[last_of_run],
+        'tp': tp,
+        'fp': fp,
+        'precision': precision,
+        'recall': recall,
+        'fpr': fpr,
+        'positives': positives,
+        'negatives': negatives
+    }
+
+def rates_at(curve, threshold):
+    """
+    Precision, recall and false positive rate of one threshold
+
+    Args:
+        curve (dict): Output of sweep
+        threshold (float): Items scored at or above it are predicted positive
+
+    Returns:
+        dict: precision, recall and fpr (None without labeled data)
+    """
+    # Thresholds are descending; count the cuts at or above the threshold
+    index = np.searchsorted(-curve['thresholds'], -threshold, side='right') - 1
+    if curve['positives'] + curve['negatives'] == 0:
+        return {'precision': None, 'recall': None, 'fpr': None}
+    if index < 0:
+        return {'precision': 1.0, 'recall': 0.0, 'fpr': 0.0}
+    return {
+        'precision': float(curve['precision'][index]),
+        'recall': float(curve['recall'][index]),
+        'fpr': float(curve['fpr'][index])
+    }
+
+def recommend(curve, min_precision=None):
+    """
+    Recommend a threshold from a sweep
+
+    Args:
+        curve (dict): Output of sweep
+        min_precision (float): If given, the lowest threshold (highest
+            recall) reaching this precision; otherwise the best F1
+
+    Returns:
+        dict: threshold with its precision, recall and fpr, or None if no
+            threshold qualifies
+    """
+    if min_precision is None:
+        precision, recall = curve['precision'], curve['recall']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        candidates = np.flatnonzero(f1 == f1.max()) if len(f1) else []
+    else:
+        candidates = np.flatnonzero(curve['precision'] >= min_precision)
+    if len(candidates) == 0:
+        return None
+    index = candidates[-1]
+    return {
+        'threshold': float(curve['thresholds'][index]),
+        'precision': float(curve['precision'][index]),
+        'recall': float(curve['recall'][index]),
+        'fpr': float(curve['fpr'][index])
+    }
+
+def overall_curve(scores, labels):
+    """
+    Sweep of the decision determine_action makes: max category score
+    against whether any category is labeled toxic
+    """
+    return sweep(scores.max(axis=1), labels.any(axis=1))
+
+def calibrate(scores, labels, flag_precision=CALIBRATION_FLAG_PRECISION, threshold=DEFAULT_THRESHOLD):
+    """
+    Recommend thresholds from labeled scores
+
+    Args:
+        scores (np.ndarray): Stored scores, shape (analyses, categories)
+        labels (np.ndarray): Moderator labels, same shape
+        flag_precision (float): Precision required for flagging without review
+        threshold (float): Current threshold, reported for comparison
+
+    Returns:
+        dict: Per-category recommendations, the recommended review
+            threshold and FLAG_MARGIN, and the current operating point
+    """
+    categories = {}
+    for column, category in enumerate(TOXICITY_CATEGORIES):
+        curve = sweep(scores[:, column], labels[:, column])
+        categories[category] = {
+            'positives': curve['positives'],
+            'best_f1': recommend(curve)
+        }
+
+    curve = overall_curve(scores, labels)
+    review = recommend(curve)
+    flag = recommend(curve, flag_precision)
+    flag_margin = None
+    if review is not None and flag is not None:
+        flag_margin = max(0.0, flag['threshold'] - review['threshold'])
+    return {
+        'labeled': len(scores),
+        'categories': categories,
+        'review_threshold': review,
+        'flag_threshold': flag,
+        'flag_margin': flag_margin,
+        'current': {
+            'threshold': threshold,
+            'flag_margin': FLAG_MARGIN,
+            'review_or_flag': rates_at(curve, threshold),
+            'flag': rates_at(curve, threshold + FLAG_MARGIN)
+        }
+    }
+
+def synthetic_labeled_scores(count, seed=0):
+    """Random labeled scores where toxic items tend to score higher, for timing the sweep"""
+    rng = np.random.default_rng(seed)
+    labels = rng.random((count, len(TOXICITY_CATEGORIES))) < 0.1
+    scores = np.clip(rng.normal(0.25 + 0.5 * labels, 0.2), 0.0, 1.0)
+    return scores, labels
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate moderation thresholds against moderator labels")
+    parser.add_argument("--flag-precision", type=float, default=CALIBRATION_FLAG_PRECISION)
+    parser.add_argument("--synthetic", type=int, help="Use this many synthetic labeled rows instead of Firestore")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.synthetic:
+        scores, labels = synthetic_labeled_scores(args.synthetic)
+    else:
+        scores, labels = load_labeled_scores()
+    loaded = time.perf_counter()
+    report = calibrate(scores, labels, args.flag_precision)
+    report['load_seconds'] = loaded - start
+    report['calibration_seconds'] = time.perf_counter() - loaded
+    print(json.dumps(report, indent=2))
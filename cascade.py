@@ -0,0 +1,252 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+import zlib
+from array import array
+from config.settings import (
+    TOXICITY_CATEGORIES, DEFAULT_THRESHOLD, CASCADE_MODEL_PATH, CASCADE_LOW, CASCADE_HIGH,
+    CASCADE_NUM_BUCKETS
+)
+from models.near_duplicates import normalize_text
+
+def _sigmoid(x):
+    if x >= 0:
+        return 1 / (1 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1 + z)
+
+class HashedLinearModel:
+    """
+    Multi-label logistic regression over hashed n-gram features
+
+    Features are word unigrams, word bigrams and character 4-grams of the
+    normalized text, hashed into num_buckets slots. Scoring is a handful of
+    array lookups per feature, orders of magnitude cheaper than BERT.
+
+    Persisted as <path>.json (metadata) plus <path>.bin (float32 weights,
+    bucket-major with one weight per category).
+
+    Args:
+        num_buckets (int): Size of the hashed feature space
+        categories (list): Output categories
+    """
+
+    def __init__(self, num_buckets=CASCADE_NUM_BUCKETS, categories=TOXICITY_CATEGORIES):
+        self.num_buckets = num_buckets
+        self.categories = list(categories)
+        self.weights = array('f', bytes(4 * num_buckets * len(self.categories)))
+        self.bias = [0.0] * len(self.categories)
+
+    def features(self, text):
+        """
+        Hashed feature buckets of a text
+
+        Args:
+            text (str): Raw text
+
+        Returns:
+            list: Distinct bucket indices
+        """
+        text = normalize_text(text)
+        words = text.split()
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        grams += [f"#{text[i:i + 4]}" for i in range(max(0, len(text) - 3))]
+        return list({zlib.crc32(gram.encode('utf-8')) % self.num_buckets for gram in grams})
+
+    def _logits(self, buckets):
+        size = len(self.categories)
+        scale = 1 / math.sqrt(len(buckets)) if buckets else 0.0
+        logits = list(self.bias)
+        weights = self.weights
+        for bucket in buckets:
+            offset = bucket * size
+            for c in range(size):
+                logits[c] += weights[offset + c] * scale
+        return logits
+
+    def predict(self, text):
+        """
+        Score a text
+
+        Args:
+            text (str): Text to score
+
+        Returns:
+            dict: Probability per category, same shape as predict_toxicity
+        """
+        logits = self._logits(self.features(text))
+        return {category: _sigmoid(logit) for category, logit in zip(self.categories, logits)}
+
+    def fit(self, texts, targets, epochs=5, learning_rate=0.5, seed=0):
+        """
+        Train with SGD on soft targets (the teacher's probabilities)
+
+        Args:
+            texts (list): Training texts
+            targets (list): Score dicts for each text
+            epochs (int): Passes over the data
+            learning_rate (float): SGD step size
+            seed (int): Shuffle seed
+        """
+        size = len(self.categories)
+        examples = [
+            (self.features(text), [target[c] for c in self.categories])
+            for text, target in zip(texts, targets)
+        ]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            for buckets, target in examples:
+                logits = self._logits(buckets)
+                scale = 1 / math.sqrt(len(buckets)) if buckets else 0.0
+                gradients = [_sigmoid(logit) - y for logit, y in zip(logits, target)]
+                for c in range(size):
+                    self.bias[c] -= learning_rate * gradients[c]
+                for bucket in buckets:
+                    offset = bucket * size
+                    for c in range(size):
+                        self.weights[offset + c] -= learning_rate * gradients[c] * scale
+
+    def save(self, path):
+        """Write the model to <path>.json and <path>.bin"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.bin", 'wb') as f:
+            self.weights.tofile(f)
+        with open(f"{path}.json", 'w') as f:
+            json.dump({
+                'num_buckets': self.num_buckets,
+                'categories': self.categories,
+                'bias': self.bias
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read a model written by save"""
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        model = cls(meta['num_buckets'], meta['categories'])
+        model.bias = meta['bias']
+        with open(f"{path}.bin", 'rb') as f:
+            model.weights = array('f')
+            model.weights.fromfile(f, meta['num_buckets'] * len(meta['categories']))
+        return model
+
+def needs_escalation(scores, low=CASCADE_LOW, high=CASCADE_HIGH):
+    """Whether first-stage scores fall inside the uncertainty band"""
+    return low <= max(scores.values()) < high
+
+def cascade_predict(first_stage, sentences, escalate, low=CASCADE_LOW, high=CASCADE_HIGH):
+    """
+    Score sentences with the first stage, escalating uncertain ones
+
+    Args:
+        first_stage (HashedLinearModel): Cheap classifier
+        sentences (list): Texts to score
+        escalate: Callable scoring a list of texts with the full model
+        low (float): Lower edge of the uncertainty band (max category score)
+        high (float): Upper edge of the uncertainty band
+
+    Returns:
+        tuple: (list of score dicts, list of escalated flags)
+    """
+    results = [first_stage.predict(sentence) for sentence in sentences]
+    escalated = [needs_escalation(scores, low, high) for scores in results]
+    uncertain = [sentence for sentence, flag in zip(sentences, escalated) if flag]
+    if uncertain:
+        full_scores = iter(escalate(uncertain))
+        results = [next(full_scores) if flag else scores for scores, flag in zip(results, escalated)]
+    return results, escalated
+
+def evaluate(first_stage, texts, teacher_scores, teacher_seconds_per_item,
+             low=CASCADE_LOW, high=CASCADE_HIGH, threshold=DEFAULT_THRESHOLD):
+    """
+    Report escalation rate, decision agreement and throughput gain
+
+    Args:
+        first_stage (HashedLinearModel): Trained first stage
+        texts (list): Held-out texts
+        teacher_scores (list): BERT scores for the texts
+        teacher_seconds_per_item (float): Measured BERT cost per text
+        low (float): Lower edge of the uncertainty band
+        high (float): Upper edge of the uncertainty band
+        threshold (float): Threshold passed to determine_action
+
+    Returns:
+        dict: Evaluation report
+    """
+    from services.moderation import determine_action
+
+    start = time.perf_counter()
+    first_scores = [first_stage.predict(text) for text in texts]
+    first_seconds_per_item = (time.perf_counter() - start) / len(texts)
+
+    escalations = agreements = 0
+    for scores, teacher in zip(first_scores, teacher_scores):
+        escalated = needs_escalation(scores, low, high)
+        escalations += escalated
+        final = teacher if escalated else scores
+        agreements += determine_action(final, threshold)[0] == determine_action(teacher, threshold)[0]
+
+    escalation_rate = escalations / len(texts)
+    cascade_seconds = first_seconds_per_item + escalation_rate * teacher_seconds_per_item
+    return {
+        'texts': len(texts),
+        'escalation_rate': escalation_rate,
+        'decision_agreement': agreements / len(texts),
+        'first_stage_ms_per_item': first_seconds_per_item * 1000,
+        'bert_ms_per_item': teacher_seconds_per_item * 1000,
+        'throughput_gain': teacher_seconds_per_item / cascade_seconds
+    }
+
+def label_corpus(texts, batch_size=32):
+    """
+    Score texts with toxic-bert to use as training targets
+
+    Args:
+        texts (list): Unlabeled texts
+        batch_size (int): Texts per forward pass
+
+    Returns:
+        tuple: (list of score dicts, seconds per item)
+    """
+    from models.toxicity import load_model_artifacts, model_predict_batch
+
+    model, tokenizer = load_model_artifacts()
+    scores = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        scores.extend(model_predict_batch(model, tokenizer, texts[i:i + batch_size]))
+    return scores, (time.perf_counter() - start) / len(texts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the first-stage cascade classifier")
+    parser.add_argument("corpus", help="Text file with one comment per line")
+    parser.add_argument("--output", default=CASCADE_MODEL_PATH)
+    parser.add_argument("--labels", help="JSONL cache of teacher scores (read if present, else written)")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    if args.labels and os.path.exists(args.labels):
+        with open(args.labels) as f:
+            records = [json.loads(line) for line in f]
+        teacher_scores = [record['scores'] for record in records]
+        teacher_seconds = records[0]['seconds_per_item']
+    else:
+        teacher_scores, teacher_seconds = label_corpus(texts)
+        if args.labels:
+            with open(args.labels, 'w') as f:
+                for scores in teacher_scores:
+                    f.write(json.dumps({'scores': scores, 'seconds_per_item': teacher_seconds}) + "\n")
+
+    split = int(len(texts) * (1 - args.holdout))
+    first_stage = HashedLinearModel()
+    first_stage.fit(texts[:split], teacher_scores[:split], epochs=args.epochs)
+    first_stage.save(args.output)
+    print(json.dumps(evaluate(first_stage, texts[split:], teacher_scores[split:], teacher_seconds), indent=2))
@@ -1,6 +1,10 @@
+import html
 import streamlit as st
 from models.toxicity import predict_toxicity, keyword_filter_check
 from services.moderation import determine_action
+from services.metrics import is_enabled, stage_summary
+from services.database import ALL_TIME
+from services.offenders import current_week
 from config.settings import RISK_LEVELS, AVATAR_COLORS
 
 def analytics_card(title, value, icon, color="#7986CB"):
@@ -28,92 +32,193 @@ def analytics_card(title, value, icon, color="#7986CB"):
         unsafe_allow_html=True
     )
 
-def display_post(author, time_ago, content, avatar_text, model, tokenizer, threshold=0.5, avatar_color=None):
+def instrumentation_panel():
     """
-    Display a post with toxicity analysis
-    
-    Args:
-        author (str): Post author name
-        time_ago (str): Time indicator
-        content (str): Post content
-        avatar_text (str): Text to show in avatar
-        model: The pre-trained model
-        tokenizer: The tokenizer for the model
-        threshold (float): Toxicity threshold
-        avatar_color (str): Color for avatar background
+    Display recent p50/p95 latency per pipeline stage in the sidebar
     """
-    if avatar_color is None:
-        avatar_color = AVATAR_COLORS["default"]
+    if not is_enabled():
+        return
+        
+    with st.sidebar.expander("Pipeline Timings", expanded=False):
+        summary = stage_summary()
+        if not summary:
+            st.caption("No requests timed yet")
+            return
         
-    with st.container():
+        rows = "".join(
+            f"<tr><td>{name}</td><td>{stats['count']}</td>"
+            f"<td>{stats['p50_ms']:.1f}</td><td>{stats['p95_ms']:.1f}</td></tr>"
+            for name, stats in summary.items()
+        )
         st.markdown(
             f"""
-            <div class="post-card">
-                <div class="post-header">
-                    <div class="avatar" style="background-color: {avatar_color};">
-                        <span>{avatar_text}</span>
-                    </div>
-                    <div class="post-meta">
-                        <div class="author">{author}</div>
-                        <div class="time">{time_ago}</div>
-                    </div>
-                </div>
-                <div class="post-content">
-                    {content}
-                </div>
+            <table style="font-size: 0.8rem; width: 100%;">
+                <tr><th>Stage</th><th>n</th><th>p50 ms</th><th>p95 ms</th></tr>
+                {rows}
+            </table>
             """,
             unsafe_allow_html=True
         )
+
+def offenders_panel(load_offenders):
+    """
+    Display the usernames flagged most, this week or all time, in the sidebar
     
-    # Analyze the content
-    results = predict_toxicity(model, tokenizer, content)
-    
-    # Get top 2 categories for display
-    top_categories = sorted(results.items(), key=lambda x: x[1], reverse=True)[:2]
-    
-    # Determine action
-    action, action_color = determine_action(results, threshold)
-    
-    # Display results for top categories
-    st.markdown('<div class="analysis-results">', unsafe_allow_html=True)
-    
-    for label, prob in top_categories:
-        # Determine risk level
-        if prob >= RISK_LEVELS["high"]["threshold"]:
-            bar_class = RISK_LEVELS["high"]["class"]
-        elif prob >= RISK_LEVELS["medium"]["threshold"]:
-            bar_class = RISK_LEVELS["medium"]["class"]
-        else:
-            bar_class = RISK_LEVELS["low"]["class"]
-            
+    Args:
+        load_offenders: Callable taking a period and returning
+            services.offenders.top_offenders results
+    """
+    with st.sidebar.expander("Repeat Offenders", expanded=False):
+        period = st.radio("Period", ["This week", "All time"], horizontal=True, label_visibility="collapsed")
+        offenders = load_offenders(current_week() if period == "This week" else ALL_TIME)
+        if not offenders:
+            st.caption("No flagged authors")
+            return
+        
+        rows = "".join(
+            f"<tr><td>{html.escape(offender['username'])}</td><td>{offender['counts'].get('FLAG', 0)}</td>"
+            f"<td>{offender['counts'].get('REVIEW', 0)}</td><td>{offender['max_score']:.2f}</td>"
+            f"<td>{offender['last_seen']:%b %d}</td></tr>"
+            for offender in offenders
+        )
         st.markdown(
             f"""
-            <div class="metric-row">
-                <div class="metric-label">{label.replace('_', ' ').title()}</div>
-                <div class="metric-bar-container">
-                    <div class="metric-bar {bar_class}" style="width: {prob * 100}%;"></div>
-                </div>
-                <div class="metric-value">{prob:.2f}</div>
-            </div>
+            <table style="font-size: 0.8rem; width: 100%;">
+                <tr><th>User</th><th>Flag</th><th>Review</th><th>Max</th><th>Last</th></tr>
+                {rows}
+            </table>
             """,
             unsafe_allow_html=True
         )
-    
-    # Display action and comparison with keyword filtering
-    keyword_result = keyword_filter_check(content)
-    
-    st.markdown(
-        f"""
-        <div class="action-row">
-            <div class="action-tag" style="background-color: {action_color};">
-                {action}
+
+def _compact(template):
+    """Join a template's lines without indentation, so Markdown never reads it as a code block"""
+    return "".join(line.strip() for line in template.splitlines())
+
+_POST_TEMPLATE = _compact("""
+    <div class="post-card">
+        <div class="post-header">
+            <div class="avatar" style="background-color: {avatar_color};">
+                <span>{avatar_text}</span>
             </div>
-            <div class="keyword-result">
-                {keyword_result}
+            <div class="post-meta">
+                <div class="author">{author}</div>
+                <div class="time">{time_ago}</div>
             </div>
         </div>
+        <div class="post-content">{content}</div>
+        <div class="analysis-results">
+            {metric_rows}
+            <div class="action-row">
+                <div class="action-tag" style="background-color: {action_color};">{action}</div>
+                <div class="keyword-result">{keyword_result}</div>
+            </div>
         </div>
+    </div>
+""")
+
+_METRIC_ROW_TEMPLATE = _compact("""
+    <div class="metric-row">
+        <div class="metric-label">{label}</div>
+        <div class="metric-bar-container">
+            <div class="metric-bar {bar_class}" style="width: {width}%;"></div>
         </div>
-        """,
+        <div class="metric-value">{prob:.2f}</div>
+    </div>
+""")
+
+def _risk_class(prob):
+    """CSS class of the risk bar for a score"""
+    if prob >= RISK_LEVELS["high"]["threshold"]:
+        return RISK_LEVELS["high"]["class"]
+    if prob >= RISK_LEVELS["medium"]["threshold"]:
+        return RISK_LEVELS["medium"]["class"]
+    return RISK_LEVELS["low"]["class"]
+
+def render_post_html(author, time_ago, content, avatar_text, results, threshold=0.5, avatar_color=None):
+    """
+    Build the complete HTML of a post card
+    
+    Author and content are escaped, so user text cannot inject markup.
+    
+    Args:
+        author (str): Post author name
+        time_ago (str): Time indicator
+        content (str): Post content
+        avatar_text (str): Text to show in avatar
+        results (dict): Toxicity scores of the content
+        threshold (float): Toxicity threshold
+        avatar_color (str): Color for avatar background
+        
+    Returns:
+        str: One self-contained HTML fragment
+    """
+    # Top 2 categories are displayed
+    top_categories = sorted(results.items(), key=lambda x: x[1], reverse=True)[:2]
+    action, action_color = determine_action(results, threshold)
+    metric_rows = "".join(
+        _METRIC_ROW_TEMPLATE.format(
+            label=label.replace('_', ' ').title(),
+            bar_class=_risk_class(prob),
+            width=prob * 100,
+            prob=prob
+        )
+        for label, prob in top_categories
+    )
+    return _POST_TEMPLATE.format(
+        avatar_color=avatar_color or AVATAR_COLORS["default"],
+        avatar_text=html.escape(avatar_text),
+        author=html.escape(author),
+        time_ago=time_ago,
+        content=html.escape(content).replace("\n", "<br>"),
+        metric_rows=metric_rows,
+        action_color=action_color,
+        action=action,
+        keyword_result=html.escape(keyword_filter_check(content))
+    )
+
+def display_post(author, time_ago, content, avatar_text, model, tokenizer, threshold=0.5, avatar_color=None,
+                 results=None):
+    """
+    Display a post with toxicity analysis
+    
+    Args:
+        author (str): Post author name
+        time_ago (str): Time indicator
+        content (str): Post content
+        avatar_text (str): Text to show in avatar
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        threshold (float): Toxicity threshold
+        avatar_color (str): Color for avatar background
+        results (dict): Precomputed scores; the content is scored when omitted
+    """
+    if results is None:
+        results = predict_toxicity(model, tokenizer, content)
+    st.markdown(
+        render_post_html(author, time_ago, content, avatar_text, results, threshold, avatar_color),
         unsafe_allow_html=True
-    )
\ No newline at end of file
+    )
+
+def display_feed(posts, model, tokenizer, threshold=0.5):
+    """
+    Display several posts as a single element
+    
+    Args:
+        posts (list): Dicts with the arguments of display_post: author,
+            time_ago, content, avatar_text and optionally avatar_color and
+            results
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        threshold (float): Toxicity threshold
+    """
+    fragments = []
+    for post in posts:
+        results = post.get('results')
+        if results is None:
+            results = predict_toxicity(model, tokenizer, post['content'])
+        fragments.append(render_post_html(
+            post['author'], post['time_ago'], post['content'], post['avatar_text'],
+            results, threshold, post.get('avatar_color')
+        ))
+    st.markdown("".join(fragments), unsafe_allow_html=True)
\ No newline at end of file
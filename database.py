@@ -1,7 +1,45 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
 import datetime
-from config.settings import FIREBASE_CONFIG_PATH
+import hashlib
+import threading
+from collections import OrderedDict
+from config.settings import (
+    FIREBASE_CONFIG_PATH, CONTENT_CACHE_SIZE, BATCH_WRITE_SIZE, MODEL_NAME, MODEL_REVISION,
+    ACTION_COLORS, OFFENDER_INDEX_ENABLED, CASCADE_ENABLED
+)
+from services.metrics import stage
+
+# Client used instead of Firestore when set (e.g. an in-process fake)
+_client_override = None
+
+# Shared Firestore client, created once per process
+_client = None
+
+# Analyzed text is stored once per distinct body, keyed by its hash
+CONTENTS_COLLECTION = 'contents'
+
+# Hashes of content documents this process has already written
+_known_contents = OrderedDict()
+_known_contents_lock = threading.Lock()
+
+# Stamped on analyses scored by the configured model; a different stamp
+# means the analysis is stale once MODEL_NAME or MODEL_REVISION changes.
+# With the cascade most texts never reach BERT, so its scores carry their
+# own stamp rather than passing for the full model's
+MODEL_VERSION = f"{MODEL_NAME}@{MODEL_REVISION or 'unpinned'}" + ("+cascade" if CASCADE_ENABLED else "")
+
+# Stamped on degraded analyses, which the model has not scored yet
+KEYWORD_FILTER_VERSION = "keyword-filter"
+
+# Per-username totals of analyses, one document per username and period
+OFFENDERS_COLLECTION = 'offenders'
+
+# Period of the all-time offender totals; weekly ones are ISO weeks
+ALL_TIME = 'all'
+
+# Callbacks run after this process writes analyses (e.g. cache invalidation)
+_write_listeners = []
 
 # Initialize Firebase
 def initialize_firebase():
@@ -11,31 +49,394 @@ def initialize_firebase():
         firebase_admin.initialize_app(cred)
     return firestore.client()
 
+def set_client(client):
+    """
+    Route all storage calls to the given client instead of Firestore
+    
+    Args:
+        client: A Firestore-compatible client, or None to restore Firestore
+    """
+    global _client_override
+    _client_override = client
+
 def get_db():
     """Get Firestore client instance"""
-    if not firebase_admin._apps:
-        initialize_firebase()
-    return firestore.client()
+    global _client
+    if _client_override is not None:
+        return _client_override
+    if _client is None:
+        _client = initialize_firebase()
+    return _client
 
-def save_analysis_to_firestore(username, content, results, action):
+def add_write_listener(callback):
     """
-    Save analysis results to Firestore
+    Run a callback whenever this process writes analyses
+    
+    Args:
+        callback: Zero-argument callable; registering it again has no effect
+    """
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+def notify_write_listeners():
+    """Run the write listeners; called after every committed analysis write"""
+    for callback in _write_listeners:
+        callback()
+
+def content_hash(content):
+    """
+    Compute the key of a content document
+    
+    Args:
+        content (str): Analyzed text
+        
+    Returns:
+        str: sha256 hex digest of the UTF-8 text
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def is_content_known(digest):
+    """Check whether this process already stored the content with this hash"""
+    with _known_contents_lock:
+        if digest in _known_contents:
+            _known_contents.move_to_end(digest)
+            return True
+        return False
+
+def remember_content(digest):
+    """Record a stored content hash, evicting the least recently used beyond CONTENT_CACHE_SIZE"""
+    with _known_contents_lock:
+        _known_contents[digest] = True
+        _known_contents.move_to_end(digest)
+        while len(_known_contents) > CONTENT_CACHE_SIZE:
+            _known_contents.popitem(last=False)
+
+def build_content(content):
+    """
+    Build the document stored once per distinct analyzed text
+    
+    Args:
+        content (str): Analyzed text
+        
+    Returns:
+        dict: Content document
+    """
+    return {
+        'content': content,
+        'timestamp': datetime.datetime.now()
+    }
+
+def build_analysis(username, content, results, action, degraded=False, threshold=None):
+    """
+    Build the document stored for one analysis
+    
+    The text itself is referenced by hash; see build_content. The document
+    records the model version and threshold behind the action, so it can be
+    re-scored when the model changes.
     
     Args:
         username (str): Username of content author
         content (str): Analyzed content
         results (dict): Toxicity analysis results
         action (str): Recommended action (FLAG, REVIEW, ALLOW)
+        degraded (bool): Whether results came from the overload fallback
+            instead of the model
+        threshold (float): Threshold passed to determine_action
+        
+    Returns:
+        dict: Analysis document
     """
-    db = get_db()
-    analysis_data = {
+    analysis = {
         'username': username,
-        'content': content,
+        'content_hash': content_hash(content),
         'results': results,
         'action': action,
+        'threshold': threshold,
+        'model_version': KEYWORD_FILTER_VERSION if degraded else MODEL_VERSION,
         'timestamp': datetime.datetime.now()
     }
-    db.collection('analyses').add(analysis_data)
+    if degraded:
+        analysis['degraded'] = True
+    return analysis
+
+def offender_period(timestamp):
+    """ISO week of a timestamp, e.g. '2026-W42', the period of weekly offender totals"""
+    year, week, _ = timestamp.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def offender_id(period, username):
+    """Document id of a username's totals for a period; ids can't hold every username"""
+    return f"{period}-{hashlib.sha256(username.encode('utf-8')).hexdigest()}"
+
+def offender_totals(analyses, totals=None):
+    """
+    Sum analyses into per-username totals, all-time and per ISO week
+    
+    Args:
+        analyses (iterable): Analysis documents, see build_analysis
+        totals (dict): Totals to add to, in place; None to start empty
+        
+    Returns:
+        dict: (period, username) -> username, period, analyses, counts per
+            action, score_sum and max_score of each analysis' highest
+            category score, and last_seen
+    """
+    totals = {} if totals is None else totals
+    for analysis in analyses:
+        username = analysis.get('username')
+        timestamp = analysis.get('timestamp')
+        if username is None or timestamp is None:
+            continue
+        score = max((analysis.get('results') or {}).values(), default=0.0)
+        for period in (ALL_TIME, offender_period(timestamp)):
+            entry = totals.get((period, username))
+            if entry is None:
+                entry = totals[(period, username)] = {
+                    'username': username,
+                    'period': period,
+                    'analyses': 0,
+                    'counts': {action: 0 for action in ACTION_COLORS},
+                    'score_sum': 0.0,
+                    'max_score': 0.0,
+                    'last_seen': timestamp
+                }
+            entry['analyses'] += 1
+            if analysis.get('action') in entry['counts']:
+                entry['counts'][analysis['action']] += 1
+            entry['score_sum'] += score
+            entry['max_score'] = max(entry['max_score'], score)
+            entry['last_seen'] = max(entry['last_seen'], timestamp)
+    return totals
+
+def add_offender_writes(batch, analyses, db=None):
+    """
+    Add the offender index updates for new analyses to a write batch
+    
+    The updates are server-side increments and maxima, so they need no read
+    and concurrent writers don't conflict; committed in the same batch as
+    the analyses, the index never disagrees with them. last_seen is stored
+    as epoch seconds, since the maximum transform only takes numbers.
+    
+    Args:
+        batch: Firestore write batch
+        analyses (iterable): Analysis documents being written in the batch
+        db: Client the batch belongs to (e.g. the async one); get_db() if None
+    """
+    collection = (db or get_db()).collection(OFFENDERS_COLLECTION)
+    for (period, username), entry in offender_totals(analyses).items():
+        batch.set(collection.document(offender_id(period, username)), {
+            'username': username,
+            'period': period,
+            'analyses': firestore.Increment(entry['analyses']),
+            'counts': {action: firestore.Increment(count) for action, count in entry['counts'].items()},
+            'score_sum': firestore.Increment(entry['score_sum']),
+            'max_score': firestore.Maximum(entry['max_score']),
+            'last_seen': firestore.Maximum(entry['last_seen'].timestamp())
+        }, merge=True)
+
+def add_offender_changes(batch, changes, db=None):
+    """
+    Add the offender index updates for re-scored analyses to a write batch
+    
+    Each analysis' count moves from its old action to its new one and its
+    score sum by the score difference, so the index keeps agreeing with the
+    analyses it counts. max_score only rises: a lowered score keeps the old
+    maximum until rebuild_offender_index.
+    
+    Args:
+        batch: Firestore write batch
+        changes (iterable): (stored, updated) pairs of the same analysis;
+            the stored one needs username, timestamp, results and action
+        db: Client the batch belongs to; get_db() if None
+    """
+    changes = list(changes)
+    before = offender_totals(stored for stored, _ in changes)
+    after = offender_totals(updated for _, updated in changes)
+    collection = (db or get_db()).collection(OFFENDERS_COLLECTION)
+    for key, entry in after.items():
+        old = before[key]
+        counts = {
+            action: count - old['counts'][action]
+            for action, count in entry['counts'].items() if count != old['counts'][action]
+        }
+        score_delta = entry['score_sum'] - old['score_sum']
+        if not counts and not score_delta and entry['max_score'] <= old['max_score']:
+            continue
+        batch.set(collection.document(offender_id(*key)), {
+            'counts': {action: firestore.Increment(delta) for action, delta in counts.items()},
+            'score_sum': firestore.Increment(score_delta),
+            'max_score': firestore.Maximum(entry['max_score'])
+        }, merge=True)
+
+def _offender_keys(analysis):
+    """Offender documents an analysis updates"""
+    username = analysis.get('username')
+    if not OFFENDER_INDEX_ENABLED or username is None or analysis.get('timestamp') is None:
+        return set()
+    return {(ALL_TIME, username), (offender_period(analysis['timestamp']), username)}
+
+def offender_write_chunks(writes, batch_size):
+    """
+    Split analysis writes so each chunk and its offender updates fit in one batch
+    
+    Args:
+        writes (iterable): Tuples whose second item is the analysis document
+        batch_size (int): Writes per batch (Firestore allows 500)
+        
+    Yields:
+        list: Consecutive tuples of writes
+    """
+    chunk = []
+    keys = set()
+    for write in writes:
+        new_keys = _offender_keys(write[1]) - keys
+        if chunk and len(chunk) + len(keys) + 1 + len(new_keys) > batch_size:
+            yield chunk
+            chunk = []
+            keys = set()
+            new_keys = _offender_keys(write[1])
+        chunk.append(write)
+        keys |= new_keys
+    if chunk:
+        yield chunk
+
+def save_analysis_to_firestore(username, content, results, action, degraded=False, threshold=None):
+    """
+    Save analysis results to Firestore
+    
+    The content document is only written the first time this process sees
+    the text; the analysis record, any new content and the author's offender
+    totals commit atomically.
+    
+    Args:
+        username (str): Username of content author
+        content (str): Analyzed content
+        results (dict): Toxicity analysis results
+        action (str): Recommended action (FLAG, REVIEW, ALLOW)
+        degraded (bool): Whether results came from the overload fallback
+        threshold (float): Threshold passed to determine_action
+        
+    Returns:
+        str: Id of the stored analysis document
+    """
+    db = get_db()
+    analysis_data = build_analysis(username, content, results, action, degraded, threshold)
+    digest = analysis_data['content_hash']
+    analysis_ref = db.collection('analyses').document()
+    
+    batch = db.batch()
+    if not is_content_known(digest):
+        batch.set(db.collection(CONTENTS_COLLECTION).document(digest), build_content(content))
+    batch.set(analysis_ref, analysis_data)
+    if OFFENDER_INDEX_ENABLED:
+        add_offender_writes(batch, [analysis_data])
+    with stage("persist"):
+        batch.commit()
+    remember_content(digest)
+    notify_write_listeners()
+    return analysis_ref.id
+
+def save_analyses_to_firestore(analyses, batch_size=BATCH_WRITE_SIZE):
+    """
+    Save many analyses with batched writes
+    
+    New content documents are committed before the analyses that reference
+    them. Each batch of analyses carries the offender index updates for its
+    authors. An analysis with an 'id' is stored under that document id, so
+    saving it again (e.g. a redelivered queue message) overwrites rather
+    than duplicates it; such ids are looked up first, in one read per
+    batch, so the offender index counts them once.
+    
+    Args:
+        analyses (iterable): Dicts with username, content, results, action
+            and optionally degraded, threshold and id
+        batch_size (int): Documents per batch (Firestore allows 500)
+        
+    Returns:
+        list: Ids of the stored documents, in input order
+    """
+    db = get_db()
+    collection = db.collection('analyses')
+    writes = []
+    new_contents = {}
+    given_ids = set()
+    for analysis in analyses:
+        analysis = dict(analysis)
+        doc_id = analysis.pop('id', None)
+        if doc_id:
+            given_ids.add(doc_id)
+        data = build_analysis(**analysis)
+        digest = data['content_hash']
+        if digest not in new_contents and not is_content_known(digest):
+            new_contents[digest] = analysis['content']
+        writes.append((collection.document(doc_id) if doc_id else collection.document(), data))
+    content_writes = [
+        (db.collection(CONTENTS_COLLECTION).document(digest), build_content(content))
+        for digest, content in new_contents.items()
+    ]
+    
+    with stage("persist"):
+        for i in range(0, len(content_writes), batch_size):
+            batch = db.batch()
+            for ref, data in content_writes[i:i + batch_size]:
+                batch.set(ref, data)
+            batch.commit()
+        for chunk in offender_write_chunks(writes, batch_size):
+            batch = db.batch()
+            for ref, data in chunk:
+                batch.set(ref, data)
+            if OFFENDER_INDEX_ENABLED:
+                rewritten = [ref for ref, _ in chunk if ref.id in given_ids]
+                existing = {snapshot.id for snapshot in db.get_all(rewritten) if snapshot.exists} if rewritten else set()
+                add_offender_writes(batch, [data for ref, data in chunk if ref.id not in existing])
+            batch.commit()
+    for digest in new_contents:
+        remember_content(digest)
+    notify_write_listeners()
+    return [ref.id for ref, _ in writes]
+
+def update_analysis_results(analysis_id, results, action):
+    """
+    Replace the scores of a stored analysis with the current model's
+    
+    Clears the degraded mark and stamps the current model version. The
+    author's offender totals move to the new action and score in the same
+    batch.
+    
+    Args:
+        analysis_id (str): Id of the analysis document
+        results (dict): Toxicity analysis results
+        action (str): Recommended action (FLAG, REVIEW, ALLOW)
+    """
+    db = get_db()
+    ref = db.collection('analyses').document(analysis_id)
+    batch = db.batch()
+    batch.update(ref, {
+        'results': results,
+        'action': action,
+        'model_version': MODEL_VERSION,
+        'degraded': False
+    })
+    if OFFENDER_INDEX_ENABLED:
+        stored = ref.get().to_dict()
+        if stored is not None:
+            add_offender_changes(batch, [(stored, dict(stored, results=results, action=action))], db)
+    batch.commit()
+    notify_write_listeners()
+
+def label_analysis(analysis_id, labels):
+    """
+    Record a moderator's verdict on an analysis, for threshold calibration
+    
+    Args:
+        analysis_id (str): Id of the analysis document
+        labels (dict): Category -> whether the content really is in it;
+            categories left out count as not toxic
+    """
+    get_db().collection('analyses').document(analysis_id).update({
+        'labels': labels,
+        'labeled_at': datetime.datetime.now()
+    })
 
 def get_analyses():
     """
@@ -45,4 +446,33 @@ def get_analyses():
         list: List of analysis documents
     """
     db = get_db()
-    return db.collection('analyses').stream()
\ No newline at end of file
+    return db.collection('analyses').stream()
+
+def watch_analyses(callback, since):
+    """
+    Listen to analyses written at or after a point in time
+    
+    Args:
+        callback: Called as callback(snapshots, changes, read_time) with the
+            initial matches and then on every change
+        since (datetime): Lower bound on the analyses' timestamp
+        
+    Returns:
+        Watch whose unsubscribe() stops the listener
+    """
+    db = get_db()
+    return db.collection('analyses').where('timestamp', '>=', since).on_snapshot(callback)
+
+def get_contents(digests):
+    """
+    Fetch analyzed texts by content hash
+    
+    Args:
+        digests (iterable): Content hashes, e.g. from analyses' content_hash
+        
+    Returns:
+        dict: Hash -> text for every hash found
+    """
+    db = get_db()
+    refs = [db.collection(CONTENTS_COLLECTION).document(digest) for digest in set(digests)]
+    return {snapshot.id: snapshot.get('content') for snapshot in db.get_all(refs) if snapshot.exists}
\ No newline at end of file
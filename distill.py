@@ -0,0 +1,174 @@
+import argparse
+import copy
+import json
+import time
+import torch
+from transformers import BertForSequenceClassification
+from config.settings import TOXICITY_CATEGORIES, DEFAULT_THRESHOLD
+from models.registry import artifact_sha256, register_model
+from services.moderation import determine_action
+
+def build_student(teacher, num_layers=4):
+    """
+    Build a shallower copy of the teacher, initialized from its layers
+
+    Keeps every k-th encoder layer of the teacher (evenly spaced, always
+    including the last) along with its embeddings, pooler and classifier.
+
+    Args:
+        teacher (BertForSequenceClassification): Model to distill
+        num_layers (int): Encoder layers of the student
+
+    Returns:
+        BertForSequenceClassification: The student
+    """
+    config = copy.deepcopy(teacher.config)
+    teacher_layers = config.num_hidden_layers
+    config.num_hidden_layers = num_layers
+    student = BertForSequenceClassification(config)
+
+    keep = [round((i + 1) * teacher_layers / num_layers) - 1 for i in range(num_layers)]
+    state = teacher.state_dict()
+    student_state = {}
+    for name, value in state.items():
+        if ".encoder.layer." in name:
+            prefix, rest = name.split(".encoder.layer.", 1)
+            index, suffix = rest.split(".", 1)
+            if int(index) not in keep:
+                continue
+            name = f"{prefix}.encoder.layer.{keep.index(int(index))}.{suffix}"
+        student_state[name] = value.clone()
+    student.load_state_dict(student_state, strict=False)
+    return student
+
+def _batches(texts, batch_size):
+    for i in range(0, len(texts), batch_size):
+        yield texts[i:i + batch_size]
+
+def distill(teacher, student, tokenizer, texts, epochs=3, batch_size=16, learning_rate=5e-5,
+            max_length=128, seed=0):
+    """
+    Train the student to reproduce the teacher's six category probabilities
+
+    Unlabeled texts are enough: the loss is binary cross-entropy against the
+    teacher's sigmoid outputs.
+
+    Args:
+        teacher: Teacher model
+        student: Student model, updated in place
+        tokenizer: Tokenizer shared by both models
+        texts (list): Unlabeled training texts
+        epochs (int): Passes over the texts
+        batch_size (int): Texts per step
+        learning_rate (float): AdamW learning rate
+        max_length (int): Truncation length
+        seed (int): Shuffle seed
+
+    Returns:
+        list: Mean loss per epoch
+    """
+    generator = torch.Generator().manual_seed(seed)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate)
+    loss_fn = torch.nn.BCEWithLogitsLoss()
+    teacher.eval()
+
+    history = []
+    for _ in range(epochs):
+        order = torch.randperm(len(texts), generator=generator).tolist()
+        shuffled = [texts[i] for i in order]
+        student.train()
+        losses = []
+        for batch in _batches(shuffled, batch_size):
+            inputs = tokenizer(batch, return_tensors="pt", truncation=True, padding=True,
+                               max_length=max_length)
+            with torch.no_grad():
+                targets = torch.sigmoid(teacher(**inputs).logits)
+            loss = loss_fn(student(**inputs).logits, targets)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            losses.append(loss.item())
+        history.append(sum(losses) / len(losses))
+    student.eval()
+    return history
+
+def _scores(model, tokenizer, texts, batch_size):
+    scores = []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for batch in _batches(texts, batch_size):
+            inputs = tokenizer(batch, return_tensors="pt", truncation=True, padding=True)
+            scores.extend(torch.sigmoid(model(**inputs).logits).tolist())
+    return scores, (time.perf_counter() - start) / len(texts)
+
+def _parameter_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+def evaluate_student(teacher, student, tokenizer, texts, batch_size=16, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the student's category scores, decisions, latency and memory to the teacher's
+
+    Args:
+        teacher: Teacher model
+        student: Distilled student
+        tokenizer: Shared tokenizer
+        texts (list): Held-out texts
+        batch_size (int): Texts per forward pass
+        threshold (float): Threshold passed to determine_action
+
+    Returns:
+        dict: Evaluation report
+    """
+    teacher_scores, teacher_seconds = _scores(teacher, tokenizer, texts, batch_size)
+    student_scores, student_seconds = _scores(student, tokenizer, texts, batch_size)
+
+    errors = {category: 0.0 for category in TOXICITY_CATEGORIES}
+    agreements = 0
+    for t_row, s_row in zip(teacher_scores, student_scores):
+        t_results = dict(zip(TOXICITY_CATEGORIES, t_row))
+        s_results = dict(zip(TOXICITY_CATEGORIES, s_row))
+        for category in TOXICITY_CATEGORIES:
+            errors[category] += abs(t_results[category] - s_results[category])
+        agreements += determine_action(t_results, threshold)[0] == determine_action(s_results, threshold)[0]
+
+    return {
+        'texts': len(texts),
+        'mean_abs_error': {category: error / len(texts) for category, error in errors.items()},
+        'decision_agreement': agreements / len(texts),
+        'teacher_ms_per_item': teacher_seconds * 1000,
+        'student_ms_per_item': student_seconds * 1000,
+        'speedup': teacher_seconds / student_seconds,
+        'teacher_parameter_mb': _parameter_bytes(teacher) / 2 ** 20,
+        'student_parameter_mb': _parameter_bytes(student) / 2 ** 20
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill toxic-bert into a smaller student")
+    parser.add_argument("corpus", help="Text file with one unlabeled comment per line")
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    parser.add_argument("--name", default="local/toxic-bert-student", help="Registry model name")
+    parser.add_argument("--revision", default="v1")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random teacher (offline smoke test)")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    split = int(len(texts) * (1 - args.holdout))
+
+    if args.tiny:
+        from benchmarks import build_tiny_model
+        teacher, tokenizer = build_tiny_model()
+    else:
+        from models.toxicity import load_model_artifacts
+        teacher, tokenizer = load_model_artifacts()
+
+    student = build_student(teacher, min(args.layers, teacher.config.num_hidden_layers))
+    distill(teacher, student, tokenizer, texts[:split], epochs=args.epochs, batch_size=args.batch_size)
+    path = register_model(student, tokenizer, args.name, args.revision)
+    report = evaluate_student(teacher, student, tokenizer, texts[split:] or texts, args.batch_size)
+    report['registry_path'] = path
+    report['sha256'] = artifact_sha256(path)  # MODEL_SHA256 when serving this artifact
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,236 @@
+import argparse
+import datetime
+import json
+import os
+import uuid
+from collections import deque
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config.settings import (
+    TOXICITY_CATEGORIES, EXPORT_DIR, EXPORT_STATE_PATH, EXPORT_PAGE_SIZE, EXPORT_ROW_GROUP_SIZE,
+    EXPORT_SAFETY_WINDOW
+)
+from services.database import get_db
+
+# Columns of the exported table; 'id' is the analysis document id, so
+# re-exported rows can be deduplicated downstream
+ANALYSIS_SCHEMA = pa.schema(
+    [pa.field('id', pa.string(), nullable=False)]
+    + [pa.field(category, pa.float32()) for category in TOXICITY_CATEGORIES]
+    + [
+        pa.field('action', pa.string()),
+        pa.field('username', pa.string()),
+        pa.field('timestamp', pa.timestamp('us', tz='UTC'), nullable=False)
+    ]
+)
+
+# Fields read from Firestore; the content hash and flags are not exported
+EXPORT_FIELDS = ['results', 'action', 'username', 'timestamp']
+
+def iter_pages(query, page_size=EXPORT_PAGE_SIZE):
+    """
+    Page through a query ordered by timestamp with cursors
+
+    Args:
+        query: Firestore query over analyses
+        page_size (int): Documents per request
+
+    Yields:
+        list: Snapshots of one page
+    """
+    query = query.select(EXPORT_FIELDS).order_by('timestamp')
+    last = None
+    while True:
+        page_query = query if last is None else query.start_after(last)
+        page = list(page_query.limit(page_size).stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def _utc(timestamp):
+    # Firestore returns UTC datetimes; naive ones (e.g. from a fake) are local time
+    return timestamp.astimezone(datetime.timezone.utc)
+
+def to_record_batch(snapshots):
+    """
+    Convert analysis snapshots to a record batch with ANALYSIS_SCHEMA
+
+    Args:
+        snapshots (list): Analysis document snapshots
+
+    Returns:
+        pyarrow.RecordBatch: One row per analysis
+    """
+    columns = {field.name: [] for field in ANALYSIS_SCHEMA}
+    for snapshot in snapshots:
+        data = snapshot.to_dict()
+        results = data.get('results') or {}
+        columns['id'].append(snapshot.id)
+        for category in TOXICITY_CATEGORIES:
+            columns[category].append(results.get(category))
+        columns['action'].append(data.get('action'))
+        columns['username'].append(data.get('username'))
+        columns['timestamp'].append(_utc(data['timestamp']))
+    return pa.RecordBatch.from_pydict(columns, schema=ANALYSIS_SCHEMA)
+
+class _PartitionWriter:
+    """
+    Parquet file of one date partition, buffered into row groups
+
+    The file is written under a hidden name, which warehouse loaders skip,
+    and only gets its final name in publish().
+    """
+
+    def __init__(self, out_dir, date, run_id, row_group_size):
+        directory = os.path.join(out_dir, f"date={date.isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"part-{run_id}.parquet")
+        self.pending_path = os.path.join(directory, f".part-{run_id}.parquet")
+        self.row_group_size = row_group_size
+        self.writer = pq.ParquetWriter(self.pending_path, ANALYSIS_SCHEMA)
+        self.buffer = []
+        self.buffered = 0
+        self.rows = 0
+
+    def write(self, batch):
+        self.buffer.append(batch)
+        self.buffered += batch.num_rows
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(pa.Table.from_batches(self.buffer, schema=ANALYSIS_SCHEMA))
+            self.rows += self.buffered
+            self.buffer = []
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def publish(self):
+        os.replace(self.pending_path, self.path)
+
+def load_export_state(path=EXPORT_STATE_PATH):
+    """
+    Where the previous export stopped
+
+    Returns:
+        tuple: (high-water mark, ids exported within the safety window
+            before it); (None, set()) before the first export
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None, set()
+    return datetime.datetime.fromisoformat(state['high_water_mark']), set(state.get('recent_ids', []))
+
+def save_export_state(high_water_mark, recent_ids, path=EXPORT_STATE_PATH):
+    """Record where an export stopped, replacing the state file atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pending = f"{path}.tmp"
+    with open(pending, "w") as f:
+        json.dump({'high_water_mark': high_water_mark.isoformat(), 'recent_ids': sorted(recent_ids)}, f)
+    os.replace(pending, path)
+
+def export_analyses(out_dir=EXPORT_DIR, since=None, exported_ids=(), page_size=EXPORT_PAGE_SIZE,
+                    row_group_size=EXPORT_ROW_GROUP_SIZE, safety_window=EXPORT_SAFETY_WINDOW):
+    """
+    Export analyses to date-partitioned Parquet
+
+    Pages are converted and written one at a time, so memory stays bounded by
+    the page and row-group sizes regardless of the collection size. Because
+    pages arrive in timestamp order, a partition is complete once a later
+    date shows up and its file is closed straight away. Files become visible
+    only after the whole export succeeded.
+
+    Timestamps are set by the writing client, so an analysis can be
+    committed after a later-stamped one was already exported, or share the
+    high-water mark exactly. An incremental export therefore re-reads
+    safety_window seconds before since and skips the ids the previous run
+    exported in that window; analyses committed later than that are missed.
+
+    Args:
+        out_dir (str): Root directory of the partitioned dataset
+        since (datetime): High-water mark of the previous export; None for all
+        exported_ids (set): Ids the previous export wrote within the window
+        page_size (int): Documents per Firestore request
+        row_group_size (int): Rows per Parquet row group
+        safety_window (float): Seconds re-read before since
+
+    Returns:
+        dict: rows, files, the new high-water mark (None if nothing was
+            read) and recent_ids, the ids read within the window before it
+    """
+    window = datetime.timedelta(seconds=safety_window)
+    query = get_db().collection('analyses')
+    if since is not None:
+        query = query.where('timestamp', '>=', since - window)
+
+    run_id = uuid.uuid4().hex[:12]
+    open_writers = {}
+    finished = []
+    # (timestamp, id) of every row read within the window before the newest
+    recent = deque()
+    try:
+        for page in iter_pages(query, page_size):
+            for snapshot in page:
+                recent.append((snapshot.to_dict()['timestamp'], snapshot.id))
+            while recent[0][0] < recent[-1][0] - window:
+                recent.popleft()
+            page = [snapshot for snapshot in page if snapshot.id not in exported_ids]
+            if not page:
+                continue
+            batch = to_record_batch(page)
+            dates = [value.date() for value in batch.column('timestamp').to_pylist()]
+            start = 0
+            while start < len(dates):
+                end = start
+                while end < len(dates) and dates[end] == dates[start]:
+                    end += 1
+                date = dates[start]
+                if date not in open_writers:
+                    for earlier in [d for d in open_writers if d < date]:
+                        open_writers[earlier].close()
+                        finished.append(open_writers.pop(earlier))
+                    open_writers[date] = _PartitionWriter(out_dir, date, run_id, row_group_size)
+                open_writers[date].write(batch.slice(start, end - start))
+                start = end
+        for writer in open_writers.values():
+            writer.close()
+        finished.extend(open_writers.values())
+    except BaseException:
+        for writer in open_writers.values():
+            writer.writer.close()
+        for writer in finished + list(open_writers.values()):
+            os.remove(writer.pending_path)
+        raise
+
+    for writer in finished:
+        writer.publish()
+    return {
+        'rows': sum(writer.rows for writer in finished),
+        'files': [writer.path for writer in finished],
+        'high_water_mark': recent[-1][0] if recent else None,
+        'recent_ids': {doc_id for _, doc_id in recent}
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export analyses to date-partitioned Parquet")
+    parser.add_argument("--out", default=EXPORT_DIR, help="Dataset root directory")
+    parser.add_argument("--state", default=EXPORT_STATE_PATH, help="High-water mark file")
+    parser.add_argument("--full", action="store_true", help="Ignore the high-water mark and export everything")
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    since, exported_ids = (None, set()) if args.full else load_export_state(args.state)
+    report = export_analyses(args.out, since, exported_ids, args.page_size)
+    recent_ids = report.pop('recent_ids')
+    if report['high_water_mark'] is not None:
+        save_export_state(report['high_water_mark'], recent_ids, args.state)
+    print(json.dumps({key: str(value) if key == 'high_water_mark' else value for key, value in report.items()},
+                     indent=2))
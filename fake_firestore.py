@@ -0,0 +1,631 @@
+import asyncio
+import copy
+import datetime
+import enum
+import itertools
+import json
+import threading
+import time
+import uuid
+
+# In-process stand-in for the subset of the Firestore client used by
+# services.database, for offline benchmarks and local development.
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b
+}
+
+# Kinds of change delivered to snapshot listeners
+ChangeType = enum.Enum("ChangeType", ["ADDED", "MODIFIED", "REMOVED"])
+
+def get_field(data, path):
+    """
+    Read a dotted field path from a document dict
+
+    Args:
+        data (dict): Document data
+        path (str): Field path such as 'results.toxic'
+
+    Returns:
+        The field value, or None if any component is missing
+    """
+    for part in path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+def _has_field(data, path):
+    for part in path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return False
+        data = data[part]
+    return True
+
+def payload_size(data):
+    """Approximate wire size in bytes of a document or aggregation result"""
+    return len(json.dumps(data, default=str))
+
+def _sort_key(value):
+    # Missing fields sort first, without comparing None against values
+    return (value is not None, value if value is not None else 0)
+
+def _resolve(current, value):
+    # Numeric transforms (firestore.Increment, Maximum, Minimum) apply to the
+    # stored value; they are matched by name so the fake needs no client library
+    transform = type(value).__name__
+    if transform in ("Increment", "Maximum", "Minimum") and hasattr(value, "value"):
+        # As in Firestore, the operands of numeric transforms must be numbers
+        if not isinstance(value.value, (int, float)):
+            raise TypeError(f"{transform} needs a number, got {type(value.value).__name__}")
+        if not isinstance(current, (int, float)):
+            return value.value
+        if transform == "Increment":
+            return current + value.value
+        return max(current, value.value) if transform == "Maximum" else min(current, value.value)
+    return copy.deepcopy(value)
+
+def _set_field(data, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = _resolve(data.get(parts[-1]), value)
+
+def _merge_fields(data, fields):
+    # Nested maps are merged into existing ones, as set(merge=True) does
+    for key, value in fields.items():
+        if isinstance(value, dict):
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+            _merge_fields(data[key], value)
+        else:
+            data[key] = _resolve(data.get(key), value)
+
+class FakeSnapshot:
+    """Document snapshot"""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, path):
+        # Like the real client: None for a missing document, KeyError for a missing field
+        if self._data is None:
+            return None
+        if not _has_field(self._data, path):
+            raise KeyError(path)
+        return get_field(self._data, path)
+
+class FakeDocument:
+    """Document reference"""
+
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self.collection.client._round_trip()
+        self.collection._write(self.id, data, merge=merge)
+
+    def update(self, fields):
+        self.collection.client._round_trip()
+        with self.collection._lock:
+            if self.id not in self.collection._docs:
+                raise KeyError(f"No document to update: {self.id}")
+        self.collection._write(self.id, fields, merge=True, dotted=True)
+
+    def delete(self):
+        self.collection.client._round_trip()
+        self.collection._delete(self.id)
+
+    def get(self):
+        self.collection.client._round_trip()
+        with self.collection._lock:
+            data = self.collection._docs.get(self.id)
+        return FakeSnapshot(self, copy.deepcopy(data))
+
+class FakeDocumentChange:
+    """One change delivered to a snapshot listener"""
+
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+class FakeWatch:
+    """
+    Snapshot listener on a query
+
+    Like Firestore, it first delivers every match as ADDED, then the changed
+    matches after each write. Delivery happens synchronously on the writing
+    thread, which keeps tests deterministic.
+    """
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._docs = {}
+        self._lock = threading.Lock()
+        with query.collection._lock:
+            query.collection._watches.append(self)
+        self._refresh(None)
+
+    def _refresh(self, doc_id):
+        query = self._query
+        collection = query.collection
+        with self._lock:
+            if doc_id is None or query._limit is not None or query._cursor is not None:
+                current = {key: copy.deepcopy(data) for key, data in query._matches()}
+                candidates = set(current) | set(self._docs)
+            else:
+                # Without a limit, a write can only change its own document's membership
+                with collection._lock:
+                    data = copy.deepcopy(collection._docs.get(doc_id))
+                current = dict(self._docs)
+                if data is not None and all(op(get_field(data, field), value) for field, op, value in query._filters):
+                    current[doc_id] = data
+                else:
+                    current.pop(doc_id, None)
+                candidates = {doc_id}
+
+            changes = []
+            for key in candidates:
+                old, new = self._docs.get(key), current.get(key)
+                if old is None and new is not None:
+                    changes.append(FakeDocumentChange(ChangeType.ADDED, FakeSnapshot(collection.document(key), new)))
+                elif old is not None and new is None:
+                    changes.append(FakeDocumentChange(ChangeType.REMOVED, FakeSnapshot(collection.document(key), old)))
+                elif old != new:
+                    changes.append(FakeDocumentChange(ChangeType.MODIFIED, FakeSnapshot(collection.document(key), new)))
+            self._docs = current
+            if not changes and doc_id is not None:
+                return
+            for change in changes:
+                collection.client.bytes_transferred += payload_size(change.document._data)
+            snapshots = [FakeSnapshot(collection.document(key), data) for key, data in current.items()]
+            self._callback(snapshots, changes, datetime.datetime.now())
+
+    def unsubscribe(self):
+        with self._query.collection._lock:
+            if self in self._query.collection._watches:
+                self._query.collection._watches.remove(self)
+
+class AggregationResult:
+    """One aggregated value, as returned by Firestore aggregation queries"""
+
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+class FakeAggregationQuery:
+    """count/sum/avg aggregations evaluated over a query's matches"""
+
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def count(self, alias=None):
+        self._aggregations.append((alias or "count", "count", None))
+        return self
+
+    def sum(self, field_path, alias=None):
+        self._aggregations.append((alias or f"sum_{field_path}", "sum", field_path))
+        return self
+
+    def avg(self, field_path, alias=None):
+        self._aggregations.append((alias or f"avg_{field_path}", "avg", field_path))
+        return self
+
+    def get(self):
+        self._query.collection.client._round_trip()
+        matches = [data for _, data in self._query._matches()]
+        results = []
+        for alias, kind, field in self._aggregations:
+            if kind == "count":
+                value = len(matches)
+            else:
+                values = [v for v in (get_field(data, field) for data in matches)
+                          if isinstance(v, (int, float))]
+                if kind == "sum":
+                    value = sum(values)
+                else:
+                    value = sum(values) / len(values) if values else None
+            results.append(AggregationResult(alias, value))
+        self._query.collection.client.bytes_transferred += payload_size(
+            {result.alias: result.value for result in results}
+        )
+        return [results]
+
+class FakeQuery:
+    """Immutable query over a collection"""
+
+    def __init__(self, collection, filters=(), orders=(), limit_count=None,
+                 cursor=None, fields=None):
+        self.collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'cursor': self._cursor,
+            'fields': self._fields
+        }
+        state.update(changes)
+        return FakeQuery(self.collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, _OPERATORS[op], value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self).count(alias)
+
+    def sum(self, field_path, alias=None):
+        return FakeAggregationQuery(self).sum(field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return FakeAggregationQuery(self).avg(field_path, alias)
+
+    def _matches(self):
+        with self.collection._lock:
+            docs = list(self.collection._docs.items())
+        matches = [
+            (doc_id, data) for doc_id, data in docs
+            if all(op(get_field(data, field), value) for field, op, value in self._filters)
+            # Like Firestore, ordering by a field leaves out documents without it
+            and all(_has_field(data, field) for field, _ in self._orders)
+        ]
+        # Ties are ordered by document id, as in Firestore
+        matches.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            matches.sort(
+                key=lambda item: _sort_key(get_field(item[1], field)),
+                reverse=direction == DESCENDING
+            )
+        if self._cursor is not None:
+            matches = [item for item in matches if self._after_cursor(item)]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+        return matches
+
+    def _after_cursor(self, item):
+        # Cursors are positions in the ordering, so they stay valid when the
+        # cursor document itself has since changed
+        doc_id, data = item
+        for field, direction in self._orders:
+            value = _sort_key(get_field(data, field))
+            bound = _sort_key(self._cursor.get(field))
+            if value != bound:
+                return value > bound if direction == ASCENDING else value < bound
+        return doc_id > self._cursor.id
+
+    def stream(self):
+        self.collection.client._round_trip()
+        for doc_id, data in self._matches():
+            if self._fields is not None:
+                projected = {}
+                for path in self._fields:
+                    value = get_field(data, path)
+                    if value is not None:
+                        _set_field(projected, path, copy.deepcopy(value))
+                data = projected
+            else:
+                data = copy.deepcopy(data)
+            self.collection.client.bytes_transferred += payload_size(data)
+            yield FakeSnapshot(self.collection.document(doc_id), data)
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return FakeWatch(self, callback)
+
+class FakeCollection(FakeQuery):
+    """Collection reference, also usable as an unfiltered query"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._docs = {}
+        self._watches = []
+        self._lock = threading.Lock()
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        return FakeDocument(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return datetime.datetime.now(), ref
+
+    def _write(self, doc_id, data, merge=False, dotted=False):
+        with self._lock:
+            current = copy.deepcopy(self._docs.get(doc_id, {})) if merge else {}
+            if dotted:
+                for key, value in data.items():
+                    _set_field(current, key, value)
+            else:
+                _merge_fields(current, data)
+            self._docs[doc_id] = current
+        self._notify(doc_id)
+
+    def _delete(self, doc_id):
+        with self._lock:
+            self._docs.pop(doc_id, None)
+        self._notify(doc_id)
+
+    def _notify(self, doc_id):
+        with self._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            watch._refresh(doc_id)
+
+class FakeWriteBatch:
+    """Write batch applied on commit, in one round trip"""
+
+    def __init__(self, client):
+        self.client = client
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference.collection._write(reference.id, data, merge=merge))
+
+    def update(self, reference, fields):
+        self._writes.append(lambda: reference.collection._write(reference.id, fields, merge=True, dotted=True))
+
+    def delete(self, reference):
+        self._writes.append(lambda: reference.collection._delete(reference.id))
+
+    def commit(self):
+        self.client._round_trip()
+        for write in self._writes:
+            write()
+        self._writes = []
+
+class FakeClient:
+    """In-memory Firestore client"""
+
+    def __init__(self, latency=0.0):
+        self._collections = {}
+        self._lock = threading.Lock()
+        # Simulated round-trip time in seconds, applied to every RPC
+        self.latency = latency
+        # Approximate bytes returned to the caller by reads, aggregations and listeners
+        self.bytes_transferred = 0
+        # RPCs issued; listener deliveries are pushed and not counted
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(self, name)
+            return self._collections[name]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references):
+        self._round_trip()
+        for reference in references:
+            with reference.collection._lock:
+                data = reference.collection._docs.get(reference.id)
+            yield FakeSnapshot(reference, copy.deepcopy(data))
+
+class AsyncFakeAggregationQuery:
+    """Async view of a FakeAggregationQuery"""
+
+    def __init__(self, aggregation, latency):
+        self._aggregation = aggregation
+        self._latency = latency
+
+    def count(self, alias=None):
+        self._aggregation.count(alias)
+        return self
+
+    def sum(self, field_path, alias=None):
+        self._aggregation.sum(field_path, alias)
+        return self
+
+    def avg(self, field_path, alias=None):
+        self._aggregation.avg(field_path, alias)
+        return self
+
+    async def get(self):
+        await asyncio.sleep(self._latency)
+        return self._aggregation.get()
+
+class AsyncFakeQuery:
+    """Async view of a FakeQuery; round trips yield to the event loop"""
+
+    def __init__(self, query, latency):
+        self._query = query
+        self._latency = latency
+
+    def _wrap(self, query):
+        return AsyncFakeQuery(query, self._latency)
+
+    def where(self, field, op, value):
+        return self._wrap(self._query.where(field, op, value))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._wrap(self._query.order_by(field, direction))
+
+    def limit(self, count):
+        return self._wrap(self._query.limit(count))
+
+    def start_after(self, snapshot):
+        return self._wrap(self._query.start_after(snapshot))
+
+    def select(self, field_paths):
+        return self._wrap(self._query.select(field_paths))
+
+    def count(self, alias=None):
+        return AsyncFakeAggregationQuery(FakeAggregationQuery(self._query), self._latency).count(alias)
+
+    def sum(self, field_path, alias=None):
+        return AsyncFakeAggregationQuery(FakeAggregationQuery(self._query), self._latency).sum(field_path, alias)
+
+    def avg(self, field_path, alias=None):
+        return AsyncFakeAggregationQuery(FakeAggregationQuery(self._query), self._latency).avg(field_path, alias)
+
+    async def stream(self):
+        await asyncio.sleep(self._latency)
+        for snapshot in self._query.stream():
+            yield snapshot
+
+    async def get(self):
+        return [snapshot async for snapshot in self.stream()]
+
+class AsyncFakeDocument:
+    """Async view of a FakeDocument"""
+
+    def __init__(self, document, latency):
+        self._document = document
+        self._latency = latency
+        self.id = document.id
+
+    async def set(self, data, merge=False):
+        await asyncio.sleep(self._latency)
+        self._document.set(data, merge=merge)
+
+    async def update(self, fields):
+        await asyncio.sleep(self._latency)
+        self._document.update(fields)
+
+    async def delete(self):
+        await asyncio.sleep(self._latency)
+        self._document.delete()
+
+    async def get(self):
+        await asyncio.sleep(self._latency)
+        return self._document.get()
+
+class AsyncFakeCollection(AsyncFakeQuery):
+    """Async view of a FakeCollection"""
+
+    def document(self, doc_id=None):
+        return AsyncFakeDocument(self._query.document(doc_id), self._latency)
+
+    async def add(self, data):
+        ref = self.document()
+        await ref.set(data)
+        return datetime.datetime.now(), ref
+
+class AsyncFakeWriteBatch:
+    """Async write batch applied on commit"""
+
+    def __init__(self, batch, latency):
+        self._batch = batch
+        self._latency = latency
+
+    def set(self, reference, data, merge=False):
+        self._batch.set(reference._document, data, merge=merge)
+
+    def update(self, reference, fields):
+        self._batch.update(reference._document, fields)
+
+    def delete(self, reference):
+        self._batch.delete(reference._document)
+
+    async def commit(self):
+        await asyncio.sleep(self._latency)
+        self._batch.commit()
+
+class AsyncFakeClient:
+    """
+    Async client over the same in-memory store as a FakeClient
+
+    Args:
+        client (FakeClient): Store to share, a new one if None
+        latency (float): Simulated round-trip time in seconds
+    """
+
+    def __init__(self, client=None, latency=0.0):
+        self.sync_client = client or FakeClient()
+        self.latency = latency
+
+    def collection(self, name):
+        return AsyncFakeCollection(self.sync_client.collection(name), self.latency)
+
+    def batch(self):
+        return AsyncFakeWriteBatch(self.sync_client.batch(), self.latency)
+
+def populate(client, count, seed=0, collection='analyses', distinct_texts=1000):
+    """
+    Fill a fake collection with synthetic analysis documents
+
+    Texts are stored once in the 'contents' collection and referenced by
+    hash, as services.database does.
+
+    Args:
+        client (FakeClient): Client to populate
+        count (int): Number of documents
+        seed (int): Seed for the synthetic scores
+        collection (str): Collection name
+        distinct_texts (int): Number of distinct texts the documents cycle through
+
+    Returns:
+        FakeClient: The same client
+    """
+    import hashlib
+    import random
+    from config.settings import TOXICITY_CATEGORIES
+
+    rng = random.Random(seed)
+    start = datetime.datetime(2026, 1, 1)
+    names = [f"user{i}" for i in range(50)]
+    actions = itertools.cycle(["ALLOW"] * 8 + ["REVIEW", "FLAG"])
+    coll = client.collection(collection)
+    contents = client.collection('contents')
+    for i in range(count):
+        content = f"synthetic comment number {i % distinct_texts} " * 4
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        if i < distinct_texts:
+            contents.document(digest).set({'content': content, 'timestamp': start})
+        coll.document().set({
+            'username': rng.choice(names),
+            'content_hash': digest,
+            'results': {category: rng.random() ** 3 for category in TOXICITY_CATEGORIES},
+            'action': next(actions),
+            'timestamp': start + datetime.timedelta(seconds=30 * i)
+        })
+    return client
@@ -0,0 +1,235 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from config.settings import QUEUE_BACKEND, REDIS_URL, QUEUE_STREAM, QUEUE_GROUP, QUEUE_CLAIM_IDLE
+
+# One comment awaiting moderation; enqueued is its publish time in epoch
+# seconds, deliveries how many times it has been received, this time included
+Message = namedtuple("Message", ["id", "username", "content", "enqueued", "deliveries"], defaults=[1])
+
+class InMemoryQueue:
+    """
+    In-process queue with the delivery semantics of a Redis consumer group
+
+    Received messages stay pending until acknowledged; released messages are
+    delivered again, and so are messages left pending for claim_idle
+    seconds, as another consumer would claim them. For tests and
+    single-process setups.
+
+    Ids restart with every queue, so the name carries a per-queue nonce:
+    analyses stored under f"{name}-{id}" never collide across runs.
+
+    Args:
+        claim_idle (float): Seconds before unacknowledged messages are delivered again
+    """
+
+    def __init__(self, claim_idle=QUEUE_CLAIM_IDLE):
+        self.name = f"memory-{uuid.uuid4().hex[:12]}"
+        self.claim_idle = claim_idle
+        self._ready = deque()
+        self._pending = {}
+        # Message id -> time of its latest delivery
+        self._received = {}
+        self._deliveries = {}
+        self._condition = threading.Condition()
+        self._next_id = 0
+        self.dead = []
+
+    def publish(self, username, content):
+        """Add a message, returning its id"""
+        with self._condition:
+            self._next_id += 1
+            message = Message(str(self._next_id), username, content, time.time())
+            self._ready.append(message)
+            self._condition.notify()
+        return message.id
+
+    def receive(self, max_messages, block_seconds):
+        """
+        Take up to max_messages, waiting at most block_seconds for the first
+
+        Messages idle for claim_idle seconds are taken over before new ones
+        are read.
+
+        Returns:
+            list: Messages, pending until acknowledged
+        """
+        with self._condition:
+            claimed = self._claim(max_messages)
+            if claimed:
+                return [self._deliver(message) for message in claimed]
+            self._condition.wait_for(lambda: self._ready, timeout=block_seconds)
+            return [self._deliver(self._ready.popleft()) for _ in range(min(max_messages, len(self._ready)))]
+
+    def _claim(self, max_messages):
+        if not self.claim_idle:
+            return []
+        cutoff = time.monotonic() - self.claim_idle
+        idle = [message_id for message_id, received in self._received.items() if received <= cutoff]
+        return [self._pending.pop(message_id) for message_id in idle[:max_messages]]
+
+    def _deliver(self, message):
+        self._deliveries[message.id] = self._deliveries.get(message.id, 0) + 1
+        message = message._replace(deliveries=self._deliveries[message.id])
+        self._pending[message.id] = message
+        # Re-inserted so the dict stays ordered by delivery time
+        self._received.pop(message.id, None)
+        self._received[message.id] = time.monotonic()
+        return message
+
+    def ack(self, ids):
+        """Mark messages as processed"""
+        with self._condition:
+            for message_id in ids:
+                self._pending.pop(message_id, None)
+                self._received.pop(message_id, None)
+                self._deliveries.pop(message_id, None)
+
+    def dead_letter(self, messages, reason):
+        """Set messages aside for inspection instead of delivering them again"""
+        with self._condition:
+            for message in messages:
+                if self._pending.pop(message.id, None) is not None:
+                    self._received.pop(message.id, None)
+                    self._deliveries.pop(message.id, None)
+                    self.dead.append((message, reason))
+
+    def release(self, ids):
+        """Return unprocessed messages to the front of the queue"""
+        with self._condition:
+            for message_id in reversed(ids):
+                message = self._pending.pop(message_id, None)
+                self._received.pop(message_id, None)
+                if message is not None:
+                    self._ready.appendleft(message)
+            self._condition.notify_all()
+
+    def lag(self):
+        """Messages not yet acknowledged"""
+        with self._condition:
+            return len(self._ready) + len(self._pending)
+
+class RedisStreamQueue:
+    """
+    Redis Streams consumer group
+
+    Messages received but never acknowledged (e.g. the consumer crashed) are
+    claimed by another consumer once idle for claim_idle seconds, so every
+    message is processed at least once. Requires the redis package.
+
+    Args:
+        url (str): Redis connection URL
+        stream (str): Stream key
+        group (str): Consumer group, created on first use
+        consumer (str): This consumer's name; defaults to host and pid
+        claim_idle (float): Seconds before abandoned messages are taken over
+    """
+
+    def __init__(self, url=REDIS_URL, stream=QUEUE_STREAM, group=QUEUE_GROUP, consumer=None,
+                 claim_idle=QUEUE_CLAIM_IDLE):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.name = stream
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle = claim_idle
+        self._claim_cursor = "0-0"
+        try:
+            self.redis.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    def publish(self, username, content):
+        """Add a message, returning its id"""
+        return self.redis.xadd(self.stream, {'username': username, 'content': content})
+
+    @staticmethod
+    def _message(entry_id, fields, deliveries=1):
+        # Stream ids start with the millisecond publish time
+        enqueued = int(entry_id.split("-", 1)[0]) / 1000
+        return Message(entry_id, fields.get('username', ''), fields.get('content', ''), enqueued, deliveries)
+
+    def receive(self, max_messages, block_seconds):
+        """
+        Take up to max_messages, waiting at most block_seconds for the first
+
+        Abandoned messages of other consumers are taken over before new ones
+        are read.
+
+        Returns:
+            list: Messages, pending until acknowledged
+        """
+        if self.claim_idle:
+            reply = self.redis.xautoclaim(
+                self.stream, self.group, self.consumer, int(self.claim_idle * 1000),
+                start_id=self._claim_cursor, count=max_messages
+            )
+            self._claim_cursor, claimed = reply[0], reply[1]
+            claimed = [(entry_id, fields) for entry_id, fields in claimed if fields]
+            if claimed:
+                pending = self.redis.xpending_range(
+                    self.stream, self.group, min=claimed[0][0], max=claimed[-1][0], count=len(claimed),
+                    consumername=self.consumer
+                )
+                deliveries = {entry['message_id']: entry['times_delivered'] for entry in pending}
+                return [
+                    self._message(entry_id, fields, deliveries.get(entry_id, 1))
+                    for entry_id, fields in claimed
+                ]
+
+        reply = self.redis.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"},
+            count=max_messages, block=int(block_seconds * 1000)
+        )
+        return [self._message(entry_id, fields) for _, entries in reply or [] for entry_id, fields in entries]
+
+    def ack(self, ids):
+        """Mark messages as processed"""
+        if ids:
+            self.redis.xack(self.stream, self.group, *ids)
+
+    def release(self, ids):
+        """Leave messages pending; they are claimed again after claim_idle"""
+
+    def dead_letter(self, messages, reason):
+        """Move messages to the f"{stream}-dead" stream and acknowledge them"""
+        if not messages:
+            return
+        pipeline = self.redis.pipeline()
+        for message in messages:
+            pipeline.xadd(f"{self.stream}-dead", {
+                'id': message.id, 'username': message.username, 'content': message.content,
+                'deliveries': message.deliveries, 'reason': reason
+            })
+        pipeline.xack(self.stream, self.group, *[message.id for message in messages])
+        pipeline.execute()
+
+    def lag(self):
+        """Messages not yet delivered to the group plus delivered but unacknowledged"""
+        for group in self.redis.xinfo_groups(self.stream):
+            if group['name'] == self.group:
+                # 'lag' is only reported by Redis 7+
+                return (group.get('lag') or 0) + group['pending']
+        return 0
+
+def get_queue(backend=QUEUE_BACKEND):
+    """
+    Create the configured message queue
+
+    Args:
+        backend (str): "redis" or "memory"
+
+    Returns:
+        RedisStreamQueue or InMemoryQueue
+    """
+    if backend == "redis":
+        return RedisStreamQueue()
+    if backend == "memory":
+        return InMemoryQueue()
+    raise ValueError(f"Unknown queue backend: {backend}")
@@ -0,0 +1,287 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import INSTRUMENTATION_ENABLED, METRICS_BUCKETS, METRICS_RECENT_SAMPLES
+
+class StageHistogram:
+    """Latency histogram for one pipeline stage, in seconds"""
+
+    def __init__(self, buckets=METRICS_BUCKETS, recent=METRICS_RECENT_SAMPLES):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record one duration"""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += seconds
+            self.count += 1
+            self.recent.append(seconds)
+
+    def percentile(self, q):
+        """
+        Percentile over the recent samples
+
+        Args:
+            q (float): Percentile in [0, 100]
+
+        Returns:
+            float: Duration in seconds, or None if nothing was recorded
+        """
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+class _StageTimer:
+    """Context manager recording its elapsed time into a histogram"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    """Shared no-op timer handed out while instrumentation is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+_server = None
+_histograms = {}
+_histograms_lock = threading.Lock()
+_gauges = {}
+# metric -> {labels: callable}, read on every export
+_gauge_callbacks = {}
+# metric -> {labels: histogram}, histograms owned by other components
+_labeled_histograms = {}
+_readiness_checks = {}
+_enabled = INSTRUMENTATION_ENABLED
+
+def set_enabled(enabled):
+    """Turn stage timing on or off for this process"""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    """Check whether stage timing is on"""
+    return _enabled
+
+def get_histogram(name):
+    """Get or create the histogram for a stage"""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, StageHistogram())
+    return histogram
+
+def stage(name):
+    """
+    Time a pipeline stage
+
+    Usage:
+        with stage("tokenize"):
+            ...
+
+    Args:
+        name (str): Stage name (tokenize, forward, postprocess, persist)
+
+    Returns:
+        A context manager; a shared no-op when instrumentation is disabled
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(get_histogram(name))
+
+def set_gauge(name, value):
+    """
+    Record the current value of a gauge, e.g. queue lag
+
+    Args:
+        name (str): Metric name, exported as toxicity_<name>
+        value (float): Current value
+    """
+    _gauges[name] = value
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+def _render_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+def add_gauge(name, read, labels=None):
+    """
+    Export a gauge whose value is read when /metrics is scraped
+
+    Args:
+        name (str): Metric name, exported as toxicity_<name>
+        read: Zero-argument callable returning the current value
+        labels (dict): Label name -> value, e.g. {'class': 'bulk'}
+    """
+    _gauge_callbacks.setdefault(name, {})[_label_key(labels)] = read
+
+def register_histogram(name, histogram, labels=None):
+    """
+    Export a histogram kept elsewhere, e.g. per scheduler class
+
+    Args:
+        name (str): Metric name, exported as toxicity_<name>
+        histogram (StageHistogram): Histogram to export
+        labels (dict): Label name -> value
+    """
+    _labeled_histograms.setdefault(name, {})[_label_key(labels)] = histogram
+
+def add_readiness_check(name, check):
+    """
+    Register a condition reported by the /ready endpoint
+
+    Args:
+        name (str): Name of the condition in the response
+        check: Zero-argument callable returning whether it holds
+    """
+    _readiness_checks[name] = check
+
+def readiness():
+    """
+    Evaluate the readiness checks
+
+    Returns:
+        dict: 'ready' (all checks hold) and 'checks' (name -> bool)
+    """
+    checks = {name: bool(check()) for name, check in sorted(_readiness_checks.items())}
+    return {'ready': all(checks.values()), 'checks': checks}
+
+def get_gauges():
+    """Get the current value of every gauge"""
+    return dict(_gauges)
+
+def stage_summary():
+    """
+    Summarize recent latencies per stage
+
+    Returns:
+        dict: Stage name -> {'count', 'p50_ms', 'p95_ms'}
+    """
+    summary = {}
+    for name, histogram in sorted(_histograms.items()):
+        p50 = histogram.percentile(50)
+        p95 = histogram.percentile(95)
+        summary[name] = {
+            'count': histogram.count,
+            'p50_ms': p50 * 1000 if p50 is not None else None,
+            'p95_ms': p95 * 1000 if p95 is not None else None
+        }
+    return summary
+
+def export_prometheus():
+    """
+    Render all stage histograms and gauges in Prometheus text exposition format
+
+    Returns:
+        str: Exposition text
+    """
+    lines = [
+        "# HELP toxicity_stage_seconds Time spent per scoring pipeline stage",
+        "# TYPE toxicity_stage_seconds histogram"
+    ]
+    for name, histogram in sorted(_histograms.items()):
+        with histogram._lock:
+            counts = list(histogram.counts)
+            total = histogram.total
+            count = histogram.count
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'toxicity_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'toxicity_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'toxicity_stage_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'toxicity_stage_seconds_count{{stage="{name}"}} {count}')
+    for name, series in sorted(_labeled_histograms.items()):
+        lines.append(f"# TYPE toxicity_{name} histogram")
+        for key, histogram in sorted(series.items()):
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total = histogram.total
+                count = histogram.count
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"toxicity_{name}_bucket{_render_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"toxicity_{name}_bucket{_render_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"toxicity_{name}_sum{_render_labels(key)} {total}")
+            lines.append(f"toxicity_{name}_count{_render_labels(key)} {count}")
+    for name, value in sorted(_gauges.items()):
+        lines.append(f"# TYPE toxicity_{name} gauge")
+        lines.append(f"toxicity_{name} {value}")
+    for name, series in sorted(_gauge_callbacks.items()):
+        lines.append(f"# TYPE toxicity_{name} gauge")
+        for key, read in sorted(series.items()):
+            lines.append(f"toxicity_{name}{_render_labels(key)} {read()}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", export_prometheus())
+        elif path == "/ready":
+            state = readiness()
+            self._send(200 if state['ready'] else 503, "application/json", json.dumps(state))
+        else:
+            self._send(404, "text/plain", "Not found\n")
+
+    def _send(self, status, content_type, text):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port):
+    """
+    Serve /metrics (Prometheus exposition) and /ready on a background thread
+
+    /ready answers 200 once every readiness check holds and 503 before.
+
+    Safe to call on every script rerun; only the first call starts a server.
+
+    Args:
+        port (int): Port to listen on
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    global _server
+    with _histograms_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,170 @@
+import datetime
+import functools
+import threading
+from collections import OrderedDict
+from firebase_admin import firestore
+from config.settings import MIRROR_CAPACITY, MIRROR_MAX_LIVE
+from services.analytics import (
+    ANALYTICS_FIELDS, add_analysis, aggregate_totals, empty_totals, merge_totals, summarize_totals
+)
+from services.database import get_db, watch_analyses
+
+class _Generation:
+    """Mirror state for one anchor time"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watch = None
+        # Totals of the analyses written before the anchor, from one aggregation
+        self.base = empty_totals()
+        # Analyses seen by the listener (analytics fields only) and their totals
+        self.live = {}
+        self.live_totals = empty_totals()
+        # Latest analyses, oldest first
+        self.recent = OrderedDict()
+
+class AnalysesMirror:
+    """
+    In-memory mirror of the analyses collection for the dashboard
+
+    On start the mirror picks an anchor time, registers a snapshot listener
+    for analyses written from then on and computes the totals of everything
+    older with one set of aggregation queries. From then on reads are local
+    and the listener pushes every write, including those of other workers.
+
+    The listener's result set grows with every write, so once it tracks
+    max_live analyses the mirror re-anchors: it starts a fresh listener and
+    aggregation at a new anchor and drops the old one.
+
+    The anchor splits analyses by their client-side timestamp, and the
+    filtered aggregations need composite indexes on timestamp with action and
+    with each results.<category>. Edits to analyses older than the current
+    anchor are not mirrored until the next re-anchor.
+
+    Args:
+        capacity (int): Latest analyses kept for recent()
+        max_live (int): Analyses tracked by a listener before re-anchoring
+    """
+
+    def __init__(self, capacity=MIRROR_CAPACITY, max_live=MIRROR_MAX_LIVE):
+        self.capacity = capacity
+        self.max_live = max_live
+        self._generation = None
+        self._lock = threading.Lock()
+        self._reanchoring = False
+
+    def start(self):
+        """Seed the mirror and start listening; no-op if already running"""
+        with self._lock:
+            if self._generation is None:
+                self._generation = self._anchor()
+
+    def stop(self):
+        """Stop listening"""
+        with self._lock:
+            generation, self._generation = self._generation, None
+        if generation is not None:
+            generation.watch.unsubscribe()
+
+    def _anchor(self):
+        generation = _Generation()
+        anchor = datetime.datetime.now()
+        # Listen first: writes racing the seed queries land in the listener,
+        # and the timestamp filters keep them out of the seed
+        generation.watch = watch_analyses(functools.partial(self._on_snapshot, generation), anchor)
+
+        older = get_db().collection('analyses').where('timestamp', '<', anchor)
+        base = aggregate_totals(older)
+        latest = older.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(self.capacity)
+        seed = [(snapshot.id, snapshot.to_dict()) for snapshot in latest.stream()]
+
+        with generation.lock:
+            generation.base = base
+            recent = OrderedDict(reversed(seed))
+            recent.update(generation.recent)
+            generation.recent = recent
+            self._trim(generation)
+        return generation
+
+    def _trim(self, generation):
+        while len(generation.recent) > self.capacity:
+            generation.recent.popitem(last=False)
+
+    def _on_snapshot(self, generation, snapshots, changes, read_time):
+        with generation.lock:
+            for change in changes:
+                doc_id = change.document.id
+                previous = generation.live.pop(doc_id, None)
+                if previous is not None:
+                    add_analysis(generation.live_totals, previous, -1)
+                if change.type.name == 'REMOVED':
+                    generation.recent.pop(doc_id, None)
+                    continue
+
+                data = change.document.to_dict()
+                tracked = {field: data[field] for field in ANALYTICS_FIELDS if field in data}
+                generation.live[doc_id] = tracked
+                add_analysis(generation.live_totals, tracked)
+                if change.type.name == 'ADDED' or doc_id in generation.recent:
+                    generation.recent[doc_id] = data
+            self._trim(generation)
+            overflowing = len(generation.live) > self.max_live
+
+        if overflowing and not self._reanchoring and generation is self._generation:
+            self._reanchoring = True
+            # Not on the listener's own thread, which unsubscribing may join
+            threading.Thread(target=self._reanchor, daemon=True).start()
+
+    def _reanchor(self):
+        try:
+            generation = self._anchor()
+            with self._lock:
+                previous, self._generation = self._generation, generation
+            if previous is not None:
+                previous.watch.unsubscribe()
+        finally:
+            self._reanchoring = False
+
+    def analytics(self):
+        """
+        Dashboard metrics, computed locally
+
+        Returns:
+            dict: Same metrics as services.analytics.get_analytics_data
+        """
+        generation = self._generation
+        with generation.lock:
+            totals = merge_totals(generation.base, generation.live_totals)
+        return summarize_totals(totals)
+
+    def recent(self, limit=5):
+        """
+        Latest analyses, newest first
+
+        Args:
+            limit (int): Number of analyses to return
+
+        Returns:
+            list: Analysis dicts, each with its document 'id'
+        """
+        generation = self._generation
+        with generation.lock:
+            items = list(generation.recent.items())[-limit:]
+        return [dict(data, id=doc_id) for doc_id, data in reversed(items)]
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_mirror():
+    """
+    Get the process-wide mirror, starting it on first use
+
+    Returns:
+        AnalysesMirror: Mirror shared by all sessions
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = AnalysesMirror()
+            _mirror.start()
+        return _mirror
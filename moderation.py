@@ -1,9 +1,13 @@
-from config.settings import ACTION_COLORS
+from config.settings import ACTION_COLORS, FLAG_MARGIN
 
 def determine_action(results, threshold):
     """
     Determine moderation action based on toxicity results
     
+    Scores from threshold up to threshold + FLAG_MARGIN are sent to review,
+    higher ones are flagged. `python -m services.calibration` recommends
+    both values from moderator labels.
+    
     Args:
         results (dict): Toxicity results with scores
         threshold (float): Threshold for flagging content
@@ -12,7 +16,7 @@ def determine_action(results, threshold):
         tuple: (action, color) - The recommended action and its display color
     """
     max_score = max(results.values())
-    if max_score >= threshold + 0.2:
+    if max_score >= threshold + FLAG_MARGIN:
         return "FLAG", ACTION_COLORS["FLAG"]
     elif max_score >= threshold:
         return "REVIEW", ACTION_COLORS["REVIEW"]
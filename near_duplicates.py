@@ -0,0 +1,325 @@
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from config.settings import (
+    NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, NEAR_DUP_BANDS, NEAR_DUP_SHINGLE_SIZE,
+    NEAR_DUP_MAX_SIZE, NEAR_DUP_MODE
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+def normalize_text(text):
+    """
+    Normalize text for near-duplicate comparison
+
+    Lowercases and drops punctuation, emoji and repeated whitespace, so
+    variants that differ only in those collapse to the same string.
+
+    Args:
+        text (str): Raw text
+
+    Returns:
+        str: Normalized text
+    """
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+def is_indexable(text, size=NEAR_DUP_SHINGLE_SIZE):
+    """
+    Whether a text is long enough to compare by shingles
+
+    Texts that normalize to less than one shingle (e.g. emoji or
+    punctuation only) would all share the same few signatures.
+
+    Args:
+        text (str): Raw text
+        size (int): Characters per shingle
+
+    Returns:
+        bool: True when the normalized text holds at least one full shingle
+    """
+    return len(normalize_text(text)) >= size
+
+def shingles(text, size=NEAR_DUP_SHINGLE_SIZE):
+    """
+    Character shingles of normalized text
+
+    Args:
+        text (str): Raw text
+        size (int): Characters per shingle
+
+    Returns:
+        set: 32-bit hashes of the shingles
+    """
+    text = normalize_text(text)
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=4).digest(), 'little')
+        for gram in grams
+    }
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed family of hash permutations"""
+
+    def __init__(self, num_perm=NEAR_DUP_NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text):
+        """
+        MinHash signature of a text
+
+        Args:
+            text (str): Raw text
+
+        Returns:
+            tuple: One minimum hash per permutation
+        """
+        values = shingles(text)
+        return tuple(
+            min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in values)
+            for a, b in self.permutations
+        )
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return matches / len(signature_a)
+
+class NearDuplicateIndex:
+    """
+    Bounded LSH index of scored texts
+
+    Signatures are split into bands; texts sharing any band are candidates
+    and are accepted when their estimated similarity reaches the threshold.
+    The least recently used entries are evicted beyond max_size.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity to reuse scores
+        num_perm (int): MinHash permutations per signature
+        bands (int): LSH bands; num_perm must be divisible by it
+        max_size (int): Maximum number of indexed texts
+        mode (str): "reuse" returns the neighbour's scores, "flag" still
+            scores the text and only counts the would-be reuse
+    """
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, num_perm=NEAR_DUP_NUM_PERM,
+                 bands=NEAR_DUP_BANDS, max_size=NEAR_DUP_MAX_SIZE, mode=NEAR_DUP_MODE):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_size = max_size
+        self.mode = mode
+        self.hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()
+        self._buckets = defaultdict(set)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _find(self, signature):
+        best_id, best_similarity = None, 0.0
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        for entry_id in candidates:
+            score = similarity(signature, self._entries[entry_id][0])
+            if score >= self.threshold and score > best_similarity:
+                best_id, best_similarity = entry_id, score
+        return best_id, best_similarity
+
+    def lookup(self, text, signature=None):
+        """
+        Find the scores of the most similar indexed text
+
+        Args:
+            text (str): Text to look up
+            signature (tuple): Precomputed signature of the text
+
+        Returns:
+            tuple: (scores, similarity), or None when no indexed text is
+                similar enough or the text is too short to compare
+        """
+        if not is_indexable(text):
+            return None
+        signature = signature or self.hasher.signature(text)
+        with self._lock:
+            entry_id, score = self._find(signature)
+            if entry_id is None:
+                return None
+            self._entries.move_to_end(entry_id)
+            return dict(self._entries[entry_id][1]), score
+
+    def add(self, text, scores, signature=None):
+        """
+        Index a scored text; texts too short to compare are not indexed
+
+        Args:
+            text (str): Scored text
+            scores (dict): Its toxicity scores
+            signature (tuple): Precomputed signature of the text
+        """
+        if not is_indexable(text):
+            return
+        signature = signature or self.hasher.signature(text)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (signature, dict(scores))
+            for key in self._band_keys(signature):
+                self._buckets[key].add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        entry_id, (signature, _) = self._entries.popitem(last=False)
+        for key in self._band_keys(signature):
+            bucket = self._buckets[key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def check(self, text):
+        """
+        Look a text up, counting the hit or miss
+
+        Texts too short to compare are not looked up and not counted.
+
+        Args:
+            text (str): Text about to be scored
+
+        Returns:
+            tuple: (signature, match); signature is None for texts too short
+                to compare, match is as returned by lookup
+        """
+        if not is_indexable(text):
+            return None, None
+        signature = self.hasher.signature(text)
+        match = self.lookup(text, signature)
+        with self._lock:
+            if match is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return signature, match
+
+    def score(self, text, compute):
+        """
+        Get scores for a text, reusing a near-duplicate's when possible
+
+        Args:
+            text (str): Text to score
+            compute: Zero-argument callable running the model for the text
+
+        Returns:
+            dict: Toxicity scores
+        """
+        signature, match = self.check(text)
+        if match is not None and self.mode == "reuse":
+            return match[0]
+        scores = compute()
+        if signature is not None and match is None:
+            self.add(text, scores, signature)
+        return scores
+
+def _perturb(text, rng):
+    """Apply one spam-style edit: swap a word, add emoji/punctuation, or a typo"""
+    words = text.split()
+    edit = rng.randrange(4)
+    if edit == 0:
+        words[rng.randrange(len(words))] = rng.choice(["really", "totally", "so", "very", "just"])
+    elif edit == 1:
+        words.append(rng.choice(["🔥", "😡", "!!!", "👉", "💯"]))
+    elif edit == 2:
+        i = rng.randrange(len(words))
+        words[i] = words[i] + rng.choice(["!", "?", "...", ","])
+    else:
+        i = rng.randrange(len(words))
+        word = words[i]
+        if len(word) > 3:
+            j = rng.randrange(len(word) - 1)
+            words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return " ".join(words)
+
+def evaluate(campaigns=100, variants=20, benign=2000, seed=0, **index_options):
+    """
+    Measure reuse precision/recall and model-call savings on a synthetic corpus
+
+    Each spam campaign is a base message posted as many lightly perturbed
+    variants; benign texts are unrelated. A reuse is correct when the reused
+    entry belongs to the same campaign.
+
+    Args:
+        campaigns (int): Number of spam base messages
+        variants (int): Perturbed copies posted per campaign
+        benign (int): Number of unrelated texts
+        seed (int): Corpus seed
+        **index_options: Passed to NearDuplicateIndex
+
+    Returns:
+        dict: precision, recall, model_calls, model_call_savings
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+
+    corpus = []
+    for campaign in range(campaigns):
+        base = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 30)))
+        corpus.append((base, campaign))
+        for _ in range(variants):
+            corpus.append((_perturb(base, rng), campaign))
+    for _ in range(benign):
+        corpus.append((" ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 30))), None))
+    rng.shuffle(corpus)
+
+    index = NearDuplicateIndex(mode="reuse", **index_options)
+    seen_campaigns = set()
+    true_reuse = false_reuse = missed_reuse = model_calls = 0
+    for text, label in corpus:
+        # The scores carry the campaign label so reuse correctness can be checked
+        hits_before = index.hits
+        scores = index.score(text, lambda: {'campaign': label})
+        reused = index.hits > hits_before
+        if reused:
+            if scores['campaign'] is not None and scores['campaign'] == label:
+                true_reuse += 1
+            else:
+                false_reuse += 1
+        else:
+            model_calls += 1
+            if label is not None and label in seen_campaigns:
+                missed_reuse += 1
+        if label is not None:
+            seen_campaigns.add(label)
+
+    return {
+        'texts': len(corpus),
+        'precision': true_reuse / (true_reuse + false_reuse) if true_reuse + false_reuse else 1.0,
+        'recall': true_reuse / (true_reuse + missed_reuse) if true_reuse + missed_reuse else 1.0,
+        'model_calls': model_calls,
+        'model_call_savings': 1 - model_calls / len(corpus)
+    }
+
+if __name__ == "__main__":
+    print(evaluate())
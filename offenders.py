@@ -0,0 +1,123 @@
+import argparse
+import datetime
+import json
+import time
+from firebase_admin import firestore
+from config.settings import BATCH_WRITE_SIZE, EXPORT_PAGE_SIZE, OFFENDER_TOP_K
+from services.database import (
+    ALL_TIME, OFFENDERS_COLLECTION, get_db, notify_write_listeners, offender_id, offender_period,
+    offender_totals
+)
+
+# Fields read from analyses when rebuilding the index
+OFFENDER_FIELDS = ['username', 'results', 'action', 'timestamp']
+
+def current_week():
+    """Period of this ISO week's offender totals"""
+    return offender_period(datetime.datetime.now())
+
+def top_offenders(k=OFFENDER_TOP_K, period=ALL_TIME, action='FLAG'):
+    """
+    Usernames with the most analyses of an action, from the offender index
+
+    One indexed query reading k documents, however many analyses there are.
+    Needs a composite index on period and counts.<action> descending.
+
+    Args:
+        k (int): Number of usernames
+        period (str): ALL_TIME or an ISO week such as current_week()
+        action (str): Action to rank by (FLAG, REVIEW, ALLOW)
+
+    Returns:
+        list: Dicts with username, analyses, counts, max_score, mean_score
+            and last_seen, most offending first; usernames without any
+            analysis of the action are left out
+    """
+    field = f'counts.{action}'
+    query = (
+        get_db().collection(OFFENDERS_COLLECTION)
+        .where('period', '==', period)
+        .where(field, '>', 0)
+        .order_by(field, direction=firestore.Query.DESCENDING)
+        .limit(k)
+    )
+    offenders = []
+    for snapshot in query.stream():
+        data = snapshot.to_dict()
+        offenders.append({
+            'username': data['username'],
+            'analyses': data['analyses'],
+            'counts': data['counts'],
+            'max_score': data['max_score'],
+            'mean_score': data['score_sum'] / data['analyses'] if data['analyses'] else 0.0,
+            # Stored as epoch seconds, see add_offender_writes
+            'last_seen': datetime.datetime.fromtimestamp(data['last_seen'])
+        })
+    return offenders
+
+def rebuild_offender_index(page_size=EXPORT_PAGE_SIZE, batch_size=BATCH_WRITE_SIZE):
+    """
+    Recompute the offender index from all stored analyses
+
+    Needed once for analyses saved before the index existed; saves and
+    re-scoring keep it current after that, except that max_score does not
+    come down when re-scoring lowers a score. Analyses are read in pages
+    of their indexed fields only; the totals held in memory grow with the
+    number of usernames and weeks, not analyses. Every offender document is
+    then replaced and those without analyses left are deleted.
+
+    Increments committed between the end of the scan and the rewrite are
+    lost, so run it while nothing is saving analyses.
+
+    Args:
+        page_size (int): Analyses per request
+        batch_size (int): Documents per write batch (Firestore allows 500)
+
+    Returns:
+        dict: analyses read, offender documents written and removed
+    """
+    db = get_db()
+    query = db.collection('analyses').order_by('timestamp').select(OFFENDER_FIELDS)
+    totals = {}
+    read = 0
+    last = None
+    while True:
+        page_query = query if last is None else query.start_after(last)
+        page = list(page_query.limit(page_size).stream())
+        offender_totals((snapshot.to_dict() for snapshot in page), totals)
+        read += len(page)
+        if len(page) < page_size:
+            break
+        last = page[-1]
+
+    collection = db.collection(OFFENDERS_COLLECTION)
+    rebuilt = {offender_id(period, username): entry for (period, username), entry in totals.items()}
+    stale = [snapshot.reference for snapshot in collection.select([]).stream() if snapshot.id not in rebuilt]
+    writes = [(collection.document(doc_id), entry) for doc_id, entry in rebuilt.items()]
+    writes += [(ref, None) for ref in stale]
+    for i in range(0, len(writes), batch_size):
+        batch = db.batch()
+        for ref, entry in writes[i:i + batch_size]:
+            if entry is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, dict(entry, last_seen=entry['last_seen'].timestamp()))
+        batch.commit()
+    notify_write_listeners()
+    return {'analyses': read, 'offenders': len(rebuilt), 'removed': len(stale)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or rebuild the per-username offender index")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the index from all analyses")
+    parser.add_argument("--week", action="store_true", help="Rank this ISO week instead of all time")
+    parser.add_argument("--action", default="FLAG", choices=["FLAG", "REVIEW", "ALLOW"])
+    parser.add_argument("-k", type=int, default=OFFENDER_TOP_K)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        start = time.perf_counter()
+        report = rebuild_offender_index()
+        report['seconds'] = time.perf_counter() - start
+    else:
+        report = top_offenders(args.k, current_week() if args.week else ALL_TIME, args.action)
+    print(json.dumps(report, indent=2, default=str))
@@ -1,10 +1,154 @@
 import streamlit as st
-from frontend.components import analytics_card, display_post
+from frontend.components import (
+    analytics_card, display_feed, display_post, instrumentation_panel, offenders_panel
+)
 from services.analytics import get_analytics_data
-from services.database import save_analysis_to_firestore
+from services.database import add_write_listener, save_analysis_to_firestore
 from services.moderation import determine_action
-from models.toxicity import predict_toxicity
-from config.settings import AVATAR_COLORS
+from models.toxicity import predict_toxicity, predict_toxicity_admitted
+from models.admission import rescore_later
+from services.mirror import get_mirror
+from services.calibration import load_labeled_scores, overall_curve, rates_at
+from services.offenders import top_offenders
+from config.settings import (
+    AVATAR_COLORS, SCHEDULER_ENABLED, ANALYTICS_CACHE_TTL, ANALYTICS_REFRESH_SECONDS, MIRROR_ENABLED,
+    CALIBRATION_CACHE_TTL, OFFENDER_INDEX_ENABLED
+)
+
+@st.cache_data(ttl=ANALYTICS_CACHE_TTL, show_spinner=False)
+def cached_analytics_data():
+    """Dashboard metrics, shared by all sessions for up to ANALYTICS_CACHE_TTL seconds"""
+    return get_analytics_data()
+
+# Writes from this process make the cached metrics stale immediately
+add_write_listener(cached_analytics_data.clear)
+
+@st.cache_data(ttl=ANALYTICS_CACHE_TTL, show_spinner=False)
+def cached_top_offenders(period):
+    """Top flagged usernames of a period, cached like the dashboard metrics"""
+    return top_offenders(period=period)
+
+add_write_listener(cached_top_offenders.clear)
+
+# A resource rather than data cache: the arrays are only read, so hits skip pickling
+@st.cache_resource(ttl=CALIBRATION_CACHE_TTL, show_spinner=False)
+def cached_calibration_curve():
+    """Precision/recall/FPR sweep over the moderator-labeled analyses"""
+    return overall_curve(*load_labeled_scores())
+
+@st.fragment(run_every=ANALYTICS_REFRESH_SECONDS)
+def analytics_panel(threshold):
+    """
+    Analytics cards and detailed stats
+    
+    Reruns on its own every ANALYTICS_REFRESH_SECONDS, independently of the
+    rest of the page.
+    
+    Args:
+        threshold (float): Current detection threshold, for the false
+            positive rate
+    """
+    # The live mirror is pushed every write, so it needs no cache
+    analytics_data = get_mirror().analytics() if MIRROR_ENABLED else cached_analytics_data()
+    
+    # Analysis metrics with icons in a more compact layout
+    cols = st.columns(2)
+    with cols[0]:
+        analytics_card("Analyzed", f"{analytics_data['total_analyzed']}", "📊")
+    with cols[1]:
+        analytics_card("Flagged", f"{analytics_data['total_flagged']}", "⚠️", "#FF5252")
+        
+    cols = st.columns(2)
+    with cols[0]:
+        analytics_card("Pass Rate", f"{analytics_data['pass_rate']:.1f}%", "✅", "#4CAF50")
+    with cols[1]:
+        analytics_card("Avg Score", f"{analytics_data['avg_score']:.2f}", "📈", "#FFB74D")
+    
+    # Quick Stats
+    with st.expander("Detailed Stats", expanded=False):
+        most_common = analytics_data['most_common_category'] or "none"
+        false_positive_rate = rates_at(cached_calibration_curve(), threshold)['fpr']
+        false_positive_text = f"{false_positive_rate:.1%}" if false_positive_rate is not None else "no labels yet"
+        category_count = analytics_data['category_counts'].get(most_common, 0) if most_common != "none" else 0
+        
+        st.markdown(f"""
+        <div style="font-size: 0.8rem; color: var(--text-secondary); margin-bottom: 0.25rem;">
+            Most common type:
+        </div>
+        <div style="font-weight: 600; margin-bottom: 0.75rem; font-size: 0.9rem;">{most_common.title()} ({category_count})</div>
+        
+        <div style="font-size: 0.8rem; color: var(--text-secondary); margin-bottom: 0.25rem;">
+            False positive rate:
+        </div>
+        <div style="font-weight: 600; font-size: 0.9rem;">{false_positive_text}</div>
+        """, unsafe_allow_html=True)
+
+@st.fragment
+def analysis_form(model, tokenizer, threshold):
+    """
+    Content input, analysis and the analyzed post
+    
+    Typing and analyzing rerun only this fragment; the rest of the page is
+    left as it is.
+    
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        threshold (float): Toxicity threshold
+    """
+    # User text input directly without the unnecessary container
+    username = st.text_input("Author", placeholder="Enter name")
+        
+    # Display the current username or default
+    display_name = username if username else "Anonymous User"
+    user_initials = ''.join([name[0].upper() for name in display_name.split() if name])[:2]
+    if not user_initials:
+        user_initials = "AU"
+    
+    content_input = st.text_area(
+        "Content",
+        placeholder="Enter text to analyze for toxicity",
+        height=80
+    )
+    
+    button_cols = st.columns([4, 1])
+    with button_cols[1]:
+        analyze_button = st.button("Analyze", type="primary")
+    
+    # Analyze current input if button is clicked
+    if analyze_button and content_input.strip():
+        with st.spinner("Analyzing..."):
+            if SCHEDULER_ENABLED:
+                # Interactive priority, shed to the keyword filter when overloaded
+                admission = predict_toxicity_admitted(model, tokenizer, content_input)
+                results, degraded = admission.results, admission.degraded
+            else:
+                admission, degraded = None, False
+                results = predict_toxicity(model, tokenizer, content_input)
+            action, _ = determine_action(results, threshold)
+            analysis_id = save_analysis_to_firestore(
+                display_name, content_input, results, action, degraded, threshold
+            )
+            if admission is not None and admission.pending is not None:
+                rescore_later(admission.pending, analysis_id, threshold)
+        
+        if degraded:
+            st.info("The analyzer is under heavy load: this result comes from the keyword filter and will be refined shortly")
+        
+        # Display current input results with the username
+        display_post(
+            display_name,
+            "Just now",
+            content_input,
+            user_initials,
+            model,
+            tokenizer,
+            threshold,
+            AVATAR_COLORS["user"],
+            results
+        )
+    elif analyze_button and not content_input.strip():
+        st.warning("Please enter content to analyze")
 
 def main_page(model, tokenizer):
     """
@@ -65,105 +209,43 @@ def main_page(model, tokenizer):
             # Analytics Dashboard Summary
             st.markdown('<div class="section-heading">Analytics</div>', unsafe_allow_html=True)
             
-            # Get analytics data
-            analytics_data = get_analytics_data()
-            
-            # Analysis metrics with icons in a more compact layout
-            cols = st.columns(2)
-            with cols[0]:
-                analytics_card("Analyzed", f"{analytics_data['total_analyzed']}", "📊")
-            with cols[1]:
-                analytics_card("Flagged", f"{analytics_data['total_flagged']}", "⚠️", "#FF5252")
-                
-            cols = st.columns(2)
-            with cols[0]:
-                analytics_card("Pass Rate", f"{analytics_data['pass_rate']:.1f}%", "✅", "#4CAF50")
-            with cols[1]:
-                analytics_card("Avg Score", f"{analytics_data['avg_score']:.2f}", "📈", "#FFB74D")
-            
-            # Quick Stats
-            with st.expander("Detailed Stats", expanded=False):
-                most_common = analytics_data['most_common_category'] or "none"
-                category_count = analytics_data['category_counts'].get(most_common, 0) if most_common != "none" else 0
-                
-                st.markdown(f"""
-                <div style="font-size: 0.8rem; color: var(--text-secondary); margin-bottom: 0.25rem;">
-                    Most common type:
-                </div>
-                <div style="font-weight: 600; margin-bottom: 0.75rem; font-size: 0.9rem;">{most_common.title()} ({category_count})</div>
-                
-                <div style="font-size: 0.8rem; color: var(--text-secondary); margin-bottom: 0.25rem;">
-                    False positive rate:
-                </div>
-                <div style="font-weight: 600; font-size: 0.9rem;">8.2%</div>
-                """, unsafe_allow_html=True)
+            analytics_panel(threshold)
                 
     with col1:
         # Content Input Area
         st.markdown('<div class="section-heading">Content Analysis</div>', unsafe_allow_html=True)
         
-        # User text input directly without the unnecessary container
-        username = st.text_input("Author", placeholder="Enter name")
-            
-        # Display the current username or default
-        display_name = username if username else "Anonymous User"
-        user_initials = ''.join([name[0].upper() for name in display_name.split() if name])[:2]
-        if not user_initials:
-            user_initials = "AU"
-        
-        content_input = st.text_area(
-            "Content",
-            placeholder="Enter text to analyze for toxicity",
-            height=80
-        )
-        
-        button_cols = st.columns([4, 1])
-        with button_cols[1]:
-            analyze_button = st.button("Analyze", type="primary")
+        analysis_form(model, tokenizer, threshold)
         
         # Results Section with added spacing between items
         st.markdown('<div class="section-heading">Recent Analysis</div>', unsafe_allow_html=True)
         
-        # Sample posts with improved styling and increased spacing
-        display_post(
-            "John Smith",
-            "2 min ago",
-            "This movie is absolutely terrible! The director should be fired and the actors were completely useless.",
-            "JS",
+        # Sample posts, rendered as one element
+        display_feed(
+            [
+                {
+                    'author': "John Smith",
+                    'time_ago': "2 min ago",
+                    'content': "This movie is absolutely terrible! The director should be fired and the actors were completely useless.",
+                    'avatar_text': "JS",
+                    'avatar_color': AVATAR_COLORS["sample1"]
+                },
+                {
+                    'author': "Alice Doe",
+                    'time_ago': "5 min ago",
+                    'content': "The so-called \"experts\" are all just paid shills! Don't listen to their lies about climate change. They're trying to destroy our economy and way of life!",
+                    'avatar_text': "AD",
+                    'avatar_color': AVATAR_COLORS["sample2"]
+                }
+            ],
             model,
             tokenizer,
-            threshold,
-            AVATAR_COLORS["sample1"]
+            threshold
         )
-        
-        display_post(
-            "Alice Doe",
-            "5 min ago",
-            "The so-called \"experts\" are all just paid shills! Don't listen to their lies about climate change. They're trying to destroy our economy and way of life!",
-            "AD",
-            model,
-            tokenizer,
-            threshold,
-            AVATAR_COLORS["sample2"]
-        )
-        
-        # Analyze current input if button is clicked
-        if analyze_button and content_input.strip():
-            with st.spinner("Analyzing..."):
-                results = predict_toxicity(model, tokenizer, content_input)
-                action, _ = determine_action(results, threshold)
-                save_analysis_to_firestore(display_name, content_input, results, action)
-            
-            # Display current input results with the username
-            display_post(
-                display_name,
-                "Just now",
-                content_input,
-                user_initials,
-                model,
-                tokenizer,
-                threshold,
-                AVATAR_COLORS["user"]
-            )
-        elif analyze_button and not content_input.strip():
-            st.warning("Please enter content to analyze")
\ No newline at end of file
+    
+    # Repeat offenders, from the per-username index
+    if OFFENDER_INDEX_ENABLED:
+        offenders_panel(cached_top_offenders)
+    
+    # Stage timings debug panel (only when instrumentation is enabled)
+    instrumentation_panel()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import argparse
+import copy
+import json
+import platform
+import time
+import warnings
+import torch
+from config.settings import TOXICITY_CATEGORIES, DEFAULT_THRESHOLD, INFERENCE_DTYPE
+from services.moderation import determine_action
+
+DTYPES = {
+    "float32": torch.float32,
+    "bfloat16": torch.bfloat16
+}
+
+def _cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+def cpu_supports_bf16():
+    """
+    Check whether the CPU has native bfloat16 arithmetic
+
+    True for x86 CPUs with AVX512-BF16 or AMX-BF16 and ARM CPUs with the BF16
+    extension; elsewhere bf16 is emulated and slower than fp32.
+
+    Returns:
+        bool: Whether bf16 inference is worthwhile on this machine
+    """
+    flags = _cpu_flags()
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "bf16" in flags
+    return bool(flags & {"avx512_bf16", "amx_bf16"})
+
+def resolve_inference_dtype(name=INFERENCE_DTYPE):
+    """
+    Pick the dtype to run the model in, degrading to float32 when unsupported
+
+    Args:
+        name (str): Requested dtype, "float32" or "bfloat16"
+
+    Returns:
+        torch.dtype: The dtype to use
+    """
+    dtype = DTYPES[name]
+    if dtype == torch.bfloat16 and not cpu_supports_bf16():
+        warnings.warn("CPU lacks native bfloat16 support; running the model in float32")
+        return torch.float32
+    return dtype
+
+def to_inference_dtype(model, dtype):
+    """
+    Cast model weights for inference
+
+    Args:
+        model: Model to cast (in place)
+        dtype (torch.dtype): Target dtype
+
+    Returns:
+        The model
+    """
+    if dtype != torch.float32:
+        model.to(dtype)
+    return model
+
+def _parameter_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+def _score(model, tokenizer, texts, batch_size):
+    scores = []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for i in range(0, len(texts), batch_size):
+            inputs = tokenizer(texts[i:i + batch_size], return_tensors="pt", truncation=True, padding=True)
+            scores.extend(torch.sigmoid(model(**inputs).logits.float()).tolist())
+    return scores, (time.perf_counter() - start) / len(texts)
+
+def compare_precision(model, tokenizer, texts, dtype=torch.bfloat16, batch_size=16,
+                      threshold=DEFAULT_THRESHOLD):
+    """
+    Compare reduced-precision scores and decisions against float32
+
+    Args:
+        model: float32 model (left unchanged)
+        tokenizer: Its tokenizer
+        texts (list): Validation corpus
+        dtype (torch.dtype): Reduced precision to evaluate
+        batch_size (int): Texts per forward pass
+        threshold (float): Threshold passed to determine_action
+
+    Returns:
+        dict: Score error, decision agreement, memory and latency of both modes
+    """
+    reduced = to_inference_dtype(copy.deepcopy(model), dtype)
+    base_scores, base_seconds = _score(model, tokenizer, texts, batch_size)
+    reduced_scores, reduced_seconds = _score(reduced, tokenizer, texts, batch_size)
+
+    max_error = {category: 0.0 for category in TOXICITY_CATEGORIES}
+    disagreements = []
+    for text, base_row, reduced_row in zip(texts, base_scores, reduced_scores):
+        base = dict(zip(TOXICITY_CATEGORIES, base_row))
+        low = dict(zip(TOXICITY_CATEGORIES, reduced_row))
+        for category in TOXICITY_CATEGORIES:
+            max_error[category] = max(max_error[category], abs(base[category] - low[category]))
+        base_action = determine_action(base, threshold)[0]
+        low_action = determine_action(low, threshold)[0]
+        if base_action != low_action:
+            disagreements.append({'text': text, 'float32': base_action, str(dtype): low_action})
+
+    return {
+        'texts': len(texts),
+        'dtype': str(dtype),
+        'native_bf16': cpu_supports_bf16(),
+        'max_abs_error': max_error,
+        'decision_agreement': 1 - len(disagreements) / len(texts),
+        'disagreements': disagreements[:20],
+        'float32_parameter_mb': _parameter_bytes(model) / 2 ** 20,
+        'reduced_parameter_mb': _parameter_bytes(reduced) / 2 ** 20,
+        'float32_ms_per_item': base_seconds * 1000,
+        'reduced_ms_per_item': reduced_seconds * 1000
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate reduced-precision inference against float32")
+    parser.add_argument("corpus", help="Text file with one comment per line")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default="bfloat16")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random model (offline smoke test)")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    if args.tiny:
+        from benchmarks import build_tiny_model
+        model, tokenizer = build_tiny_model()
+    else:
+        from models.toxicity import load_model_artifacts
+        model, tokenizer = load_model_artifacts(dtype=torch.float32)
+
+    print(json.dumps(compare_precision(model, tokenizer, texts, DTYPES[args.dtype]), indent=2))
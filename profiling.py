@@ -0,0 +1,154 @@
+import contextlib
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from config.settings import (
+    PROFILING_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_BACKEND, PROFILE_DIR,
+    PROFILE_MAX_FILES, PROFILE_INTERVAL
+)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_enabled = PROFILING_ENABLED
+_sample_rate = PROFILE_SAMPLE_RATE
+_active = threading.local()
+# Distinguishes profiles written by the same thread within one second
+_sequence = itertools.count()
+_rotate_lock = threading.Lock()
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the calling thread
+
+    A background thread snapshots the profiled thread's stack every
+    `interval` seconds; stacks are kept in collapsed form so they can be fed
+    directly to flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def write(self, path):
+        """Write the collected stacks in collapsed (folded) format"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class TorchProfiler:
+    """torch.profiler wrapper exporting collapsed CPU stacks"""
+
+    def __init__(self):
+        from torch.profiler import ProfilerActivity, profile
+        self._profile = profile(activities=[ProfilerActivity.CPU], with_stack=True)
+
+    def __enter__(self):
+        self._profile.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._profile.__exit__(*exc)
+
+    def write(self, path):
+        """Write self CPU time per stack in collapsed (folded) format"""
+        self._profile.export_stacks(path, "self_cpu_time_total")
+
+def set_profiling(enabled, sample_rate=None):
+    """
+    Turn request profiling on or off at runtime
+
+    Args:
+        enabled (bool): Whether sampled requests are profiled
+        sample_rate (float): Fraction of requests to profile, unchanged if None
+    """
+    global _enabled, _sample_rate
+    _enabled = enabled
+    if sample_rate is not None:
+        _sample_rate = sample_rate
+
+def _rotate(directory, keep):
+    # Serialized within the process; other processes sharing the directory
+    # may still remove files between the listing and the delete
+    with _rotate_lock:
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".folded"):
+                path = os.path.join(directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+        files.sort()
+        for _, path in files[:-keep] if keep else files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+@contextlib.contextmanager
+def _profiled(name):
+    profiler = TorchProfiler() if PROFILE_BACKEND == "torch" else SamplingProfiler()
+    _active.running = True
+    try:
+        with profiler:
+            yield
+    finally:
+        _active.running = False
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        unique = f"{os.getpid()}-{threading.get_ident()}-{next(_sequence)}"
+        profiler.write(os.path.join(PROFILE_DIR, f"{name}-{stamp}-{unique}.folded"))
+        _rotate(PROFILE_DIR, PROFILE_MAX_FILES)
+
+def maybe_profile(name, force=False):
+    """
+    Profile a block for a sampled fraction of calls
+
+    Usage:
+        with maybe_profile("predict_toxicity"):
+            ...
+
+    Nested calls inside an already profiled block are not profiled again.
+
+    Args:
+        name (str): Label used in the output file name
+        force (bool): Profile this call regardless of the sample rate
+            (still requires profiling to be enabled)
+
+    Returns:
+        A context manager; a shared no-op when profiling is disabled or the
+        call is not sampled
+    """
+    if not _enabled or getattr(_active, "running", False):
+        return _NULL_CONTEXT
+    if not force and random.random() >= _sample_rate:
+        return _NULL_CONTEXT
+    return _profiled(name)
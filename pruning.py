@@ -0,0 +1,121 @@
+import argparse
+import copy
+import json
+import torch
+from models.distill import evaluate_student
+from models.registry import artifact_sha256, register_model
+
+def head_importance(model, tokenizer, texts, batch_size=16):
+    """
+    Estimate the importance of every attention head on a local corpus
+
+    Importance is the accumulated absolute gradient of the loss with respect
+    to a head mask (Michel et al., 2019), using the model's own decisions as
+    pseudo-labels so no annotations are needed. The scores are raw, so they
+    compare across layers; see normalize_per_layer for ranking heads.
+
+    Args:
+        model (BertForSequenceClassification): Model to analyze
+        tokenizer: Its tokenizer
+        texts (list): Representative texts
+        batch_size (int): Texts per forward pass
+
+    Returns:
+        torch.Tensor: (layers, heads) importance scores
+    """
+    config = model.config
+    head_mask = torch.ones(config.num_hidden_layers, config.num_attention_heads, requires_grad=True)
+    importance = torch.zeros_like(head_mask)
+    loss_fn = torch.nn.BCEWithLogitsLoss()
+    model.eval()
+
+    for i in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[i:i + batch_size], return_tensors="pt", truncation=True, padding=True)
+        with torch.no_grad():
+            targets = (torch.sigmoid(model(**inputs).logits) >= 0.5).float()
+        loss = loss_fn(model(**inputs, head_mask=head_mask).logits, targets)
+        gradient, = torch.autograd.grad(loss, head_mask)
+        importance += gradient.abs()
+
+    return importance
+
+def normalize_per_layer(importance):
+    """L2-normalize each layer's head scores, as Michel et al. do before ranking heads"""
+    return importance / importance.norm(dim=1, keepdim=True).clamp_min(1e-20)
+
+def prune_model(model, importance, head_fraction=0.0, drop_layers=0):
+    """
+    Remove the least important layers and heads, in place
+
+    Whole layers are dropped first, ranked by their summed raw head
+    importance, then the least important remaining heads, ranked by
+    per-layer normalized importance, always keeping one head per layer.
+    Normalized scores only say how a layer's heads compare with each other,
+    so they are not used to rank layers.
+
+    Args:
+        model (BertForSequenceClassification): Model to prune
+        importance (torch.Tensor): Raw output of head_importance for this model
+        head_fraction (float): Share of the remaining heads to remove
+        drop_layers (int): Encoder layers to remove
+
+    Returns:
+        dict: Layer index (after dropping) -> pruned head indices
+    """
+    num_layers, num_heads = importance.shape
+    if drop_layers >= num_layers:
+        raise ValueError(f"Cannot drop {drop_layers} of {num_layers} layers")
+
+    layer_scores = importance.sum(dim=1)
+    keep = sorted(layer_scores.argsort(descending=True)[:num_layers - drop_layers].tolist())
+    encoder = model.bert.encoder
+    encoder.layer = torch.nn.ModuleList(encoder.layer[i] for i in keep)
+    model.config.num_hidden_layers = len(keep)
+    importance = normalize_per_layer(importance[keep])
+
+    budget = int(head_fraction * importance.numel())
+    pruned = {}
+    for index in importance.flatten().argsort().tolist():
+        if budget == 0:
+            break
+        layer, head = divmod(index, num_heads)
+        if len(pruned.get(layer, [])) >= num_heads - 1:
+            continue
+        pruned.setdefault(layer, []).append(head)
+        budget -= 1
+
+    model.prune_heads(pruned)
+    return pruned
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune attention heads and layers of the toxicity model")
+    parser.add_argument("corpus", help="Text file with one comment per line")
+    parser.add_argument("--head-fraction", type=float, default=0.3, help="Share of heads to remove")
+    parser.add_argument("--drop-layers", type=int, default=0)
+    parser.add_argument("--holdout", type=float, default=0.3)
+    parser.add_argument("--name", default="local/toxic-bert-pruned", help="Registry model name")
+    parser.add_argument("--revision", default="v1")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random model (offline smoke test)")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    split = int(len(texts) * (1 - args.holdout))
+
+    if args.tiny:
+        from benchmarks import build_tiny_model
+        original, tokenizer = build_tiny_model()
+    else:
+        from models.toxicity import load_model_artifacts
+        original, tokenizer = load_model_artifacts()
+
+    pruned_model = copy.deepcopy(original)
+    importance = head_importance(pruned_model, tokenizer, texts[:split])
+    pruned_heads = prune_model(pruned_model, importance, args.head_fraction, args.drop_layers)
+    path = register_model(pruned_model, tokenizer, args.name, args.revision)
+
+    report = evaluate_student(original, pruned_model, tokenizer, texts[split:] or texts)
+    report['pruned_heads'] = {str(layer): heads for layer, heads in pruned_heads.items()}
+    report['registry_path'] = path
+    report['sha256'] = artifact_sha256(path)  # MODEL_SHA256 when serving this artifact
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,275 @@
+import contextlib
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import warnings
+import torch
+from config.settings import MODEL_NAME, MODEL_REGISTRY_DIR, MODEL_REVISION, MODEL_SHA256
+
+WEIGHTS_FILE = "model.safetensors"
+MANIFEST_FILE = "manifest.json"
+
+# Hub revisions are only fetched by full commit hash; branches and tags move
+COMMIT_HASH_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+# Registry revision of an artifact fetched before MODEL_REVISION was pinned
+UNPINNED = "unpinned"
+
+# safetensors dtype tags -> torch dtypes
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool
+}
+
+def get_model_dir(model_name=MODEL_NAME, revision=MODEL_REVISION):
+    """
+    Get the registry directory holding a model artifact
+
+    Args:
+        model_name (str): Hub model id
+        revision (str): Pinned revision of the model; None for the
+            artifact fetched unpinned
+
+    Returns:
+        str: Path of the artifact directory
+    """
+    return os.path.join(MODEL_REGISTRY_DIR, model_name.replace('/', '--'), revision or UNPINNED)
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Compute the sha256 hex digest of a file
+
+    Args:
+        path (str): File to hash
+        chunk_size (int): Bytes read per iteration
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_sha256(model_dir):
+    """sha256 of the weights in a registry directory, the value MODEL_SHA256 pins"""
+    return file_sha256(os.path.join(model_dir, WEIGHTS_FILE))
+
+def register_model(model, tokenizer, model_name, revision, commit_hash=None):
+    """
+    Save a model and tokenizer into the local registry
+
+    The weights are serialized as safetensors so they can be memory-mapped,
+    and a manifest records the revision and the weights hash.
+
+    Args:
+        model: Model to store
+        tokenizer: Its tokenizer
+        model_name (str): Registry model id (a hub id or a local name)
+        revision (str): Revision to store it under
+        commit_hash (str): Resolved hub commit, if any
+
+    Returns:
+        str: Path of the artifact directory
+    """
+    model_dir = get_model_dir(model_name, revision)
+    os.makedirs(model_dir, exist_ok=True)
+    model.save_pretrained(model_dir, safe_serialization=True)
+    tokenizer.save_pretrained(model_dir)
+
+    manifest = {
+        'model_name': model_name,
+        'revision': revision,
+        'commit_hash': commit_hash,
+        'sha256': artifact_sha256(model_dir)
+    }
+    with open(os.path.join(model_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return model_dir
+
+def fetch_model(model_name=MODEL_NAME, revision=MODEL_REVISION):
+    """
+    Download a model revision from the hub into the local registry
+
+    Without a revision the hub's default branch is fetched, with a warning;
+    the manifest records the commit it resolved to, and the artifact is kept
+    under UNPINNED, so later loads reuse it instead of following the branch.
+
+    Args:
+        model_name (str): Hub model id
+        revision (str): Full commit hash to fetch, or None
+
+    Returns:
+        str: Path of the artifact directory
+
+    Raises:
+        ValueError: If the revision is not a commit hash
+        RuntimeError: If the hub served a different commit
+    """
+    from transformers import BertForSequenceClassification, BertTokenizer
+
+    if revision is None:
+        warnings.warn(
+            f"MODEL_REVISION is not set; fetching {model_name} from the default branch. "
+            "Pin it with `python -m models.registry --pin`"
+        )
+    elif not COMMIT_HASH_PATTERN.fullmatch(revision):
+        raise ValueError(
+            f"Model revision {revision!r} is not a commit hash; pin one with `python -m models.registry --pin`"
+        )
+    model = BertForSequenceClassification.from_pretrained(model_name, revision=revision)
+    tokenizer = BertTokenizer.from_pretrained(model_name, revision=revision)
+    commit_hash = getattr(model.config, '_commit_hash', None)
+    if revision is not None and commit_hash != revision:
+        raise RuntimeError(f"Hub served commit {commit_hash} of {model_name}, expected {revision}")
+    return register_model(model, tokenizer, model_name, revision or UNPINNED, commit_hash)
+
+def pin_model(model_name=MODEL_NAME, ref="main"):
+    """
+    Resolve a hub branch or tag to its commit and fetch that commit
+
+    The printed values go into MODEL_REVISION and MODEL_SHA256 after review;
+    from then on every load is checked against them.
+
+    Args:
+        model_name (str): Hub model id
+        ref (str): Branch or tag to resolve
+
+    Returns:
+        dict: model_name, revision (commit hash) and sha256 of the weights
+    """
+    from huggingface_hub import HfApi
+
+    commit_hash = HfApi().model_info(model_name, revision=ref).sha
+    model_dir = get_model_dir(model_name, commit_hash)
+    if not os.path.isdir(model_dir):
+        fetch_model(model_name, commit_hash)
+    return {
+        'model_name': model_name,
+        'revision': commit_hash,
+        'sha256': artifact_sha256(model_dir)
+    }
+
+def verify_model(model_dir, expected_sha256=MODEL_SHA256):
+    """
+    Check that the weights in a registry directory match the pinned hash
+
+    The expected digest comes from configuration, never from the registry's
+    own manifest, so a corrupted or replaced artifact cannot vouch for itself.
+
+    Args:
+        model_dir (str): Artifact directory
+        expected_sha256 (str): Pinned digest of the weights file
+
+    Without a pinned digest nothing is checked and a warning is issued.
+
+    Returns:
+        dict: The artifact manifest
+
+    Raises:
+        RuntimeError: If the weights hash differs from the pinned digest
+    """
+    with open(os.path.join(model_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if not expected_sha256:
+        warnings.warn(
+            f"MODEL_SHA256 is not set; loading {model_dir} unverified. "
+            "Pin it with `python -m models.registry --pin`"
+        )
+        return manifest
+
+    actual = artifact_sha256(model_dir)
+    if actual != expected_sha256:
+        raise RuntimeError(
+            f"Model artifact in {model_dir} has sha256 {actual}, expected {expected_sha256}"
+        )
+    return manifest
+
+def load_mmap_state_dict(path):
+    """
+    Load a safetensors file as tensors backed by a private memory map
+
+    Pages stay shared with the OS page cache until written, so every worker
+    process loading the same file reuses the same physical memory.
+
+    Args:
+        path (str): Path to a .safetensors file
+
+    Returns:
+        dict: Mapping of parameter name to tensor
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_size = struct.unpack('<Q', buffer[:8])[0]
+    header = json.loads(buffer[8:8 + header_size])
+    header.pop('__metadata__', None)
+    data_start = 8 + header_size
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        shape = info['shape']
+        begin, _ = info['data_offsets']
+        numel = math.prod(shape)
+        if numel == 0:
+            state_dict[name] = torch.empty(shape, dtype=dtype)
+            continue
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=numel, offset=data_start + begin)
+        state_dict[name] = tensor.view(shape)
+    return state_dict
+
+@contextlib.contextmanager
+def empty_parameters():
+    """
+    Create module parameters on the meta device, without memory or init
+
+    Buffers are still created normally, so values the model computes at
+    construction (e.g. position ids) stay real. Parameters are expected to
+    be replaced with load_state_dict(..., assign=True).
+
+    Usage:
+        with empty_parameters():
+            model = AutoModelForSequenceClassification.from_config(config)
+    """
+    register_parameter = torch.nn.Module.register_parameter
+
+    def register_on_meta(module, name, param):
+        if param is not None and param.device.type != "meta":
+            param = torch.nn.Parameter(param.to("meta"), requires_grad=param.requires_grad)
+        register_parameter(module, name, param)
+
+    torch.nn.Module.register_parameter = register_on_meta
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register_parameter
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch or pin the configured model artifact")
+    parser.add_argument("--pin", nargs="?", const="main", metavar="REF",
+                        help="Resolve a branch or tag (default main) and print the settings that pin it")
+    args = parser.parse_args()
+
+    if args.pin:
+        pinned = pin_model(MODEL_NAME, args.pin)
+        print(f'MODEL_REVISION = "{pinned["revision"]}"')
+        print(f'MODEL_SHA256 = "{pinned["sha256"]}"')
+    else:
+        path = fetch_model()
+        print(f"Fetched {MODEL_NAME}@{MODEL_REVISION} into {path}")
@@ -0,0 +1,236 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from config.settings import (
+    DEFAULT_THRESHOLD, RESCORE_PAGE_SIZE, RESCORE_MAX_PER_SECOND, RESCORE_STATE_PATH, BATCH_WRITE_SIZE,
+    OFFENDER_INDEX_ENABLED
+)
+from services.database import (
+    MODEL_VERSION, add_offender_changes, get_contents, get_db, notify_write_listeners, offender_write_chunks
+)
+from services.moderation import determine_action
+
+# Fields needed to re-score an analysis and move its offender totals.
+# 'content' is only set on analyses saved before texts were stored by hash.
+RESCORE_FIELDS = [
+    'content_hash', 'content', 'threshold', 'degraded', 'model_version', 'timestamp',
+    'username', 'results', 'action'
+]
+
+class RateLimiter:
+    """
+    Token bucket limiting operations per second
+
+    Args:
+        rate (float): Sustained operations per second
+        burst (float): Bucket size; defaults to one second of operations
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Block until count operations are allowed"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Requests larger than the bucket wait for a full bucket and overdraw it
+                if self._tokens >= min(count, self.capacity):
+                    self._tokens -= count
+                    return
+                time.sleep((min(count, self.capacity) - self._tokens) / self.rate)
+
+def stale_pages(version=MODEL_VERSION, page_size=RESCORE_PAGE_SIZE):
+    """
+    Page through analyses stamped with another model version
+
+    Re-scored analyses leave the result set, so the query itself is the
+    job's progress: an interrupted run resumes where it stopped.
+
+    Args:
+        version (str): Current model version
+        page_size (int): Analyses per request
+
+    Yields:
+        list: Snapshots of one page
+    """
+    query = (
+        get_db().collection('analyses')
+        .where('model_version', '!=', version)
+        .order_by('model_version')
+        .select(RESCORE_FIELDS)
+    )
+    last = None
+    while True:
+        page_query = query if last is None else query.start_after(last)
+        page = list(page_query.limit(page_size).stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def unversioned_pages(page_size=RESCORE_PAGE_SIZE, state_path=RESCORE_STATE_PATH):
+    """
+    Page through analyses saved before model versions were stamped
+
+    Firestore cannot query for a missing field, so this scans the collection
+    in timestamp order, once. The position is checkpointed to state_path
+    after every page so an interrupted scan resumes.
+
+    Args:
+        page_size (int): Analyses read per request
+        state_path (str): Checkpoint file
+
+    Yields:
+        list: Snapshots of the unversioned analyses of one page
+    """
+    query = get_db().collection('analyses').order_by('timestamp').select(RESCORE_FIELDS)
+    position = _load_checkpoint(state_path)
+    while True:
+        page_query = query if position is None else query.where('timestamp', '>', position)
+        page = list(page_query.limit(page_size).stream())
+        # Firestore's snapshot.get raises on missing fields, so read the dicts
+        unversioned = [snapshot for snapshot in page if snapshot.to_dict().get('model_version') is None]
+        if unversioned:
+            yield unversioned
+        if page:
+            position = page[-1].to_dict()['timestamp']
+            _save_checkpoint(state_path, position)
+        if len(page) < page_size:
+            return
+
+def _load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return datetime.datetime.fromisoformat(json.load(f)['position'])
+    except FileNotFoundError:
+        return None
+
+def _save_checkpoint(path, position):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pending = f"{path}.tmp"
+    with open(pending, "w") as f:
+        json.dump({'position': position.isoformat()}, f)
+    os.replace(pending, path)
+
+def rescore_page(snapshots, predict_batch, version=MODEL_VERSION, batch_size=BATCH_WRITE_SIZE):
+    """
+    Re-score one page of analyses and write the results back in batches
+
+    Each batch also moves the authors' offender totals to the new actions
+    and scores, so the index stays in step with the analyses.
+
+    Args:
+        snapshots (list): Analysis snapshots with RESCORE_FIELDS
+        predict_batch: Callable scoring a list of texts
+        version (str): Model version to stamp
+        batch_size (int): Writes per batch (Firestore allows 500)
+
+    Returns:
+        tuple: (analyses updated, analyses skipped because their text is gone)
+    """
+    analyses = [(snapshot, snapshot.to_dict()) for snapshot in snapshots]
+    texts = get_contents(data['content_hash'] for _, data in analyses if data.get('content_hash'))
+    scorable = []
+    for snapshot, data in analyses:
+        # Analyses saved before texts were stored by hash carry the text inline
+        text = texts.get(data.get('content_hash'), data.get('content'))
+        if text is not None:
+            scorable.append((snapshot, data, text))
+    if not scorable:
+        return 0, len(snapshots)
+
+    # Each distinct text is scored once
+    distinct = list({text: None for _, _, text in scorable})
+    scores = dict(zip(distinct, predict_batch(distinct)))
+
+    updates = []
+    for snapshot, data, text in scorable:
+        results = scores[text]
+        threshold = data.get('threshold')
+        action, _ = determine_action(results, DEFAULT_THRESHOLD if threshold is None else threshold)
+        update = {'results': results, 'action': action, 'model_version': version}
+        if data.get('degraded'):
+            update['degraded'] = False
+        updates.append((snapshot.reference, data, update))
+
+    db = get_db()
+    for chunk in offender_write_chunks(updates, batch_size):
+        batch = db.batch()
+        for ref, _, update in chunk:
+            batch.update(ref, update)
+        if OFFENDER_INDEX_ENABLED:
+            add_offender_changes(batch, [(data, dict(data, **update)) for _, data, update in chunk], db)
+        batch.commit()
+    return len(scorable), len(snapshots) - len(scorable)
+
+def run_rescore(predict_batch, version=MODEL_VERSION, page_size=RESCORE_PAGE_SIZE,
+                max_per_second=RESCORE_MAX_PER_SECOND, unversioned=False, state_path=RESCORE_STATE_PATH):
+    """
+    Re-score every analysis not produced by the current model version
+
+    Args:
+        predict_batch: Callable scoring a list of texts, e.g.
+            lambda texts: predict_toxicity_batch(model, tokenizer, texts)
+        version (str): Current model version
+        page_size (int): Analyses per page and write batch (at most 500)
+        max_per_second (float): Analyses processed per second, bounding the
+            reads and writes taken from the live Firestore quota
+        unversioned (bool): Also scan for analyses saved without a version
+        state_path (str): Checkpoint file of the unversioned scan
+
+    Returns:
+        dict: updated, skipped and analyses_per_second
+    """
+    limiter = RateLimiter(max_per_second)
+    updated = skipped = 0
+    start = time.perf_counter()
+
+    sources = [stale_pages(version, page_size)]
+    if unversioned:
+        sources.append(unversioned_pages(page_size, state_path))
+    for pages in sources:
+        for page in pages:
+            limiter.acquire(len(page))
+            page_updated, page_skipped = rescore_page(page, predict_batch, version)
+            updated += page_updated
+            skipped += page_skipped
+    if updated:
+        notify_write_listeners()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'version': version,
+        'updated': updated,
+        'skipped': skipped,
+        'analyses_per_second': updated / elapsed if elapsed else 0.0
+    }
+
+if __name__ == "__main__":
+    from models.scheduler import BULK, get_scheduler
+    from models.toxicity import load_model_artifacts
+
+    parser = argparse.ArgumentParser(description="Re-score analyses produced by other model versions")
+    parser.add_argument("--page-size", type=int, default=RESCORE_PAGE_SIZE)
+    parser.add_argument("--max-per-second", type=float, default=RESCORE_MAX_PER_SECOND)
+    parser.add_argument("--unversioned", action="store_true",
+                        help="Also scan for analyses saved before versions were stamped")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model_artifacts()
+    scheduler = get_scheduler(model, tokenizer)
+    report = run_rescore(
+        lambda texts: scheduler.score_batch(texts, BULK),
+        page_size=args.page_size, max_per_second=args.max_per_second, unversioned=args.unversioned
+    )
+    print(json.dumps(report, indent=2))
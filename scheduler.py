@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from config.settings import SCHEDULER_WEIGHTS, SCHEDULER_MAX_BATCH
+from services.metrics import StageHistogram, add_gauge, register_histogram
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+class _Request:
+    __slots__ = ("text", "future", "enqueued")
+
+    def __init__(self, text):
+        self.text = text
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+class _PriorityClass:
+    """Queue, fair-share state and metrics of one priority class"""
+
+    def __init__(self, name, weight, max_batch):
+        self.name = name
+        self.weight = weight
+        self.max_batch = max_batch
+        self.queue = deque()
+        self.virtual_time = 0.0
+        self.completed = 0
+        self.wait = StageHistogram()
+        self.latency = StageHistogram()
+
+class InferenceScheduler:
+    """
+    Weighted fair queuing in front of a batch scoring function
+
+    Every priority class has its own queue. The worker serves the non-empty
+    class with the smallest virtual time, as one micro-batch of at most that
+    class's max batch size, then advances the class's virtual time by
+    items / weight. Interactive requests therefore wait for at most one
+    in-progress bulk micro-batch, while bulk traffic still uses every idle
+    cycle.
+
+    Args:
+        predict_batch: Callable scoring a list of texts, e.g.
+            lambda texts: predict_toxicity_batch(model, tokenizer, texts)
+        weights (dict): Class name -> share weight
+        max_batch (dict): Class name -> micro-batch size
+    """
+
+    def __init__(self, predict_batch, weights=SCHEDULER_WEIGHTS, max_batch=SCHEDULER_MAX_BATCH):
+        self.predict_batch = predict_batch
+        self.classes = {
+            name: _PriorityClass(name, weight, max_batch.get(name, 1))
+            for name, weight in weights.items()
+        }
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, text, priority=INTERACTIVE):
+        """
+        Queue a text for scoring
+
+        Args:
+            text (str): Text to score
+            priority (str): Priority class name
+
+        Returns:
+            Future: Resolves to the text's score dict
+        """
+        request = _Request(text)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Scheduler is stopped")
+            cls = self.classes[priority]
+            if not cls.queue:
+                # A class returning from idle must not spend credit it banked while idle
+                active = [c.virtual_time for c in self.classes.values() if c.queue]
+                cls.virtual_time = max(cls.virtual_time, min(active, default=cls.virtual_time))
+            cls.queue.append(request)
+            self._condition.notify()
+        return request.future
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._stopped and not any(c.queue for c in self.classes.values()):
+                self._condition.wait()
+            if self._stopped:
+                return None, []
+            cls = min((c for c in self.classes.values() if c.queue), key=lambda c: c.virtual_time)
+            batch = [cls.queue.popleft() for _ in range(min(cls.max_batch, len(cls.queue)))]
+            cls.virtual_time += len(batch) / cls.weight
+            return cls, batch
+
+    def _run(self):
+        while True:
+            cls, batch = self._next_batch()
+            if cls is None:
+                return
+            # Requests cancelled while queued (e.g. shed by admission control) are skipped
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for request in batch:
+                cls.wait.observe(started - request.enqueued)
+            try:
+                results = self.predict_batch([request.text for request in batch])
+            except Exception as error:
+                for request in batch:
+                    request.future.set_exception(error)
+                continue
+            finished = time.perf_counter()
+            for request, result in zip(batch, results):
+                cls.latency.observe(finished - request.enqueued)
+                request.future.set_result(result)
+            cls.completed += len(batch)
+
+    def cancel(self, future):
+        """
+        Cancel a queued request and take it out of its class's queue
+
+        Args:
+            future (Future): Future returned by submit
+
+        Returns:
+            bool: False if the request is already being scored or done
+        """
+        with self._condition:
+            if not future.cancel():
+                return False
+            for cls in self.classes.values():
+                for request in cls.queue:
+                    if request.future is future:
+                        cls.queue.remove(request)
+                        return True
+        return True
+
+    def queue_depth(self, priority):
+        """
+        Number of requests waiting in one class's queue
+
+        Cheap enough for every request: no lock, since len() of a deque is
+        atomic, and no percentiles.
+
+        Args:
+            priority (str): Priority class name
+
+        Returns:
+            int: Queued requests
+        """
+        return len(self.classes[priority].queue)
+
+    def score_batch(self, texts, priority=BULK):
+        """
+        Score texts through the scheduler and wait for all of them
+
+        For batch producers (the queue worker, the re-scoring job), so their
+        items share the model with interactive traffic at bulk priority.
+
+        Args:
+            texts (list): Texts to score
+            priority (str): Priority class name
+
+        Returns:
+            list: Score dicts in input order
+        """
+        futures = [self.submit(text, priority) for text in texts]
+        return [future.result() for future in futures]
+
+    def export_metrics(self):
+        """
+        Publish per-class queue depth and wait/latency histograms on /metrics
+
+        As toxicity_scheduler_queue_depth, toxicity_scheduler_wait_seconds
+        and toxicity_scheduler_latency_seconds, labeled by class.
+        """
+        for name, cls in self.classes.items():
+            labels = {'class': name}
+            add_gauge("scheduler_queue_depth", lambda name=name: self.queue_depth(name), labels)
+            register_histogram("scheduler_wait_seconds", cls.wait, labels)
+            register_histogram("scheduler_latency_seconds", cls.latency, labels)
+
+    def stats(self):
+        """
+        Per-class queue depth, throughput and latency
+
+        Returns:
+            dict: Class name -> depth, completed, wait/latency p50 and p99 in ms
+        """
+        def ms(value):
+            return value * 1000 if value is not None else None
+
+        with self._condition:
+            depths = {name: len(cls.queue) for name, cls in self.classes.items()}
+        return {
+            name: {
+                'queue_depth': depths[name],
+                'completed': cls.completed,
+                'wait_p50_ms': ms(cls.wait.percentile(50)),
+                'wait_p99_ms': ms(cls.wait.percentile(99)),
+                'latency_p50_ms': ms(cls.latency.percentile(50)),
+                'latency_p99_ms': ms(cls.latency.percentile(99))
+            }
+            for name, cls in self.classes.items()
+        }
+
+    def stop(self):
+        """Stop the worker; queued requests are cancelled"""
+        with self._condition:
+            self._stopped = True
+            for cls in self.classes.values():
+                while cls.queue:
+                    cls.queue.popleft().future.cancel()
+            self._condition.notify_all()
+        self._worker.join()
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def get_scheduler(model, tokenizer):
+    """
+    Get the process-wide scheduler for a model, creating it on first use
+
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+
+    Returns:
+        InferenceScheduler: Scheduler shared by all sessions and jobs
+    """
+    from models.toxicity import predict_toxicity_batch
+
+    with _shared_lock:
+        if id(model) not in _shared:
+            _shared[id(model)] = InferenceScheduler(
+                lambda texts: predict_toxicity_batch(model, tokenizer, texts)
+            )
+            _shared[id(model)].export_metrics()
+        return _shared[id(model)]
+
+def mixed_load_benchmark(bulk_items=2000, interactive_interval=0.05, per_batch=0.004, per_item=0.002):
+    """
+    Interactive latency and bulk throughput under a simulated mixed load
+
+    A bulk producer enqueues a backfill up front while interactive requests
+    arrive at a steady rate. A sleep-based stand-in model costs per_batch +
+    per_item * n seconds, so the scheduling policy is measured in isolation.
+    The baseline serves everything from one FIFO queue.
+
+    Returns:
+        dict: Per-policy interactive p50/p99 and bulk throughput
+    """
+    def fake_predict(texts):
+        time.sleep(per_batch + per_item * len(texts))
+        return [{'toxic': 0.0} for _ in texts]
+
+    policies = {
+        'fifo': ({'all': 1}, {'all': SCHEDULER_MAX_BATCH[BULK]}, 'all', 'all'),
+        'weighted_fair': (SCHEDULER_WEIGHTS, SCHEDULER_MAX_BATCH, INTERACTIVE, BULK)
+    }
+    report = {}
+    for policy, (weights, max_batch, interactive, bulk) in policies.items():
+        scheduler = InferenceScheduler(fake_predict, weights, max_batch)
+        start = time.perf_counter()
+        bulk_futures = [scheduler.submit(f"bulk {i}", bulk) for i in range(bulk_items)]
+        latencies = []
+        while not all(future.done() for future in bulk_futures):
+            sent = time.perf_counter()
+            scheduler.submit("interactive", interactive).result()
+            latencies.append((time.perf_counter() - sent) * 1000)
+            time.sleep(interactive_interval)
+        elapsed = time.perf_counter() - start
+        scheduler.stop()
+        latencies.sort()
+        report[policy] = {
+            'interactive_requests': len(latencies),
+            'interactive_p50_ms': latencies[len(latencies) // 2],
+            'interactive_p99_ms': latencies[int(0.99 * (len(latencies) - 1))],
+            'bulk_items_per_s': bulk_items / elapsed
+        }
+    return report
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(mixed_load_benchmark(), indent=2))
@@ -1,9 +1,99 @@
 # Configuration settings
 FIREBASE_CONFIG_PATH = 'firebase_config.json'
 
+# Storage settings
+STORAGE_MAX_CONCURRENCY = 16  # Concurrent Firestore requests in the async storage layer
+STORAGE_MAX_RETRIES = 5
+STORAGE_RETRY_BASE_DELAY = 0.1  # Seconds; doubles per retry, with full jitter
+STORAGE_RETRY_MAX_DELAY = 5.0
+BATCH_WRITE_SIZE = 500  # Firestore's per-batch write limit
+CONTENT_CACHE_SIZE = 100000  # Content hashes remembered as already stored, per process
+
 # Model settings
+# A distilled student (`python -m models.distill`) or pruned checkpoint
+# (`python -m models.pruning`) is served by pointing MODEL_NAME/MODEL_REVISION
+# at its registry entry (e.g. "local/toxic-bert-student", "v1")
 MODEL_NAME = "unitary/toxic-bert"
 
+# Local model registry. Artifacts are fetched once into
+# MODEL_REGISTRY_DIR/<model>/<revision> and loaded from there offline.
+# Hub models are fetched by commit hash only, and every load checks the
+# weights against MODEL_SHA256; until both are set the default branch is
+# fetched once and loaded unverified, with a warning.
+# `python -m models.registry --pin` resolves main to its commit, fetches it
+# and prints both values for review.
+MODEL_REGISTRY_DIR = 'model_registry'
+MODEL_REVISION = None  # Hub commit hash (or the revision of a local registry entry)
+MODEL_SHA256 = None  # sha256 of the artifact's model.safetensors
+
+# Fast path: fused scaled-dot-product attention and length-bucketed batches
+ATTENTION_IMPLEMENTATION = "sdpa"  # Fused attention; "eager" for the reference implementation
+LENGTH_BUCKETING = False  # Pad each length-sorted sub-batch only to its own longest text
+MAX_BATCH_TOKENS = 8192  # Padded tokens per sub-batch when bucketing
+
+# Inference precision: "bfloat16" halves weight memory and uses native bf16
+# on CPUs that have it (AVX512-BF16/AMX); falls back to float32 elsewhere.
+# Validate with `python -m models.precision corpus.txt` before enabling.
+INFERENCE_DTYPE = "float32"
+
+# Warm-up settings: (batch size, sequence length) shapes pushed through the
+# model at load so the first real request doesn't pay for lazy initialization
+MODEL_WARMUP = True
+WARMUP_SHAPES = [(1, 32), (1, 128), (1, 512), (8, 128)]
+
+# Concurrent predict_toxicity calls for the same text (up to whitespace)
+# share a single model invocation
+SINGLE_FLIGHT_ENABLED = True
+
+# Inference scheduler: weighted fair queuing between interactive requests
+# and bulk jobs sharing one model process
+SCHEDULER_ENABLED = False
+SCHEDULER_WEIGHTS = {"interactive": 8, "bulk": 1}
+SCHEDULER_MAX_BATCH = {"interactive": 8, "bulk": 32}  # Bounds how long interactive waits behind bulk
+
+# Load shedding (requires the scheduler): interactive requests that would
+# exceed the queue depth or latency budget get an immediate keyword-filter
+# decision, stored as degraded, and are optionally re-scored later
+ADMISSION_MAX_QUEUE_DEPTH = 64
+ADMISSION_LATENCY_BUDGET = 0.5  # Seconds an interactive request may wait for the model
+ADMISSION_REQUEUE = True  # Re-score degraded requests at bulk priority and update the stored analysis
+ADMISSION_RESCORE_WORKERS = 2  # Threads writing re-scored analyses back to Firestore
+DEGRADED_KEYWORD_SCORE = 0.75  # Fallback toxic/insult score for texts with a banned keyword
+
+# Streaming worker (`python -m services.worker`): consumes comments from a
+# queue, scores them in micro-batches and acknowledges after persisting
+QUEUE_BACKEND = "redis"  # "redis" (Redis Streams) or "memory" (in-process, for tests)
+REDIS_URL = "redis://localhost:6379/0"
+QUEUE_STREAM = "comments"
+QUEUE_GROUP = "moderation"
+QUEUE_CLAIM_IDLE = 60.0  # Seconds before another consumer takes over an unacknowledged message
+WORKER_BATCH_SIZE = 32  # Messages scored per micro-batch
+WORKER_BLOCK_SECONDS = 1.0  # Longest wait for a batch to fill
+WORKER_MAX_IN_FLIGHT = 4  # Scored batches awaiting persistence before consumption pauses
+WORKER_MAX_DELIVERIES = 5  # Deliveries of a failing message before it is dead-lettered
+WORKER_RETRY_BACKOFF = 0.5  # Seconds paused after a failure, doubled per consecutive failure
+WORKER_RETRY_BACKOFF_MAX = 30.0  # Longest pause between retries
+
+# Near-duplicate reuse: a MinHash/LSH index in front of predict_toxicity
+# reuses the scores of previously scored texts that differ by a word,
+# emoji or punctuation
+NEAR_DUP_ENABLED = False
+NEAR_DUP_MODE = "reuse"  # "reuse" returns the neighbour's scores, "flag" only counts matches
+NEAR_DUP_THRESHOLD = 0.8  # Minimum estimated Jaccard similarity of character shingles
+NEAR_DUP_NUM_PERM = 64  # MinHash permutations
+NEAR_DUP_BANDS = 16  # LSH bands (NEAR_DUP_NUM_PERM / bands rows each)
+NEAR_DUP_SHINGLE_SIZE = 5  # Characters per shingle
+NEAR_DUP_MAX_SIZE = 50000  # Indexed texts kept, least recently used evicted first
+
+# Two-stage cascade: a hashed n-gram logistic regression scores every text
+# and only texts whose max category score falls in [CASCADE_LOW, CASCADE_HIGH)
+# are escalated to BERT. Train with `python -m models.cascade corpus.txt`.
+CASCADE_ENABLED = False
+CASCADE_MODEL_PATH = 'model_registry/cascade/first_stage'
+CASCADE_LOW = 0.05
+CASCADE_HIGH = 0.9
+CASCADE_NUM_BUCKETS = 1 << 18
+
 # Toxicity categories
 TOXICITY_CATEGORIES = [
     'toxic', 
@@ -17,8 +107,59 @@ TOXICITY_CATEGORIES = [
 # Banned words for keyword filtering
 BANNED_WORDS = ["idiot", "stupid", "hate", "kill", "damn", "hell"]
 
+# Instrumentation settings
+INSTRUMENTATION_ENABLED = False  # Per-stage timing of tokenize/forward/postprocess/persist
+METRICS_PORT = None  # Port serving /metrics (Prometheus) and /ready, None to disable
+METRICS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+METRICS_RECENT_SAMPLES = 500  # Samples kept per stage for p50/p95 in the debug panel
+
+# Profiling settings
+PROFILING_ENABLED = False  # Opt-in; when off, profiling hooks are a single flag check
+PROFILE_SAMPLE_RATE = 0.01  # Fraction of requests profiled (?profile=1 forces one script run)
+PROFILE_BACKEND = "sampling"  # "sampling" (stack sampler) or "torch" (torch.profiler)
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_DIR = 'profiles'  # Collapsed-stack output, loadable by flamegraph.pl/speedscope
+PROFILE_MAX_FILES = 50  # Oldest profiles are deleted beyond this count
+
+# Dashboard settings
+ANALYTICS_CACHE_TTL = 60  # Seconds dashboard metrics are reused; local writes invalidate them at once
+ANALYTICS_REFRESH_SECONDS = 15  # The analytics panel reruns on its own at this interval
+
+# Warehouse export (`python -m services.export`): date-partitioned Parquet,
+# incremental from the high-water mark saved by the previous run
+EXPORT_DIR = 'exports/analyses'
+EXPORT_STATE_PATH = 'exports/analyses_state.json'
+EXPORT_PAGE_SIZE = 1000  # Documents per Firestore request
+EXPORT_ROW_GROUP_SIZE = 50000  # Rows per Parquet row group
+EXPORT_SAFETY_WINDOW = 600  # Seconds re-read before the high-water mark, for analyses committed late
+
+# Re-scoring (`python -m services.rescore`): analyses are stamped with
+# MODEL_NAME@MODEL_REVISION, and after a model change the stale ones are
+# re-scored in pages at a bounded rate
+RESCORE_PAGE_SIZE = 200  # Analyses per read and per write batch (Firestore allows 500 writes)
+RESCORE_MAX_PER_SECOND = 100  # Keeps the job's reads and writes off the live quota
+RESCORE_STATE_PATH = 'rescore_state.json'  # Checkpoint of the one-off scan for unversioned analyses
+
+# Live mirror: a snapshot listener keeps the latest analyses and running
+# dashboard totals in memory, shared by all sessions in the process
+MIRROR_ENABLED = False
+MIRROR_CAPACITY = 1000  # Latest analyses kept
+MIRROR_MAX_LIVE = 50000  # Analyses tracked by the listener before it is re-anchored
+
+# Offender index: per-username totals of analyses, all-time and per ISO
+# week, kept up to date in the same batch as every analysis write
+OFFENDER_INDEX_ENABLED = True
+OFFENDER_TOP_K = 10  # Usernames listed in the sidebar
+
 # Threshold settings
 DEFAULT_THRESHOLD = 0.5
+FLAG_MARGIN = 0.2  # Scores at or above threshold + FLAG_MARGIN are flagged, below that reviewed
+
+# Threshold calibration (`python -m services.calibration`) against moderator
+# labels stored on analyses
+CALIBRATION_FLAG_PRECISION = 0.95  # Precision required of the recommended FLAG threshold
+CALIBRATION_CACHE_TTL = 600  # Seconds the dashboard reuses the labeled-score curve
+ANALYTICS_CATEGORY_THRESHOLD = 0.5  # Score at which an analysis counts toward a category
 
 # UI Settings
 AVATAR_COLORS = {
@@ -0,0 +1,74 @@
+import threading
+
+class _Call:
+    """One in-flight computation and its outcome"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or exception). Nothing is kept
+    once the call finishes, so this composes with, rather than replaces, a
+    result cache placed inside the function.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, func):
+        """
+        Run func once per concurrent group of callers with the same key
+
+        Args:
+            key: Hashable identity of the computation
+            func: Zero-argument callable
+
+        Returns:
+            The function's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+def text_key(text):
+    """
+    Normalize text for in-flight deduplication
+
+    Only whitespace is collapsed: the tokenizer ignores it, so texts that
+    differ only in spacing produce identical scores.
+    """
+    return " ".join(text.split())
@@ -1,9 +1,9 @@
+import json
 import streamlit as st
+import streamlit.components.v1 as components
 
-def load_css():
-    """Load custom CSS styles for the application"""
-    st.markdown("""
-        <style>
+# Application stylesheet, sent to the browser once per session (see load_css)
+CSS = """
             /* Global Styles */
             @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
             
@@ -330,5 +330,32 @@ def load_css():
                 transform: translateY(0) !important;
                 box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2) !important;
             }
-        </style>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+"""
+
+# Copies the stylesheet into the app document, where it outlives the
+# element that delivered it; reruns don't resend it
+_INJECT_TEMPLATE = """
+<script>
+const doc = window.parent.document;
+if (!doc.getElementById("toxicity-analyzer-css")) {{
+    const style = doc.createElement("style");
+    style.id = "toxicity-analyzer-css";
+    style.textContent = {css};
+    doc.head.appendChild(style);
+}}
+</script>
+"""
+
+def load_css():
+    """
+    Load custom CSS styles for the application
+    
+    Streamlit drops any element a rerun doesn't emit again, so a <style>
+    element would have to be re-sent (~11KB) on every interaction. Instead
+    the stylesheet is injected into the page head on the first run of each
+    browser session.
+    """
+    if st.session_state.get("css_loaded"):
+        return
+    components.html(_INJECT_TEMPLATE.format(css=json.dumps(CSS)), height=0)
+    st.session_state["css_loaded"] = True
\ No newline at end of file
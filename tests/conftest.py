@@ -0,0 +1,13 @@
+import time
+import pytest
+
+def _wait_until(condition, timeout=5):
+    """Poll condition until it holds, failing the test after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, f"timed out after {timeout}s waiting for {condition}"
+        time.sleep(0.001)
+
+@pytest.fixture
+def wait_until():
+    return _wait_until
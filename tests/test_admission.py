@@ -0,0 +1,180 @@
+import threading
+import pytest
+from models import toxicity
+from models.admission import AdmissionController, overload_simulation, rescore_later
+from models.near_duplicates import NearDuplicateIndex
+from models.scheduler import BULK, INTERACTIVE, InferenceScheduler
+from models.single_flight import SingleFlight
+from services import database
+from services.database import KEYWORD_FILTER_VERSION, MODEL_VERSION, save_analysis_to_firestore
+from services.fake_firestore import FakeClient
+
+FALLBACK = {'toxic': 0.0}
+SCORES = {'toxic': 0.9}
+THRESHOLD = 0.5
+
+class GatedModel:
+    """Stand-in batch scorer that records its inputs and blocks until released"""
+
+    def __init__(self):
+        self.texts = []
+        self.release = threading.Event()
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        self.release.wait(5)
+        return [dict(SCORES) for _ in texts]
+
+@pytest.fixture
+def model():
+    return GatedModel()
+
+@pytest.fixture
+def scheduler(model):
+    scheduler = InferenceScheduler(model, {INTERACTIVE: 1, BULK: 1}, {INTERACTIVE: 1, BULK: 1})
+    yield scheduler
+    model.release.set()
+    scheduler.stop()
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    database.set_client(client)
+    yield client
+    database.set_client(None)
+
+def occupy_worker(scheduler, model, wait_until):
+    """Put the scheduler's worker inside a model batch so new requests wait"""
+    scheduler.submit("busy", BULK)
+    wait_until(lambda: model.texts == ["busy"])
+
+def stored(client, analysis_id):
+    return client.collection('analyses').document(analysis_id).get().to_dict()
+
+def test_timed_out_request_moves_to_bulk_and_updates_degraded_analysis(scheduler, model, client, wait_until):
+    controller = AdmissionController(scheduler, lambda text: FALLBACK, 16, 0.05, requeue=True)
+    occupy_worker(scheduler, model, wait_until)
+
+    result = controller.score("you are an idiot")
+
+    assert result.degraded and result.results == FALLBACK
+    assert controller.timed_out == 1
+    # Shed from the interactive queue, waiting at bulk priority instead
+    assert scheduler.queue_depth(INTERACTIVE) == 0
+    assert scheduler.queue_depth(BULK) == 1
+
+    analysis_id = save_analysis_to_firestore(
+        "alice", "you are an idiot", result.results, "ALLOW", degraded=True, threshold=THRESHOLD
+    )
+    assert stored(client, analysis_id)['model_version'] == KEYWORD_FILTER_VERSION
+    rescore_later(result.pending, analysis_id, THRESHOLD)
+    model.release.set()
+
+    wait_until(lambda: not stored(client, analysis_id)['degraded'])
+    analysis = stored(client, analysis_id)
+    assert analysis['results'] == SCORES
+    assert analysis['action'] == "FLAG"
+    assert analysis['model_version'] == MODEL_VERSION
+    # The cancelled interactive request never reached the model
+    assert model.texts == ["busy", "you are an idiot"]
+
+def test_rejected_request_is_rescored_at_bulk(scheduler, model, client, wait_until):
+    controller = AdmissionController(scheduler, lambda text: FALLBACK, 0, 0.05, requeue=True)
+
+    result = controller.score("you are an idiot")
+
+    assert result.degraded and controller.rejected == 1
+    analysis_id = save_analysis_to_firestore(
+        "alice", "you are an idiot", result.results, "ALLOW", degraded=True, threshold=THRESHOLD
+    )
+    rescore_later(result.pending, analysis_id, THRESHOLD)
+    model.release.set()
+
+    wait_until(lambda: not stored(client, analysis_id)['degraded'])
+    assert stored(client, analysis_id)['results'] == SCORES
+
+def test_without_requeue_timed_out_request_is_dropped(scheduler, model, wait_until):
+    controller = AdmissionController(scheduler, lambda text: FALLBACK, 16, 0.05, requeue=False)
+    occupy_worker(scheduler, model, wait_until)
+
+    result = controller.score("you are an idiot")
+
+    assert result.degraded and result.pending is None
+    assert scheduler.queue_depth(INTERACTIVE) == 0
+    assert scheduler.queue_depth(BULK) == 0
+    model.release.set()
+    scheduler.submit("after", BULK).result(5)
+    assert model.texts == ["busy", "after"]
+
+def test_rescore_write_runs_off_the_scheduler_thread(scheduler, model, monkeypatch):
+    threads = []
+    written = threading.Event()
+
+    def update(analysis_id, results, action):
+        threads.append(threading.current_thread())
+        written.set()
+
+    monkeypatch.setattr(database, "update_analysis_results", update)
+    model.release.set()
+
+    rescore_later(scheduler.submit("you are an idiot", BULK), "analysis-1", THRESHOLD)
+
+    assert written.wait(5)
+    assert threads[0] is not scheduler._worker
+    assert threads[0].name.startswith("rescore")
+
+def test_latency_stays_bounded_under_overload():
+    report = overload_simulation(requests=60, latency_budget=0.1)
+
+    assert report['bounded'], report
+    assert report['full_scores'] > 0
+    assert report['degraded_share'] > 0
+
+@pytest.fixture
+def dedup_layers(monkeypatch):
+    monkeypatch.setattr(toxicity, "single_flight", SingleFlight())
+    monkeypatch.setattr(toxicity, "near_duplicate_index", NearDuplicateIndex(mode="reuse"))
+
+def admit_concurrently(texts, controller, wait_until):
+    results = [None] * len(texts)
+
+    def call(i):
+        results[i] = toxicity.predict_toxicity_admitted(None, None, texts[i], controller)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: toxicity.single_flight.shared == len(texts) - 1)
+    return threads, results
+
+def test_admission_path_shares_identical_requests_and_reuses_near_duplicates(
+        scheduler, model, dedup_layers, wait_until):
+    controller = AdmissionController(scheduler, lambda text: FALLBACK, 16, 5, requeue=True)
+    text = "you are an idiot and everyone knows it"
+
+    threads, results = admit_concurrently([text] * 8, controller, wait_until)
+    model.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert model.texts == [text]
+    assert all(result.results == SCORES and not result.degraded for result in results)
+    assert len({id(result.results) for result in results}) == len(results)
+    # A later near-duplicate is answered by the index without the scheduler
+    reused = toxicity.predict_toxicity_admitted(None, None, text + "!!! 🔥", controller)
+    assert reused.results == SCORES and not reused.degraded
+    assert model.texts == [text] and controller.admitted == 1
+
+def test_admission_path_does_not_index_degraded_scores(scheduler, model, dedup_layers, wait_until):
+    controller = AdmissionController(scheduler, lambda text: FALLBACK, 16, 0.05, requeue=True)
+    occupy_worker(scheduler, model, wait_until)
+    text = "you are an idiot and everyone knows it"
+
+    shed = toxicity.predict_toxicity_admitted(None, None, text, controller)
+
+    assert shed.degraded and shed.results == FALLBACK and shed.pending is not None
+    assert len(toxicity.near_duplicate_index) == 0
+    model.release.set()
+    assert shed.pending.result(5) == SCORES
+    later = toxicity.predict_toxicity_admitted(None, None, text, controller)
+    assert later.results == SCORES and not later.degraded
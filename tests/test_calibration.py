@@ -0,0 +1,81 @@
+from collections import OrderedDict
+import numpy as np
+import pytest
+from config.settings import TOXICITY_CATEGORIES
+from services import database
+from services.calibration import calibrate, load_labeled_scores, overall_curve, rates_at, recommend, sweep
+from services.database import label_analysis, save_analysis_to_firestore
+from services.fake_firestore import FakeClient
+
+# Sorted: 0.9 toxic, 0.8 toxic, 0.8 clean (tied), 0.4 toxic, 0.2 clean
+SCORES = np.array([0.8, 0.2, 0.9, 0.4, 0.8])
+LABELS = np.array([True, False, True, True, False])
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    database.set_client(client)
+    monkeypatch.setattr(database, "_known_contents", OrderedDict())
+    yield client
+    database.set_client(None)
+
+def brute_force(threshold):
+    predicted = SCORES >= threshold
+    tp = int((predicted & LABELS).sum())
+    fp = int((predicted & ~LABELS).sum())
+    return {
+        'precision': tp / (tp + fp) if tp + fp else 1.0,
+        'recall': tp / LABELS.sum(),
+        'fpr': fp / (~LABELS).sum()
+    }
+
+def test_sweep_cuts_once_per_distinct_score():
+    curve = sweep(SCORES, LABELS)
+
+    assert curve['thresholds'].tolist() == [0.9, 0.8, 0.4, 0.2]
+    assert curve['tp'].tolist() == [1, 2, 3, 3]
+    assert curve['fp'].tolist() == [0, 1, 1, 2]
+    assert (curve['positives'], curve['negatives']) == (3, 2)
+    for index, threshold in enumerate(curve['thresholds']):
+        expected = brute_force(threshold)
+        assert curve['precision'][index] == pytest.approx(expected['precision'])
+        assert curve['recall'][index] == pytest.approx(expected['recall'])
+        assert curve['fpr'][index] == pytest.approx(expected['fpr'])
+
+@pytest.mark.parametrize("threshold", [0.95, 0.9, 0.85, 0.8, 0.5, 0.4, 0.3, 0.2, 0.0])
+def test_rates_at_matches_brute_force(threshold):
+    assert rates_at(sweep(SCORES, LABELS), threshold) == pytest.approx(brute_force(threshold))
+
+def test_rates_at_without_labels():
+    curve = sweep(np.array([]), np.array([], dtype=bool))
+
+    assert rates_at(curve, 0.5) == {'precision': None, 'recall': None, 'fpr': None}
+
+def test_recommend_best_f1_and_precision_target():
+    curve = sweep(SCORES, LABELS)
+
+    assert recommend(curve)['threshold'] == 0.4
+    # The lowest threshold still reaching the precision
+    assert recommend(curve, min_precision=0.7)['threshold'] == 0.4
+    assert recommend(curve, min_precision=0.9)['threshold'] == 0.9
+    assert recommend(curve, min_precision=1.1) is None
+
+def test_calibration_reads_only_labeled_analyses(client):
+    for toxic, labeled in zip(SCORES, LABELS):
+        analysis_id = save_analysis_to_firestore("alice", f"text {toxic}", {'toxic': float(toxic)}, "ALLOW")
+        label_analysis(analysis_id, {'toxic': bool(labeled)})
+    save_analysis_to_firestore("bob", "never reviewed", {'toxic': 0.99}, "FLAG")
+
+    scores, labels = load_labeled_scores(page_size=2)
+
+    assert scores.shape == labels.shape == (len(SCORES), len(TOXICITY_CATEGORIES))
+    column = TOXICITY_CATEGORIES.index('toxic')
+    assert sorted(scores[:, column].tolist()) == sorted(SCORES.tolist())
+    assert labels[:, column].sum() == LABELS.sum()
+    curve = overall_curve(scores, labels)
+    assert rates_at(curve, 0.5) == pytest.approx(brute_force(0.5))
+    report = calibrate(scores, labels, flag_precision=0.9, threshold=0.5)
+    assert report['labeled'] == len(SCORES)
+    assert report['review_threshold']['threshold'] == 0.4
+    assert report['flag_threshold']['threshold'] == 0.9
+    assert report['flag_margin'] == pytest.approx(0.5)
@@ -0,0 +1,66 @@
+import asyncio
+from collections import OrderedDict
+import pytest
+from services import async_database, database
+from services.async_database import save_many
+from services.database import (
+    CONTENTS_COLLECTION, content_hash, get_contents, save_analyses_to_firestore, save_analysis_to_firestore
+)
+from services.fake_firestore import AsyncFakeClient, FakeClient
+
+RESULTS = {'toxic': 0.9}
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    database.set_client(client)
+    async_database.set_async_client(AsyncFakeClient(client))
+    monkeypatch.setattr(database, "_known_contents", OrderedDict())
+    yield client
+    database.set_client(None)
+    async_database.set_async_client(None)
+
+def contents(client):
+    return {snapshot.id: snapshot.to_dict() for snapshot in client.collection(CONTENTS_COLLECTION).stream()}
+
+def analyses(client):
+    return [snapshot.to_dict() for snapshot in client.collection('analyses').stream()]
+
+def analysis(username, content):
+    return {'username': username, 'content': content, 'results': RESULTS, 'action': "FLAG"}
+
+def test_saved_text_is_stored_once_by_hash(client):
+    save_analysis_to_firestore("alice", "you idiot", RESULTS, "FLAG")
+    stored = contents(client)[content_hash("you idiot")]
+    save_analysis_to_firestore("bob", "you idiot", RESULTS, "FLAG")
+
+    # The second save knows the text and leaves its document untouched
+    assert contents(client) == {content_hash("you idiot"): stored}
+    assert stored['content'] == "you idiot"
+    saved = analyses(client)
+    assert len(saved) == 2
+    assert all(entry['content_hash'] == content_hash("you idiot") and 'content' not in entry for entry in saved)
+    assert get_contents([content_hash("you idiot"), "missing"]) == {content_hash("you idiot"): "you idiot"}
+
+def test_batch_saves_write_each_distinct_text_once(client, monkeypatch):
+    save_analysis_to_firestore("alice", "you idiot", RESULTS, "FLAG")
+    collection = client.collection(CONTENTS_COLLECTION)
+    written = []
+    write = collection._write
+
+    def counting_write(doc_id, *args, **kwargs):
+        written.append(doc_id)
+        return write(doc_id, *args, **kwargs)
+
+    monkeypatch.setattr(collection, "_write", counting_write)
+
+    save_analyses_to_firestore([
+        analysis("bob", "you idiot"), analysis("carol", "go away"), analysis("dave", "go away")
+    ])
+    asyncio.run(save_many([
+        analysis("erin", "go away"), analysis("frank", "meh"), analysis("grace", "meh")
+    ]))
+
+    assert sorted(written) == sorted([content_hash("go away"), content_hash("meh")])
+    assert set(contents(client)) == {content_hash(text) for text in ("you idiot", "go away", "meh")}
+    assert len(analyses(client)) == 7
@@ -0,0 +1,73 @@
+import datetime
+import os
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from services import database
+from services.export import export_analyses, load_export_state, save_export_state
+from services.fake_firestore import FakeClient
+
+START = datetime.datetime(2026, 10, 18, 23, 59, 50, tzinfo=datetime.timezone.utc)
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    database.set_client(client)
+    yield client
+    database.set_client(None)
+
+def store(client, doc_id, seconds):
+    client.collection('analyses').document(doc_id).set({
+        'username': "alice",
+        'results': {'toxic': 0.5},
+        'action': "REVIEW",
+        'timestamp': START + datetime.timedelta(seconds=seconds)
+    })
+
+def exported_ids(files):
+    return [row for path in files for row in pq.read_table(path).column('id').to_pylist()]
+
+def test_incremental_export_resumes_from_high_water_mark_without_duplicates(client, tmp_path):
+    out_dir = str(tmp_path / "dataset")
+    state_path = str(tmp_path / "state.json")
+    for doc_id, seconds in [("a", 0), ("b", 1), ("c", 2)]:
+        store(client, doc_id, seconds)
+
+    first = export_analyses(out_dir, page_size=2, safety_window=5)
+    save_export_state(first['high_water_mark'], first['recent_ids'], state_path)
+
+    assert first['rows'] == 3
+    assert sorted(exported_ids(first['files'])) == ["a", "b", "c"]
+    assert first['high_water_mark'] == START + datetime.timedelta(seconds=2)
+
+    # Committed after the first export: one stamped before the high-water
+    # mark, one tying it, and one on the next day
+    store(client, "late", 1.5)
+    store(client, "tie", 2)
+    store(client, "next-day", 20)
+    since, recent_ids = load_export_state(state_path)
+    assert (since, recent_ids) == (first['high_water_mark'], {"a", "b", "c"})
+
+    second = export_analyses(out_dir, since, recent_ids, page_size=2, safety_window=5)
+
+    assert second['rows'] == 3
+    assert sorted(exported_ids(second['files'])) == ["late", "next-day", "tie"]
+    assert sorted(os.path.basename(os.path.dirname(path)) for path in second['files']) == [
+        "date=2026-10-18", "date=2026-10-19"
+    ]
+    assert second['high_water_mark'] == START + datetime.timedelta(seconds=20)
+    # Only ids within the window before the new mark are kept for the next run
+    assert second['recent_ids'] == {"next-day"}
+
+    everything = [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(out_dir) for name in names
+    ]
+    assert not any(os.path.basename(path).startswith(".") for path in everything)
+    assert sorted(exported_ids(everything)) == ["a", "b", "c", "late", "next-day", "tie"]
+
+def test_export_of_empty_window_keeps_no_mark(client, tmp_path):
+    report = export_analyses(str(tmp_path / "dataset"), safety_window=5)
+
+    assert report == {'rows': 0, 'files': [], 'high_water_mark': None, 'recent_ids': set()}
@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+from services import database
+from services.fake_firestore import FakeClient
+from services.message_queue import InMemoryQueue
+from services.worker import ModerationWorker
+
+CLAIM_IDLE = 0.05
+
+@pytest.fixture
+def queue():
+    return InMemoryQueue(claim_idle=CLAIM_IDLE)
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    database.set_client(client)
+    yield client
+    database.set_client(None)
+
+def test_acknowledged_message_is_not_delivered_again(queue):
+    queue.publish("alice", "hello")
+    [message] = queue.receive(10, 0)
+    queue.ack([message.id])
+    time.sleep(CLAIM_IDLE * 2)
+
+    assert queue.receive(10, 0) == []
+    assert queue.lag() == 0
+
+def test_unacknowledged_message_is_redelivered_after_claim_idle(queue):
+    message_id = queue.publish("alice", "hello")
+    [first] = queue.receive(10, 0)
+    assert first.deliveries == 1
+
+    # Still pending with its consumer until it has been idle for claim_idle
+    assert queue.receive(10, 0) == []
+    time.sleep(CLAIM_IDLE * 2)
+
+    [second] = queue.receive(10, 0)
+    assert second.id == message_id and second.content == "hello"
+    assert second.deliveries == 2
+    assert queue.lag() == 1
+
+def test_failing_message_is_dead_lettered_after_max_deliveries(queue, client):
+    queue.publish("mallory", "bad")
+    good_id = queue.publish("alice", "good")
+
+    def predict_batch(texts):
+        if "bad" in texts:
+            raise ValueError("unscoreable")
+        return [{'toxic': 0.1} for _ in texts]
+
+    worker = ModerationWorker(queue, predict_batch, 0.5, batch_size=2, block_seconds=0.01,
+                              max_deliveries=3, retry_backoff=0.001)
+    dead_letter = queue.dead_letter
+
+    def dead_letter_and_stop(messages, reason):
+        dead_letter(messages, reason)
+        worker.stop()
+
+    queue.dead_letter = dead_letter_and_stop
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    [(message, reason)] = queue.dead
+    assert message.content == "bad" and message.deliveries == 3
+    assert "unscoreable" in reason
+    # The good message in the failing batch was scored on its own and stored
+    stored = client.collection('analyses').document(f"{queue.name}-{good_id}").get()
+    assert stored.to_dict()['action'] == "ALLOW"
+    assert queue.lag() == 0
+    assert worker.stats()['dead_lettered'] == 1
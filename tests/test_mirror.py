@@ -0,0 +1,61 @@
+from collections import OrderedDict
+import pytest
+from config.settings import TOXICITY_CATEGORIES
+from services import database
+from services.analytics import aggregate_analytics
+from services.database import save_analyses_to_firestore, save_analysis_to_firestore, update_analysis_results
+from services.fake_firestore import FakeClient
+from services.mirror import AnalysesMirror
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    database.set_client(client)
+    monkeypatch.setattr(database, "_known_contents", OrderedDict())
+    yield client
+    database.set_client(None)
+
+@pytest.fixture
+def mirror(client):
+    mirror = AnalysesMirror(capacity=3)
+    yield mirror
+    mirror.stop()
+
+def scores(toxic, insult=0.0):
+    # Exact binary fractions, so running sums match a fresh aggregation
+    return dict({category: 0.0 for category in TOXICITY_CATEGORIES}, toxic=toxic, insult=insult)
+
+def analysis(username, content, toxic, action, insult=0.0):
+    return {'username': username, 'content': content, 'results': scores(toxic, insult), 'action': action}
+
+def test_mirror_matches_aggregation_through_writes_deletes_and_rescores(client, mirror):
+    # Written before the anchor, counted by the seed aggregation
+    save_analysis_to_firestore("alice", "you idiot", scores(0.75, 0.5), "FLAG")
+    save_analysis_to_firestore("bob", "nice post", scores(0.125), "ALLOW")
+    mirror.start()
+    collection = client.collection('analyses')
+    assert mirror.analytics() == aggregate_analytics(collection)
+
+    new = save_analysis_to_firestore("carol", "go away", scores(0.5), "REVIEW")
+    ids = save_analyses_to_firestore([
+        analysis("dave", "hello", 0.0, "ALLOW"),
+        analysis("erin", "you idiot", 0.75, "FLAG", insult=0.625),
+        analysis("frank", "meh", 0.25, "ALLOW")
+    ])
+    assert mirror.analytics() == aggregate_analytics(collection)
+
+    # Re-scores of analyses written after the anchor move the live totals
+    update_analysis_results(new, scores(0.875, 0.75), "FLAG")
+    update_analysis_results(ids[1], scores(0.25), "ALLOW")
+    assert mirror.analytics() == aggregate_analytics(collection)
+
+    collection.document(ids[0]).delete()
+    collection.document(new).delete()
+    expected = aggregate_analytics(collection)
+    assert mirror.analytics() == expected
+    assert expected['total_analyzed'] == 4 and expected['total_flagged'] == 1
+
+    # Deleted analyses leave the recent list; older ones were already trimmed
+    recent = mirror.recent(5)
+    assert [entry['id'] for entry in recent] == [ids[2], ids[1]]
+    assert recent[1]['action'] == "ALLOW"
@@ -0,0 +1,35 @@
+from models.near_duplicates import NearDuplicateIndex
+
+def scorer(scores):
+    calls = []
+
+    def compute():
+        calls.append(scores)
+        return dict(scores)
+    return compute, calls
+
+def test_near_duplicate_reuses_scores():
+    index = NearDuplicateIndex(mode="reuse")
+    compute, calls = scorer({'toxic': 0.9})
+    index.score("you are a complete and utter idiot", compute)
+
+    other, other_calls = scorer({'toxic': 0.1})
+    scores = index.score("You are a complete and utter idiot!!! 🔥", other)
+
+    assert scores == {'toxic': 0.9}
+    assert other_calls == []
+    assert (index.hits, index.misses) == (1, 1)
+
+def test_texts_shorter_than_a_shingle_are_neither_indexed_nor_looked_up():
+    index = NearDuplicateIndex(mode="reuse")
+    compute, calls = scorer({'toxic': 0.9})
+    index.score("🔥🔥🔥", compute)
+
+    other, other_calls = scorer({'toxic': 0.1})
+    scores = index.score("😡!!", other)
+
+    assert scores == {'toxic': 0.1}
+    assert len(calls) == len(other_calls) == 1
+    assert len(index) == 0
+    assert (index.hits, index.misses) == (0, 0)
+    assert index.lookup("") is None
@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+from collections import OrderedDict
+import pytest
+from services import async_database, database
+from services.async_database import save_many
+from services.database import (
+    ALL_TIME, OFFENDERS_COLLECTION, save_analyses_to_firestore, save_analysis_to_firestore,
+    update_analysis_results
+)
+from services.fake_firestore import AsyncFakeClient, FakeClient
+from services.offenders import rebuild_offender_index, top_offenders
+from services.rescore import rescore_page
+
+THRESHOLD = 0.5
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    database.set_client(client)
+    async_database.set_async_client(AsyncFakeClient(client))
+    monkeypatch.setattr(database, "_known_contents", OrderedDict())
+    yield client
+    database.set_client(None)
+    async_database.set_async_client(None)
+
+def offender_index(client):
+    return {snapshot.id: snapshot.to_dict() for snapshot in client.collection(OFFENDERS_COLLECTION).stream()}
+
+def analysis(username, content, toxic, action, **extra):
+    return dict(username=username, content=content, results={'toxic': toxic}, action=action,
+                threshold=THRESHOLD, **extra)
+
+def test_incremental_index_matches_rebuild(client):
+    # Scores are exact binary fractions, so sums don't depend on the order of increments
+    first = save_analysis_to_firestore("alice", "you idiot", {'toxic': 0.75}, "FLAG", threshold=THRESHOLD)
+    save_analysis_to_firestore("bob", "nice post", {'toxic': 0.125}, "ALLOW", threshold=THRESHOLD)
+    batch = [
+        analysis("alice", "you idiot", 0.75, "FLAG"),
+        analysis("carol", "meh", 0.25, "ALLOW", id="queue-1"),
+        analysis("bob", "go away", 0.5, "REVIEW")
+    ]
+    save_analyses_to_firestore(batch)
+    # A redelivered message is stored again under its id and counted once
+    save_analyses_to_firestore(batch[1:2])
+    asyncio.run(save_many([
+        analysis("carol", "you idiot", 0.75, "FLAG"),
+        analysis("dave", "hello there", 0.0, "ALLOW")
+    ]))
+
+    update_analysis_results(first, {'toxic': 1.0}, "FLAG")
+    rescored = {"nice post": 0.875, "go away": 0.5, "meh": 0.5, "you idiot": 1.0, "hello there": 0.25}
+    rescore_page(
+        list(client.collection('analyses').stream()),
+        lambda texts: [{'toxic': rescored[text]} for text in texts],
+        version="test@2"
+    )
+
+    incremental = offender_index(client)
+    assert all(isinstance(entry['last_seen'], float) for entry in incremental.values())
+    report = rebuild_offender_index()
+
+    assert report == {'analyses': 7, 'offenders': 8, 'removed': 0}
+    assert offender_index(client) == incremental
+
+def test_top_offenders_reads_last_seen_back_as_datetime(client):
+    save_analysis_to_firestore("alice", "you idiot", {'toxic': 0.75}, "FLAG", threshold=THRESHOLD)
+    save_analysis_to_firestore("alice", "idiot again", {'toxic': 0.75}, "FLAG", threshold=THRESHOLD)
+    latest = max(snapshot.to_dict()['timestamp'] for snapshot in client.collection('analyses').stream())
+
+    [offender] = top_offenders(period=ALL_TIME)
+
+    assert offender['username'] == "alice" and offender['counts']['FLAG'] == 2
+    assert isinstance(offender['last_seen'], datetime.datetime)
+    assert offender['last_seen'] == latest
@@ -0,0 +1,38 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks import SAMPLE_TEXTS, build_tiny_model
+from config.settings import TOXICITY_CATEGORIES
+from models.pruning import head_importance, prune_model
+from models.toxicity import model_predict_batch
+
+@pytest.fixture
+def tiny():
+    model, tokenizer = build_tiny_model()
+    return model, tokenizer, head_importance(model, tokenizer, SAMPLE_TEXTS)
+
+def heads_per_layer(model):
+    return [layer.attention.self.num_attention_heads for layer in model.bert.encoder.layer]
+
+def test_pruned_heads_are_removed_and_one_per_layer_kept(tiny):
+    model, tokenizer, importance = tiny
+    assert heads_per_layer(model) == [2, 2]
+
+    pruned = prune_model(model, importance, head_fraction=1.0)
+
+    assert sorted(pruned) == [0, 1] and all(len(heads) == 1 for heads in pruned.values())
+    assert heads_per_layer(model) == [1, 1]
+    scores = model_predict_batch(model, tokenizer, SAMPLE_TEXTS)
+    assert len(scores) == len(SAMPLE_TEXTS)
+    assert all(set(result) == set(TOXICITY_CATEGORIES) for result in scores)
+
+def test_dropped_layer_leaves_a_working_model(tiny):
+    model, tokenizer, importance = tiny
+
+    prune_model(model, importance, head_fraction=0.0, drop_layers=1)
+
+    assert model.config.num_hidden_layers == 1
+    assert heads_per_layer(model) == [2]
+    assert len(model_predict_batch(model, tokenizer, SAMPLE_TEXTS[:2])) == 2
@@ -0,0 +1,108 @@
+import datetime
+from collections import OrderedDict
+import pytest
+from services import database
+from services.database import ALL_TIME, OFFENDERS_COLLECTION, offender_id, save_analyses_to_firestore
+from services.fake_firestore import FakeClient
+from services.rescore import rescore_page, run_rescore, stale_pages
+
+NEW_VERSION = "toxic-bert@new"
+THRESHOLD = 0.5
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    database.set_client(client)
+    monkeypatch.setattr(database, "_known_contents", OrderedDict())
+    yield client
+    database.set_client(None)
+
+class Model:
+    """Stand-in batch scorer returning fixed scores per text and recording its inputs"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [{'toxic': self.scores[text]} for text in texts]
+
+def save(analyses):
+    return save_analyses_to_firestore([
+        {'username': username, 'content': text, 'results': {'toxic': toxic}, 'action': action,
+         'threshold': THRESHOLD}
+        for username, text, toxic, action in analyses
+    ])
+
+def stored(client):
+    return {snapshot.id: snapshot.to_dict() for snapshot in client.collection('analyses').stream()}
+
+def stamp(client, ids, version):
+    for doc_id in ids:
+        client.collection('analyses').document(doc_id).update({'model_version': version})
+
+def test_stale_pages_advance_while_pages_are_rewritten(client):
+    ids = save([(f"user{i}", f"text {i}", 0.75, "FLAG") for i in range(7)])
+    stamp(client, ids[:4], "toxic-bert@old")
+    stamp(client, ids[4:], "toxic-bert@older")
+    model = Model({f"text {i}": 0.25 for i in range(7)})
+
+    pages = []
+    for page in stale_pages(NEW_VERSION, page_size=3):
+        pages.append(len(page))
+        # Rewriting the page moves its analyses out of the query's result set
+        rescore_page(page, model, NEW_VERSION)
+
+    assert pages == [3, 3, 1]
+    assert sorted(model.texts) == sorted(f"text {i}" for i in range(7))
+    assert all(entry['model_version'] == NEW_VERSION for entry in stored(client).values())
+    assert list(stale_pages(NEW_VERSION, page_size=3)) == []
+
+def test_interrupted_rescore_resumes_where_it_stopped(client):
+    save([(f"user{i}", f"text {i}", 0.75, "FLAG") for i in range(5)])
+    model = Model({f"text {i}": 0.25 for i in range(5)})
+
+    for page in stale_pages(NEW_VERSION, page_size=2):
+        rescore_page(page, model, NEW_VERSION)
+        break
+    report = run_rescore(model, NEW_VERSION, page_size=2, max_per_second=1e6)
+
+    assert report['updated'] == 3 and report['skipped'] == 0
+    assert sorted(model.texts) == sorted(f"text {i}" for i in range(5))
+
+def test_rescore_moves_offender_totals_and_scores_inline_text(client, tmp_path):
+    ids = save([
+        ("alice", "you idiot", 0.75, "FLAG"),
+        ("alice", "you idiot", 0.75, "FLAG"),
+        ("bob", "nice post", 0.125, "ALLOW")
+    ])
+    # Saved before versions were stamped: with its text inline, or with its text since lost
+    analyses = client.collection('analyses')
+    analyses.document("legacy").set({
+        'username': "dave", 'content': "go away", 'results': {'toxic': 0.125}, 'action': "ALLOW",
+        'threshold': THRESHOLD, 'timestamp': datetime.datetime.now()
+    })
+    analyses.document("lost").set({
+        'username': "carol", 'content_hash': "gone", 'results': {'toxic': 0.125}, 'action': "ALLOW",
+        'threshold': THRESHOLD, 'timestamp': datetime.datetime.now()
+    })
+    model = Model({"you idiot": 0.25, "nice post": 0.875, "go away": 0.5})
+
+    report = run_rescore(model, NEW_VERSION, max_per_second=1e6, unversioned=True,
+                         state_path=str(tmp_path / "rescore.json"))
+
+    assert report['updated'] == 4 and report['skipped'] == 1
+    # Each distinct text is scored once
+    assert sorted(model.texts) == ["go away", "nice post", "you idiot"]
+    analyses_now = stored(client)
+    assert [analyses_now[doc_id]['action'] for doc_id in ids] == ["ALLOW", "ALLOW", "FLAG"]
+    assert analyses_now["legacy"]['results'] == {'toxic': 0.5}
+    assert analyses_now["lost"].get('model_version') is None
+
+    offenders = client.collection(OFFENDERS_COLLECTION)
+    alice = offenders.document(offender_id(ALL_TIME, "alice")).get().to_dict()
+    assert alice['counts']['FLAG'] == 0 and alice['counts']['ALLOW'] == 2
+    assert alice['score_sum'] == 0.5
+    bob = offenders.document(offender_id(ALL_TIME, "bob")).get().to_dict()
+    assert bob['counts']['FLAG'] == 1 and bob['analyses'] == 1
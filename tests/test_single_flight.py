@@ -0,0 +1,100 @@
+import threading
+import pytest
+from models import toxicity
+from models.near_duplicates import NearDuplicateIndex
+from models.single_flight import SingleFlight
+
+MODEL = object()
+TOKENIZER = object()
+SCORES = {'toxic': 0.9, 'insult': 0.7}
+
+class CountingModel:
+    """Stand-in for predict_toxicity_batch that counts calls and blocks until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, model, tokenizer, sentences):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("model failed")
+        return [dict(SCORES) for _ in sentences]
+
+@pytest.fixture
+def counting_model(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(toxicity, "predict_toxicity_batch", model)
+    monkeypatch.setattr(toxicity, "single_flight", SingleFlight())
+    monkeypatch.setattr(toxicity, "near_duplicate_index", None)
+    return model
+
+def predict_concurrently(texts, model, wait_until):
+    """Call predict_toxicity from one thread per text while the model is held, then release it"""
+    results = [None] * len(texts)
+    errors = [None] * len(texts)
+
+    def call(i):
+        try:
+            results[i] = toxicity.predict_toxicity(MODEL, TOKENIZER, texts[i])
+        except Exception as error:
+            errors[i] = error
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    # Every caller but the leader has joined the in-flight call
+    wait_until(lambda: toxicity.single_flight.shared == len(texts) - 1)
+    model.release.set()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_identical_requests_invoke_model_once(counting_model, wait_until):
+    texts = ["you are  an idiot", " you are an idiot ", "you\tare an\nidiot"] * 8
+
+    results, errors = predict_concurrently(texts, counting_model, wait_until)
+
+    assert counting_model.calls == 1
+    assert errors == [None] * len(texts)
+    assert all(result == SCORES for result in results)
+    # Each caller gets its own dict, so one caller's edits don't leak to others
+    assert len({id(result) for result in results}) == len(texts)
+
+def test_different_texts_are_not_shared(counting_model):
+    counting_model.release.set()
+
+    toxicity.predict_toxicity(MODEL, TOKENIZER, "first text")
+    toxicity.predict_toxicity(MODEL, TOKENIZER, "second text")
+
+    assert counting_model.calls == 2
+
+def test_failure_reaches_every_waiter_and_does_not_poison_next_call(counting_model, wait_until):
+    counting_model.fail = True
+    texts = ["you are an idiot"] * 8
+
+    results, errors = predict_concurrently(texts, counting_model, wait_until)
+
+    assert counting_model.calls == 1
+    assert results == [None] * len(texts)
+    assert all(isinstance(error, RuntimeError) for error in errors)
+
+    counting_model.fail = False
+    assert toxicity.predict_toxicity(MODEL, TOKENIZER, "you are  an idiot") == SCORES
+    assert counting_model.calls == 2
+
+def test_single_flight_wraps_near_duplicate_lookup(counting_model, wait_until, monkeypatch):
+    monkeypatch.setattr(toxicity, "near_duplicate_index", NearDuplicateIndex(mode="reuse"))
+    texts = ["you are an idiot and everyone knows it"] * 8
+
+    results, errors = predict_concurrently(texts, counting_model, wait_until)
+
+    assert counting_model.calls == 1
+    assert errors == [None] * len(texts)
+    # A later request is answered by the index without the model
+    assert toxicity.predict_toxicity(MODEL, TOKENIZER, texts[0]) == SCORES
+    assert counting_model.calls == 1
@@ -1,17 +1,228 @@
+import os
+import threading
 import streamlit as st
 import torch
-from transformers import BertForSequenceClassification, BertTokenizer
-from config.settings import MODEL_NAME, TOXICITY_CATEGORIES, BANNED_WORDS
+from transformers import (
+    AutoConfig, AutoModelForSequenceClassification, BertForSequenceClassification, BertTokenizer
+)
+from config.settings import (
+    TOXICITY_CATEGORIES, BANNED_WORDS, MODEL_WARMUP, WARMUP_SHAPES, NEAR_DUP_ENABLED,
+    CASCADE_ENABLED, CASCADE_MODEL_PATH, ATTENTION_IMPLEMENTATION, LENGTH_BUCKETING,
+    MAX_BATCH_TOKENS, SINGLE_FLIGHT_ENABLED, DEGRADED_KEYWORD_SCORE
+)
+from services.metrics import add_readiness_check, stage
+from services.profiling import maybe_profile
+from models.admission import Admission, get_admission_controller
+from models.cascade import HashedLinearModel, cascade_predict
+from models.near_duplicates import NearDuplicateIndex
+from models.precision import resolve_inference_dtype, to_inference_dtype
+from models.single_flight import SingleFlight, text_key
+from models.registry import (
+    WEIGHTS_FILE, empty_parameters, fetch_model, get_model_dir, load_mmap_state_dict, verify_model
+)
+
+WARMUP_TEXT = "This is a warm-up sentence used to initialize the model."
+
+# Set once the model is loaded, and once it is also warmed up, in this process
+_model_loaded = threading.Event()
+_model_ready = threading.Event()
+
+# Scores of recently analyzed texts, shared by all sessions in the process
+near_duplicate_index = NearDuplicateIndex() if NEAR_DUP_ENABLED else None
+
+# Concurrent requests for the same text share one computation
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+# First-stage classifier of the cascade; BERT only sees texts it is unsure about
+first_stage_model = HashedLinearModel.load(CASCADE_MODEL_PATH) if CASCADE_ENABLED else None
+
+def load_model_artifacts(dtype=None, mmap=True):
+    """
+    Load the BERT model and tokenizer without caching or warm-up
+
+    The pinned artifact is read from the local model registry (fetched once if
+    missing), verified against its expected hash, and its weights are
+    memory-mapped so worker processes share them through the page cache:
+    the model is built with parameters on the meta device and the mapped
+    tensors are assigned in their place, so no private copy is ever made.
+
+    Args:
+        dtype (torch.dtype): Inference dtype; defaults to INFERENCE_DTYPE,
+            falling back to float32 when the CPU lacks bf16 support
+        mmap (bool): Back the weights with the mapped file; False loads the
+            private copy from_pretrained allocates (for comparison)
+    """
+    model_dir = get_model_dir()
+    if not os.path.isdir(model_dir):
+        fetch_model()
+    verify_model(model_dir)
+
+    if mmap:
+        config = AutoConfig.from_pretrained(model_dir, local_files_only=True)
+        with empty_parameters():
+            model = AutoModelForSequenceClassification.from_config(
+                config, attn_implementation=ATTENTION_IMPLEMENTATION
+            )
+        # Strict, so a truncated or mismatched file fails loudly
+        model.load_state_dict(
+            load_mmap_state_dict(os.path.join(model_dir, WEIGHTS_FILE)), strict=True, assign=True
+        )
+        model.eval()
+    else:
+        model = BertForSequenceClassification.from_pretrained(
+            model_dir,
+            local_files_only=True,
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+            attn_implementation=ATTENTION_IMPLEMENTATION
+        )
+    # Casting copies the weights, trading page-cache sharing for half the memory
+    to_inference_dtype(model, dtype or resolve_inference_dtype())
+    tokenizer = BertTokenizer.from_pretrained(model_dir, local_files_only=True)
+    return model, tokenizer
+
+def warm_up(model, tokenizer, shapes=WARMUP_SHAPES):
+    """
+    Run representative batch shapes through the model
+
+    Grows the allocator, initializes lazy kernels and the tokenizer so the
+    first user request runs at steady-state latency.
+
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        shapes (list): (batch size, sequence length) pairs to run
+    """
+    for batch_size, length in shapes:
+        inputs = tokenizer(
+            [WARMUP_TEXT] * batch_size,
+            return_tensors="pt",
+            truncation=True,
+            padding="max_length",
+            max_length=length
+        )
+        with torch.no_grad():
+            model(**inputs)
 
 @st.cache_resource
 def load_model():
     """
-    Load the BERT model and tokenizer for toxicity detection
+    Load, warm up and cache the BERT model and tokenizer for toxicity detection
     """
-    model = BertForSequenceClassification.from_pretrained(MODEL_NAME)
-    tokenizer = BertTokenizer.from_pretrained(MODEL_NAME)
+    model, tokenizer = load_model_artifacts()
+    _model_loaded.set()
+    if MODEL_WARMUP:
+        warm_up(model, tokenizer)
+    mark_model_ready()
     return model, tokenizer
 
+def mark_model_ready():
+    """Record that this process has a loaded and warmed-up model, e.g. in a worker"""
+    _model_loaded.set()
+    _model_ready.set()
+
+def is_model_ready():
+    """
+    Check whether the model has been loaded and warmed up in this process
+
+    Returns:
+        bool: True once load_model has completed
+    """
+    return _model_ready.is_set()
+
+add_readiness_check("model_loaded", _model_loaded.is_set)
+add_readiness_check("warmed_up", is_model_ready)
+
+def _bucketed_probs(model, tokenizer, sentences, max_tokens=MAX_BATCH_TOKENS):
+    """
+    Run the model over length-sorted sub-batches
+    
+    Each sub-batch is padded only to its own longest sequence and holds at
+    most max_tokens padded tokens, so short texts in a length-skewed batch
+    no longer pay for the longest one.
+    
+    Returns:
+        torch.Tensor: Probabilities in input order
+    """
+    with stage("tokenize"):
+        encoded = tokenizer(sentences, truncation=True)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+    order = sorted(range(len(sentences)), key=lengths.__getitem__)
+    
+    chunks, chunk = [], []
+    for i in order:
+        # Sorted ascending, so lengths[i] is the chunk's padded length if added
+        if chunk and (len(chunk) + 1) * lengths[i] > max_tokens:
+            chunks.append(chunk)
+            chunk = []
+        chunk.append(i)
+    if chunk:
+        chunks.append(chunk)
+    
+    probs = [None] * len(sentences)
+    for chunk in chunks:
+        with stage("tokenize"):
+            inputs = tokenizer.pad(
+                {key: [encoded[key][i] for i in chunk] for key in encoded.keys()},
+                return_tensors="pt"
+            )
+        with stage("forward"), torch.no_grad():
+            chunk_probs = torch.sigmoid(model(**inputs).logits.float())
+        for i, row in zip(chunk, chunk_probs):
+            probs[i] = row
+    return torch.stack(probs)
+
+def model_predict_batch(model, tokenizer, sentences, bucketing=LENGTH_BUCKETING):
+    """
+    Predict toxicity scores for several sentences with BERT
+    
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        sentences (list): Input texts to analyze
+        bucketing (bool): Split the batch into length-sorted sub-batches
+        
+    Returns:
+        list: One dictionary of category scores per sentence
+    """
+    with maybe_profile("predict_toxicity"):
+        if bucketing:
+            probs = _bucketed_probs(model, tokenizer, list(sentences))
+        else:
+            with stage("tokenize"):
+                inputs = tokenizer(list(sentences), return_tensors="pt", truncation=True, padding=True)
+            
+            with stage("forward"), torch.no_grad():
+                probs = torch.sigmoid(model(**inputs).logits.float())
+        
+        with stage("postprocess"):
+            return [
+                {label: float(prob) for label, prob in zip(TOXICITY_CATEGORIES, row)}
+                for row in probs.numpy()
+            ]
+
+def predict_toxicity_batch(model, tokenizer, sentences):
+    """
+    Predict toxicity scores for several sentences
+    
+    In cascade mode the first-stage classifier scores every sentence and only
+    the uncertain ones go through BERT.
+    
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        sentences (list): Input texts to analyze
+        
+    Returns:
+        list: One dictionary of category scores per sentence
+    """
+    if first_stage_model is not None:
+        results, _ = cascade_predict(
+            first_stage_model, list(sentences), lambda texts: model_predict_batch(model, tokenizer, texts)
+        )
+        return results
+    return model_predict_batch(model, tokenizer, sentences)
+
 def predict_toxicity(model, tokenizer, sentence):
     """
     Predict toxicity scores for a given sentence
@@ -24,14 +235,68 @@ def predict_toxicity(model, tokenizer, sentence):
     Returns:
         dict: Dictionary with toxicity scores for each category
     """
-    inputs = tokenizer(sentence, return_tensors="pt", truncation=True, padding=True)
+    def compute():
+        return predict_toxicity_batch(model, tokenizer, [sentence])[0]
+    
+    score = compute
+    if near_duplicate_index is not None:
+        score = lambda: near_duplicate_index.score(sentence, compute)
+    if single_flight is None:
+        return score()
+    # Waiters receive the leader's dict, so hand each caller its own copy
+    return dict(single_flight.do((id(model), text_key(sentence)), score))
+
+def predict_toxicity_admitted(model, tokenizer, sentence, controller=None):
+    """
+    Predict toxicity for a sentence under admission control
+    
+    Goes through the same single-flight and near-duplicate layers as
+    predict_toxicity, with the admission controller in place of the direct
+    model call. Keyword fallback scores of a shed request are shared with
+    concurrent identical requests but never indexed, so later near-duplicates
+    still get model scores.
+    
+    Args:
+        model: The pre-trained model
+        tokenizer: The tokenizer for the model
+        sentence (str): Input text to analyze
+        controller (AdmissionController): Controller to score through;
+            get_admission_controller(model, tokenizer) if None
+        
+    Returns:
+        Admission: Scores, degraded flag and pending full-score future
+    """
+    controller = controller or get_admission_controller(model, tokenizer)
     
-    with torch.no_grad():
-        logits = model(**inputs).logits
+    def admit():
+        if near_duplicate_index is None:
+            return controller.score(sentence)
+        signature, match = near_duplicate_index.check(sentence)
+        if match is not None and near_duplicate_index.mode == "reuse":
+            return Admission(match[0], False, None)
+        admission = controller.score(sentence)
+        if signature is not None and match is None and not admission.degraded:
+            near_duplicate_index.add(sentence, admission.results, signature)
+        return admission
     
-    probs = torch.sigmoid(logits).squeeze().numpy()
+    if single_flight is None:
+        return admit()
+    # Keyed apart from predict_toxicity, whose callers expect a dict
+    admission = single_flight.do(("admission", id(model), text_key(sentence)), admit)
+    return admission._replace(results=dict(admission.results))
+
+def keyword_matches(text):
+    """
+    Find banned keywords in text
     
-    return {label: float(prob) for label, prob in zip(TOXICITY_CATEGORIES, probs)}
+    Args:
+        text (str): Text to check
+        
+    Returns:
+        list: Banned words contained in the text
+    """
+    lowered = text.lower()
+    return [word for word in BANNED_WORDS if word.lower() in lowered]
 
 def keyword_filter_check(text):
     """
@@ -43,9 +308,28 @@ def keyword_filter_check(text):
     Returns:
         str: Message indicating detected keywords or None
     """
-    matches = [word for word in BANNED_WORDS if word.lower() in text.lower()]
+    matches = keyword_matches(text)
     
     if matches:
         return f"Keyword filter detection: {', '.join(matches)}"
     else:
-        return "No keywords detected"
\ No newline at end of file
+        return "No keywords detected"
+
+def keyword_fallback_scores(text):
+    """
+    Approximate toxicity scores from the keyword filter alone
+    
+    Used when the model is overloaded: texts with a banned keyword get
+    DEGRADED_KEYWORD_SCORE in the toxic and insult categories, others 0.
+    
+    Args:
+        text (str): Text to score
+        
+    Returns:
+        dict: Dictionary with a score for each category
+    """
+    score = DEGRADED_KEYWORD_SCORE if keyword_matches(text) else 0.0
+    return {
+        label: score if label in ('toxic', 'insult') else 0.0
+        for label in TOXICITY_CATEGORIES
+    }
\ No newline at end of file
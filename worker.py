@@ -0,0 +1,234 @@
+import argparse
+import json
+import logging
+import signal
+import threading
+import time
+from queue import Queue
+from config.settings import (
+    DEFAULT_THRESHOLD, METRICS_PORT, WORKER_BATCH_SIZE, WORKER_BLOCK_SECONDS, WORKER_MAX_IN_FLIGHT,
+    WORKER_MAX_DELIVERIES, WORKER_RETRY_BACKOFF, WORKER_RETRY_BACKOFF_MAX
+)
+from services.database import save_analyses_to_firestore
+from services.metrics import get_histogram, is_enabled, set_gauge, start_metrics_server
+from services.moderation import determine_action
+
+logger = logging.getLogger(__name__)
+
+class ModerationWorker:
+    """
+    Score queued comments in micro-batches and persist them in bulk
+
+    The consuming thread receives and scores one micro-batch at a time and
+    hands it to a persisting thread through a queue of max_in_flight
+    batches; when persistence falls behind, the hand-off blocks and the
+    worker stops taking messages. Messages are acknowledged only after
+    their analyses are committed, and each analysis is stored under an id
+    derived from its message id, so redelivered messages are idempotent.
+
+    After a failure the worker backs off exponentially before receiving
+    again. A batch that fails to score is retried message by message, so
+    one bad comment doesn't hold back the rest, and a message that has
+    failed max_deliveries times is dead-lettered instead of released.
+
+    Args:
+        source: Message queue (see services.message_queue)
+        predict_batch: Callable scoring a list of texts, e.g.
+            lambda texts: predict_toxicity_batch(model, tokenizer, texts)
+        threshold (float): Threshold passed to determine_action
+        batch_size (int): Messages per micro-batch
+        block_seconds (float): Longest wait for a batch to fill
+        max_in_flight (int): Scored batches awaiting persistence
+        max_deliveries (int): Deliveries after which a failing message is dead-lettered
+        retry_backoff (float): First pause after a failure, doubled per consecutive failure
+        retry_backoff_max (float): Longest pause after failures
+    """
+
+    def __init__(self, source, predict_batch, threshold=DEFAULT_THRESHOLD, batch_size=WORKER_BATCH_SIZE,
+                 block_seconds=WORKER_BLOCK_SECONDS, max_in_flight=WORKER_MAX_IN_FLIGHT,
+                 max_deliveries=WORKER_MAX_DELIVERIES, retry_backoff=WORKER_RETRY_BACKOFF,
+                 retry_backoff_max=WORKER_RETRY_BACKOFF_MAX):
+        self.source = source
+        self.predict_batch = predict_batch
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.block_seconds = block_seconds
+        self.max_deliveries = max_deliveries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._scored = Queue(maxsize=max_in_flight)
+        self._stopping = threading.Event()
+        self._started = None
+        # Failures since the last success, set by both threads
+        self._consecutive_failures = 0
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    def stop(self):
+        """Stop consuming; batches already received are still scored, persisted and acknowledged"""
+        self._stopping.set()
+
+    def run(self):
+        """Consume until stop() is called, then drain in-flight batches"""
+        persister = threading.Thread(target=self._persist_loop, daemon=True)
+        persister.start()
+        self._started = time.perf_counter()
+        try:
+            while not self._stopping.is_set():
+                if self._consecutive_failures and self._stopping.wait(self._backoff()):
+                    break
+                messages = self.source.receive(self.batch_size, self.block_seconds)
+                set_gauge("worker_lag_messages", self.source.lag())
+                if not messages:
+                    continue
+                try:
+                    batch = self._score(messages)
+                except Exception as error:
+                    if len(messages) == 1:
+                        logger.exception("Scoring a message failed")
+                        self._fail(messages, f"scoring failed: {error!r}")
+                        continue
+                    logger.exception("Scoring %d messages failed; retrying them one by one", len(messages))
+                    batch = self._score_each(messages)
+                if batch[0]:
+                    self._scored.put(batch)
+        finally:
+            self._scored.put(None)
+            persister.join()
+            set_gauge("worker_lag_messages", self.source.lag())
+
+    def _score(self, messages):
+        results = self.predict_batch([message.content for message in messages])
+        analyses = []
+        for message, scores in zip(messages, results):
+            action, _ = determine_action(scores, self.threshold)
+            analyses.append({
+                'id': f"{self.source.name}-{message.id}",
+                'username': message.username,
+                'content': message.content,
+                'results': scores,
+                'action': action,
+                'threshold': self.threshold
+            })
+        return messages, analyses
+
+    def _score_each(self, messages):
+        # Isolates the messages that fail on their own from the batch
+        scored, analyses, failed = [], [], []
+        for message in messages:
+            try:
+                _, [analysis] = self._score([message])
+            except Exception as error:
+                failed.append(message)
+                reason = repr(error)
+                continue
+            scored.append(message)
+            analyses.append(analysis)
+        if failed:
+            self._fail(failed, f"scoring failed: {reason}")
+        return scored, analyses
+
+    def _backoff(self):
+        return min(self.retry_backoff * 2 ** (self._consecutive_failures - 1), self.retry_backoff_max)
+
+    def _fail(self, messages, reason):
+        """Release failed messages for another delivery, or dead-letter those out of deliveries"""
+        self._consecutive_failures += 1
+        self.failed += len(messages)
+        exhausted = [message for message in messages if message.deliveries >= self.max_deliveries]
+        retry = [message.id for message in messages if message.deliveries < self.max_deliveries]
+        try:
+            if exhausted:
+                logger.error("Dead-lettering %d messages after %d deliveries: %s",
+                             len(exhausted), self.max_deliveries, reason)
+                self.source.dead_letter(exhausted, reason)
+                self.dead_lettered += len(exhausted)
+            if retry:
+                self.source.release(retry)
+        except Exception:
+            # Unacknowledged messages are delivered again regardless
+            logger.exception("Returning %d failed messages to the queue failed", len(messages))
+
+    def _persist_loop(self):
+        while True:
+            batch = self._scored.get()
+            if batch is None:
+                return
+            messages, analyses = batch
+            ids = [message.id for message in messages]
+            try:
+                save_analyses_to_firestore(analyses)
+            except Exception as error:
+                logger.exception("Persisting %d analyses failed; leaving them unacknowledged", len(ids))
+                self._fail(messages, f"persisting failed: {error!r}")
+                continue
+            self._consecutive_failures = 0
+            try:
+                self.source.ack(ids)
+            except Exception:
+                # The analyses are committed; redelivered messages overwrite them with the same ids
+                logger.exception("Acknowledging %d messages failed; they will be redelivered", len(ids))
+
+            self.processed += len(ids)
+            if is_enabled():
+                now = time.time()
+                age = get_histogram("queue_age")
+                for message in messages:
+                    age.observe(now - message.enqueued)
+            set_gauge("worker_processed_total", self.processed)
+            set_gauge("worker_messages_per_second", self.stats()['messages_per_second'])
+
+    def stats(self):
+        """
+        Throughput and backlog so far
+
+        Returns:
+            dict: processed, failed, dead_lettered, messages_per_second and lag
+        """
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'dead_lettered': self.dead_lettered,
+            'messages_per_second': self.processed / elapsed if elapsed else 0.0,
+            'lag': self.source.lag()
+        }
+
+def install_signal_handlers(worker):
+    """Stop the worker gracefully on SIGTERM and SIGINT"""
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+
+if __name__ == "__main__":
+    from models.scheduler import BULK, get_scheduler
+    from models.toxicity import load_model_artifacts, mark_model_ready, warm_up
+    from services.message_queue import get_queue
+
+    parser = argparse.ArgumentParser(description="Moderate comments arriving on a message queue")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT)
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random model (offline smoke test)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Serve /ready from the start, so it answers 503 while the model loads
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    if args.tiny:
+        from benchmarks import build_tiny_model
+        model, tokenizer = build_tiny_model()
+    else:
+        model, tokenizer = load_model_artifacts()
+        warm_up(model, tokenizer)
+    mark_model_ready()
+
+    # Queued comments are bulk traffic next to any interactive use of the model
+    scheduler = get_scheduler(model, tokenizer)
+    worker = ModerationWorker(
+        get_queue(), lambda texts: scheduler.score_batch(texts, BULK), args.threshold, args.batch_size
+    )
+    install_signal_handlers(worker)
+    worker.run()
+    print(json.dumps(worker.stats(), indent=2))